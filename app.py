@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, jsonify, g, make_response
 # Deploy trigger: 2025-12-22
 from datetime import datetime, timedelta
 import unicodedata
@@ -7,16 +7,23 @@ from database import (
                       get_nino, get_ninos, add_nino, update_nino, delete_nino,
                       get_employees, add_employee, update_employee, delete_employee,
                       get_active_employees_count, get_active_ninos, get_active_employees,
-                      add_asistencia, get_today_ninos_total, get_today_payment_per_hour,
+                      add_asistencia, add_asistencias_lote, get_today_ninos_total, get_today_payment_per_hour,
                       get_date_ninos_asistencia, get_date_employees_asistencia,
                       update_asistencia, delete_asistencia, get_week_ninos_unique_count,
                       get_week_ninos_total, get_week_daily_amounts, get_week_employees_earnings, 
                        get_current_time, add_pago, add_pago_dividido, get_recent_pagos, get_pending_payments, 
                        get_week_gastos, add_gasto, update_gasto, delete_gasto,
                        verify_employee_credentials, get_ninos_con_deuda,
-                       get_grouped_pagos, get_pagos_group_details, delete_pago,
+                       get_grouped_pagos, get_pagos_group_details, delete_pago, delete_pagos,
                        get_week_children_summary, get_week_attendance_payment_summary,
-                       update_pagos_empleado)
+                       update_pagos_empleado, get_week_aggregate, add_pagos_lote,
+                       reconcile_debt_ledger, reconcile_debt_snapshot_index, run_parallel,
+                       empty_week_aggregate, data_version, warmup, pool_stats)
+from logs import get_logger, log_payload, track_errors, stop_tracking
+import query_stats
+import report_cache
+
+logger = get_logger('app')
 
 app = Flask(__name__)
 app.secret_key = 'supersecretkey'
@@ -86,6 +93,98 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Presupuesto de consultas a Supabase por endpoint (el resto usa QUERY_BUDGET).
+# Incluye margen para la recarga del roster en caché.
+QUERY_BUDGETS = {
+    'dashboard': 6,
+    'resumen_semanal': 4,
+    'resumen_pagos': 5,
+    'hoy': 4,
+    'pagos': 5,
+    'gastos': 2
+}
+
+@app.before_request
+def iniciar_conteo_consultas():
+    g.query_stats_token = query_stats.start_request()
+
+@app.after_request
+def reportar_consultas(response):
+    report = query_stats.finish_request(
+        request.endpoint, request.method, request.path,
+        budget=QUERY_BUDGETS.get(request.endpoint)
+    )
+    if report is not None:
+        response.headers['Server-Timing'] = query_stats.server_timing(report)
+    return response
+
+@app.teardown_request
+def cerrar_conteo_consultas(exc):
+    query_stats.reset_request(g.pop('query_stats_token', None))
+
+def render_week_report(route, template, start_of_week, build_context, weeks=None):
+    """Renderizar un reporte semanal desde la caché de reportes, con ETag (y Last-Modified si
+    la versión de datos es la compartida de Postgres).
+
+    build_context() arma el contexto de la plantilla consultando Supabase; solo se llama si
+    la caché no tiene la página para la versión actual de los datos. weeks son las semanas
+    de las que depende la página (por defecto solo start_of_week).
+    """
+    weeks = weeks or [start_of_week]
+    today = get_current_time().date()
+    cerrada = all(week + timedelta(days=6) < today for week in weeks)
+
+    version, last_modified, compartida = data_version(*weeks)
+    if not cerrada:
+        # Las páginas de la semana en curso muestran datos de "hoy"
+        version = version + (today.isoformat(),)
+    # Solo la versión de Postgres (compartida) ve las escrituras de todas las instancias; con
+    # la local el ETag se calcula sobre el HTML para no responder 304 con datos viejos.
+    tag = report_cache.etag(route, start_of_week, version, session.get('user_level')) if compartida else None
+
+    if tag is not None and request.if_none_match.contains(tag):
+        response = make_response('', 304)
+    else:
+        contexto = report_cache.get(route, start_of_week, version)
+        if contexto is None:
+            errores, token = track_errors()
+            try:
+                contexto = build_context()
+            finally:
+                stop_tracking(token)
+            if errores:
+                # No guardar ni etiquetar una página armada con valores por defecto
+                response = make_response(render_template(template, **contexto))
+                response.headers['Cache-Control'] = 'no-store'
+                return response
+            # Sin versión compartida otra instancia puede cambiar una semana cerrada sin que
+            # este proceso lo vea: solo la versión de Postgres justifica el TTL largo
+            report_cache.put(route, start_of_week, version, contexto, cerrada and compartida)
+        response = make_response(render_template(template, **contexto))
+
+    if tag is not None:
+        response.set_etag(tag)
+        response.last_modified = datetime.fromtimestamp(last_modified, pytz.UTC)
+    else:
+        response.add_etag()
+    # El HTML depende de la sesión: solo el navegador lo guarda y siempre revalida
+    response.headers['Cache-Control'] = 'private, no-cache'
+    response.vary.add('Cookie')
+    return response.make_conditional(request)
+
+@app.route('/debug/queries')
+@admin_required
+def debug_queries():
+    """Consultas a Supabase de los requests recientes (tabla, filtros, filas, bytes, ms y función)."""
+    limit = request.args.get('limit', type=int)
+    return jsonify(query_stats.recent_requests(limit))
+
+@app.route('/debug/pool')
+@admin_required
+def debug_pool():
+    """Estado del pool HTTP hacia Supabase (requests, reintentos, errores y conexiones)."""
+    return jsonify(pool_stats())
+
 @app.route('/', methods=['GET', 'POST'])
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -131,39 +230,54 @@ def dashboard(date=None):
     week_start_str = start_of_week.strftime('%B %d')
     week_end_str = end_of_week.strftime('%B %d')
 
-    # Obtener el número de empleados activos
-    active_employees_count = get_active_employees_count()
-    
-    # Obtener datos dinámicos para hoy
-    today_ninos_total = get_today_ninos_total()
-    today_payment_per_hour = get_today_payment_per_hour()
+    def contexto():
+        # Consultas independientes en paralelo: conteo de empleados activos y el agregado de la
+        # semana (asistencia y gastos en una sola pasada; el resto son vistas sobre este agregado)
+        resultados = run_parallel({
+            'active_employees_count': get_active_employees_count,
+            'week_aggregate': lambda: get_week_aggregate(start_of_week, end_of_week)
+        }, defaults={
+            'active_employees_count': 0,
+            'week_aggregate': empty_week_aggregate(start_of_week, end_of_week)
+        })
+        active_employees_count = resultados['active_employees_count']
+        week_aggregate = resultados['week_aggregate']
+
+        # Obtener datos dinámicos para hoy
+        today_ninos_total = get_today_ninos_total(aggregate=week_aggregate)
+        today_payment_per_hour = get_today_payment_per_hour(aggregate=week_aggregate)
     
-    # Obtener datos de la semana
-    week_ninos_unique_count = get_week_ninos_unique_count(start_of_week, end_of_week)
-    week_ninos_total = get_week_ninos_total(start_of_week, end_of_week)
+        # Obtener datos de la semana
+        week_ninos_unique_count = get_week_ninos_unique_count(start_of_week, end_of_week, aggregate=week_aggregate)
+        week_ninos_total = get_week_ninos_total(start_of_week, end_of_week, aggregate=week_aggregate)
     
-    # Obtener datos para el gráfico semanal
-    week_daily_amounts = get_week_daily_amounts(start_of_week, end_of_week)
-    week_employees_earnings = get_week_employees_earnings(start_of_week, end_of_week)
+        # Obtener datos para el gráfico semanal
+        week_daily_amounts = get_week_daily_amounts(start_of_week, end_of_week, aggregate=week_aggregate)
+        week_employees_earnings = get_week_employees_earnings(start_of_week, end_of_week, aggregate=week_aggregate)
     
-    # Get weekly expenses
-    _, week_gastos_total = get_week_gastos(start_of_week, end_of_week)
-    if week_gastos_total is None:
-        week_gastos_total = 0
-
-    return render_template('dashboard.html', 
-                           week_start_str=start_of_week.strftime('%Y-%m-%d'),
-                           week_end_str=end_of_week.strftime('%Y-%m-%d'),
-                           prev_week_start_str=prev_week_start.strftime('%Y-%m-%d'),
-                           next_week_start_str=next_week_start.strftime('%Y-%m-%d'),
-                           today_ninos_total=today_ninos_total,
-                           today_payment_per_hour=today_payment_per_hour,
-                           week_ninos_unique_count=week_ninos_unique_count,
-                           week_ninos_total=week_ninos_total,
-                           week_gastos_total=week_gastos_total,
-                           active_employees_count=active_employees_count,
-                           week_daily_amounts=week_daily_amounts,
-                           week_employees_earnings=week_employees_earnings)
+        # Get weekly expenses
+        _, week_gastos_total = get_week_gastos(start_of_week, end_of_week, aggregate=week_aggregate)
+        if week_gastos_total is None:
+            week_gastos_total = 0
+
+        return dict(week_start_str=start_of_week.strftime('%Y-%m-%d'),
+                    week_end_str=end_of_week.strftime('%Y-%m-%d'),
+                    prev_week_start_str=prev_week_start.strftime('%Y-%m-%d'),
+                    next_week_start_str=next_week_start.strftime('%Y-%m-%d'),
+                    today_ninos_total=today_ninos_total,
+                    today_payment_per_hour=today_payment_per_hour,
+                    week_ninos_unique_count=week_ninos_unique_count,
+                    week_ninos_total=week_ninos_total,
+                    week_gastos_total=week_gastos_total,
+                    active_employees_count=active_employees_count,
+                    week_daily_amounts=week_daily_amounts,
+                    week_employees_earnings=week_employees_earnings)
+
+    # Los totales de "hoy" vienen de la semana en curso aunque se vea otra semana
+    current_week_start = get_current_time().date()
+    current_week_start -= timedelta(days=current_week_start.weekday())
+    return render_week_report('dashboard', 'dashboard.html', start_of_week, contexto,
+                              weeks=[start_of_week, current_week_start])
 
 @app.route('/resumen-semanal')
 @app.route('/resumen-semanal/<date>')
@@ -184,19 +298,22 @@ def resumen_semanal(date=None):
     prev_week_start = start_of_week - timedelta(days=7)
     next_week_start = start_of_week + timedelta(days=7)
 
-    children_weekly_summary = get_week_children_summary(start_of_week, end_of_week)
-    week_employees_earnings = get_week_employees_earnings(start_of_week, end_of_week)
-
-    return render_template(
-        'resumen_semanal.html',
-        active_page='resumen_semanal',
-        week_start_str=start_of_week.strftime('%Y-%m-%d'),
-        week_end_str=end_of_week.strftime('%Y-%m-%d'),
-        prev_week_start_str=prev_week_start.strftime('%Y-%m-%d'),
-        next_week_start_str=next_week_start.strftime('%Y-%m-%d'),
-        children_weekly_summary=children_weekly_summary,
-        week_employees_earnings=week_employees_earnings
-    )
+    def contexto():
+        week_aggregate = get_week_aggregate(start_of_week, end_of_week)
+        children_weekly_summary = get_week_children_summary(start_of_week, end_of_week, aggregate=week_aggregate)
+        week_employees_earnings = get_week_employees_earnings(start_of_week, end_of_week, aggregate=week_aggregate)
+
+        return dict(
+            active_page='resumen_semanal',
+            week_start_str=start_of_week.strftime('%Y-%m-%d'),
+            week_end_str=end_of_week.strftime('%Y-%m-%d'),
+            prev_week_start_str=prev_week_start.strftime('%Y-%m-%d'),
+            next_week_start_str=next_week_start.strftime('%Y-%m-%d'),
+            children_weekly_summary=children_weekly_summary,
+            week_employees_earnings=week_employees_earnings
+        )
+
+    return render_week_report('resumen_semanal', 'resumen_semanal.html', start_of_week, contexto)
 
 @app.route('/resumen-pagos')
 @app.route('/resumen-pagos/<date>')
@@ -217,29 +334,47 @@ def resumen_pagos(date=None):
     prev_week_start = start_of_week - timedelta(days=7)
     next_week_start = start_of_week + timedelta(days=7)
 
-    active_employees = get_active_employees()
-    week_employees_earnings = get_week_employees_earnings(start_of_week, end_of_week)
-    _, week_gastos_total = get_week_gastos(start_of_week, end_of_week)
-    week_gastos_total = week_gastos_total or 0
-    attendance_payment_summary = get_week_attendance_payment_summary(start_of_week, end_of_week)
-    payment_summary = build_week_payment_summary(
-        attendance_payment_summary,
-        week_employees_earnings,
-        week_gastos_total,
-        active_employees
-    )
+    def contexto():
+        resultados = run_parallel({
+            'active_employees': get_active_employees,
+            'week_aggregate': lambda: get_week_aggregate(start_of_week, end_of_week),
+            'attendance_payment_summary': lambda: get_week_attendance_payment_summary(start_of_week, end_of_week)
+        }, defaults={
+            'active_employees': [],
+            'week_aggregate': empty_week_aggregate(start_of_week, end_of_week),
+            'attendance_payment_summary': {
+                'employees': {},
+                'total_asistencias': 0,
+                'total_pagado': 0,
+                'total_pendiente': 0
+            }
+        })
+        active_employees = resultados['active_employees']
+        week_aggregate = resultados['week_aggregate']
+        attendance_payment_summary = resultados['attendance_payment_summary']
+
+        week_employees_earnings = get_week_employees_earnings(start_of_week, end_of_week, aggregate=week_aggregate)
+        _, week_gastos_total = get_week_gastos(start_of_week, end_of_week, aggregate=week_aggregate)
+        week_gastos_total = week_gastos_total or 0
+        payment_summary = build_week_payment_summary(
+            attendance_payment_summary,
+            week_employees_earnings,
+            week_gastos_total,
+            active_employees
+        )
 
-    return render_template(
-        'resumen_pagos.html',
-        active_page='resumen_pagos',
-        week_start_str=start_of_week.strftime('%Y-%m-%d'),
-        week_end_str=end_of_week.strftime('%Y-%m-%d'),
-        prev_week_start_str=prev_week_start.strftime('%Y-%m-%d'),
-        next_week_start_str=next_week_start.strftime('%Y-%m-%d'),
-        payment_summary=payment_summary,
-        total_asistencias=attendance_payment_summary.get('total_asistencias', 0),
-        total_pagado=attendance_payment_summary.get('total_pagado', 0)
-    )
+        return dict(
+            active_page='resumen_pagos',
+            week_start_str=start_of_week.strftime('%Y-%m-%d'),
+            week_end_str=end_of_week.strftime('%Y-%m-%d'),
+            prev_week_start_str=prev_week_start.strftime('%Y-%m-%d'),
+            next_week_start_str=next_week_start.strftime('%Y-%m-%d'),
+            payment_summary=payment_summary,
+            total_asistencias=attendance_payment_summary.get('total_asistencias', 0),
+            total_pagado=attendance_payment_summary.get('total_pagado', 0)
+        )
+
+    return render_week_report('resumen_pagos', 'resumen_pagos.html', start_of_week, contexto)
 
 @app.route('/gastos')
 @app.route('/gastos/<date>')
@@ -270,14 +405,10 @@ def gastos(date=None):
     # Obtener gastos de la semana usando fechas simples para evitar desfases de zona horaria
     try:
         gastos, total_gastos = get_week_gastos(start_of_week, end_of_week)
-        
-        # Debug: Imprimir los gastos
-        print("\n=== DEBUG: Datos de gastos ===")
-        print(f"Gastos recibidos: {gastos}")
-        print(f"Total gastos: {total_gastos}")
-        print("===========================\n")
+        log_payload(logger, "Gastos recibidos: %s", gastos)
+        logger.debug("Total gastos: %s", total_gastos)
     except Exception as e:
-        print(f"Error al obtener gastos: {e}")
+        logger.error("Error al obtener gastos: %s", e)
         gastos, total_gastos = [], 0
 
     return render_template('gastos.html', 
@@ -305,12 +436,12 @@ def crear_gasto():
             return jsonify({'success': True, 'data': result})
         return jsonify({'error': 'Error al crear el gasto'}), 500
     except Exception as e:
-        print(f"Error al crear gasto: {e}")
+        logger.error("Error al crear gasto: %s", e)
         return jsonify({'error': str(e)}), 500
     try:
         data = request.json
-        print(f"\n=== Actualizando gasto {id} ===")
-        print(f"Datos recibidos: {data}")
+        logger.debug("Actualizando gasto %s", id)
+        log_payload(logger, "Datos recibidos: %s", data)
         
         if not all(key in data for key in ['fecha', 'motivo', 'monto']):
             return jsonify({'error': 'Faltan campos requeridos'}), 400
@@ -321,22 +452,22 @@ def crear_gasto():
             return jsonify({'error': 'El monto debe ser un número válido'}), 400
             
         result = update_gasto(id, data['fecha'], data['motivo'], monto)
-        print(f"Resultado de la actualización: {result}")
+        log_payload(logger, "Resultado de la actualización: %s", result)
         
         if result:
             return jsonify({'success': True, 'data': result})
         return jsonify({'error': 'Error al actualizar el gasto'}), 500
     except Exception as e:
-        print(f"Error al actualizar gasto: {e}")
+        logger.error("Error al actualizar gasto: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/ninos')
 def ninos():
     if 'user' not in session:
         return redirect(url_for('login'))
-    print("Obteniendo lista de niños...")
+    logger.debug("Obteniendo lista de niños...")
     ninos_list = get_ninos()
-    print(f"Lista de niños obtenida: {ninos_list}")
+    log_payload(logger, "Lista de niños obtenida: %s", ninos_list)
     return render_template('ninos.html', active_page='ninos', ninos=ninos_list)
 
 @app.route('/api/ninos', methods=['POST'])
@@ -352,7 +483,7 @@ def crear_nino():
             return jsonify(result)
         return jsonify({'error': 'Error al crear el registro'}), 500
     except Exception as e:
-        print(f"Error al crear niño: {e}")
+        logger.error("Error al crear niño: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/ninos/<int:id>', methods=['PUT'])
@@ -361,9 +492,9 @@ def actualizar_nino(id):
     if 'user' not in session:
         return jsonify({'error': 'No autorizado'}), 401
     try:
-        print(f"\n=== Procesando actualización para niño {id} ===")
+        logger.debug("Procesando actualización para niño %s", id)
         data = request.json
-        print(f"Datos recibidos: {data}")
+        log_payload(logger, "Datos recibidos: %s", data)
         
         # Validar datos
         if not all(key in data for key in ['nombre', 'monto', 'representante', 'status']):
@@ -375,15 +506,13 @@ def actualizar_nino(id):
             return jsonify({'error': 'El monto debe ser un número válido'}), 400
             
         result = update_nino(id, data['nombre'], monto, data['representante'], data['status'])
-        print(f"Resultado de la actualización: {result}")
+        log_payload(logger, "Resultado de la actualización: %s", result)
         
         if result:
             return jsonify(result)
         return jsonify({'error': 'Error al actualizar el registro. Por favor, verifica los datos.'}), 500
     except Exception as e:
-        print(f"Error al actualizar niño: {e}")
-        print(f"Tipo de error: {type(e)}")
-        print(f"Error completo: {str(e)}")
+        logger.error("Error al actualizar niño: %s", e)
         return jsonify({'error': f'Error del servidor: {str(e)}'}), 500
 
 @app.route('/api/ninos/<int:id>', methods=['DELETE'])
@@ -397,7 +526,7 @@ def eliminar_nino(id):
             return jsonify({'success': True})
         return jsonify({'error': 'Error al eliminar el registro'}), 500
     except Exception as e:
-        print(f"Error al eliminar niño: {e}")
+        logger.error("Error al eliminar niño: %s", e)
         return jsonify({'error': str(e)}), 500
     return render_template('ninos.html', active_page='ninos')
 
@@ -405,9 +534,9 @@ def eliminar_nino(id):
 def employees():
     if 'user' not in session:
         return redirect(url_for('login'))
-    print("Obteniendo lista de empleados...")
+    logger.debug("Obteniendo lista de empleados...")
     employees_list = get_employees()
-    print(f"Lista de empleados obtenida: {employees_list}")
+    log_payload(logger, "Lista de empleados obtenida: %s", employees_list)
     return render_template('employees.html', active_page='employees', employees=employees_list)
 
 @app.route('/api/employees', methods=['POST'])
@@ -429,7 +558,7 @@ def crear_employee():
             return jsonify(result)
         return jsonify({'error': 'Error al crear el registro'}), 500
     except Exception as e:
-        print(f"Error al crear empleado: {e}")
+        logger.error("Error al crear empleado: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/employees/<int:id>', methods=['PUT'])
@@ -438,7 +567,7 @@ def actualizar_employee(id):
         return jsonify({'error': 'No autorizado'}), 401
     try:
         data = request.json
-        print(f"Datos recibidos: {data}")
+        log_payload(logger, "Datos recibidos: %s", data)
         
         if not all(key in data for key in ['nombre', 'horas', 'usuario', 'nivel', 'status']):
             return jsonify({'error': 'Faltan campos requeridos'}), 400
@@ -456,7 +585,7 @@ def actualizar_employee(id):
             return jsonify(result)
         return jsonify({'error': 'Error al actualizar el registro'}), 500
     except Exception as e:
-        print(f"Error al actualizar empleado: {e}")
+        logger.error("Error al actualizar empleado: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/employees/<int:id>', methods=['DELETE'])
@@ -469,7 +598,7 @@ def eliminar_employee(id):
             return jsonify({'success': True})
         return jsonify({'error': 'Error al eliminar el registro'}), 500
     except Exception as e:
-        print(f"Error al eliminar empleado: {e}")
+        logger.error("Error al eliminar empleado: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/ninos-activos')
@@ -480,7 +609,7 @@ def get_ninos_activos():
         ninos = get_active_ninos()
         return jsonify(ninos)
     except Exception as e:
-        print(f"Error al obtener niños activos: {e}")
+        logger.error("Error al obtener niños activos: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/employees-activos')
@@ -491,7 +620,7 @@ def get_employees_activos():
         employees = get_active_employees()
         return jsonify(employees)
     except Exception as e:
-        print(f"Error al obtener empleados activos: {e}")
+        logger.error("Error al obtener empleados activos: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/hoy')
@@ -514,8 +643,12 @@ def hoy(date=None):
             target_date = get_current_time().date().isoformat()
     
     # Obtener datos de asistencia para la fecha especificada
-    ninos_asistencia, total_ninos = get_date_ninos_asistencia(target_date)
-    employees_asistencia, total_horas = get_date_employees_asistencia(target_date)
+    resultados = run_parallel({
+        'ninos': lambda: get_date_ninos_asistencia(target_date),
+        'employees': lambda: get_date_employees_asistencia(target_date)
+    }, defaults={'ninos': ([], 0), 'employees': ([], 0)})
+    ninos_asistencia, total_ninos = resultados['ninos']
+    employees_asistencia, total_horas = resultados['employees']
     
     # Calcular pago por hora
     pago_por_hora = 0
@@ -532,12 +665,12 @@ def hoy(date=None):
         day_name = 'Hoy'
         formatted_date = get_current_time().date().strftime('%d/%m/%Y')
     
-    print(f"DEBUG - Fecha objetivo: {target_date}")
-    print(f"DEBUG - ninos_asistencia: {ninos_asistencia}")
-    print(f"DEBUG - employees_asistencia: {employees_asistencia}")
-    print(f"DEBUG - total_ninos: ${total_ninos}")
-    print(f"DEBUG - total_horas: {total_horas}")
-    print(f"DEBUG - pago_por_hora: ${pago_por_hora}")
+    logger.debug("Fecha objetivo: %s", target_date)
+    log_payload(logger, "ninos_asistencia: %s", ninos_asistencia)
+    log_payload(logger, "employees_asistencia: %s", employees_asistencia)
+    logger.debug("total_ninos: $%s", total_ninos)
+    logger.debug("total_horas: %s", total_horas)
+    logger.debug("pago_por_hora: $%s", pago_por_hora)
     
     return render_template('hoy.html', 
                            active_page='hoy',
@@ -555,13 +688,24 @@ def pagos():
     if 'user' not in session:
         return redirect(url_for('login'))
     
-    # Obtenemos el historial agrupado por defecto (últimos 20 grupos)
-    recent_pagos_grouped = get_grouped_pagos(limit=20)
-    pending_payments = get_pending_payments()
+    # Obtenemos el historial agrupado por defecto (últimos 20 grupos) junto con el resto en paralelo
+    resultados = run_parallel({
+        'recent_pagos_grouped': lambda: get_grouped_pagos(limit=20),
+        'pending_payments': get_pending_payments,
+        'ninos_activos': get_active_ninos,
+        'employees_activos': get_active_employees
+    }, defaults={
+        'recent_pagos_grouped': [],
+        'pending_payments': [],
+        'ninos_activos': [],
+        'employees_activos': []
+    })
+    recent_pagos_grouped = resultados['recent_pagos_grouped']
+    pending_payments = resultados['pending_payments']
     fecha_limite_reversion = (get_current_time().date() - timedelta(days=6)).strftime('%Y-%m-%d')
     
-    ninos_activos = get_active_ninos()
-    employees_activos = get_active_employees()
+    ninos_activos = resultados['ninos_activos']
+    employees_activos = resultados['employees_activos']
     
     return render_template('pagos.html', 
                            active_page='pagos',
@@ -602,7 +746,7 @@ def crear_pago():
             return jsonify({'success': True, 'data': result})
         return jsonify({'error': 'Error al crear el pago'}), 500
     except Exception as e:
-        print(f"Error al crear pago: {e}")
+        logger.error("Error al crear pago: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/pagos/registrar_pago_multiple', methods=['POST'])
@@ -616,7 +760,7 @@ def registrar_pago_multiple():
         if not pagos:
             return jsonify({'error': 'No se enviaron pagos para registrar.'}), 400
 
-        pagos_realizados = 0
+        pagos_validos = []
         for pago in pagos:
             try:
                 id_nino = int(pago.get('id_nino'))
@@ -628,22 +772,29 @@ def registrar_pago_multiple():
                 if not all([id_nino, monto, id_empleado, fecha, tipo]):
                     continue
 
-                result = add_pago(fecha, id_nino, id_empleado, monto, tipo)
-                if result:
-                    pagos_realizados += 1
+                pagos_validos.append({
+                    'fecha': fecha,
+                    'id_nino': id_nino,
+                    'id_empleado': id_empleado,
+                    'monto': monto,
+                    'tipo': tipo
+                })
             except (ValueError, TypeError) as e:
-                print(f"Error procesando pago individual: {e}")
+                logger.error("Error procesando pago individual: %s", e)
                 continue
+
+        resultados = add_pagos_lote(pagos_validos)
+        pagos_realizados = sum(1 for r in resultados if r['success'])
         
         if pagos_realizados < len(pagos):
             error_msg = f"Se procesaron {len(pagos)} pagos, pero solo {pagos_realizados} tuvieron éxito."
-            print(f"Error en registrar_pago_multiple: {error_msg}")
-            return jsonify({'error': error_msg, 'success': False}), 207
+            logger.error("Error en registrar_pago_multiple: %s", error_msg)
+            return jsonify({'error': error_msg, 'success': False, 'resultados': resultados}), 207
 
-        return jsonify({'success': True})
+        return jsonify({'success': True, 'resultados': resultados})
 
     except Exception as e:
-        print(f"Error al registrar pago múltiple: {e}")
+        logger.error("Error al registrar pago múltiple: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/pagos/registrar_pago_dividido', methods=['POST'])
@@ -691,10 +842,10 @@ def registrar_pago_dividido():
 
         return jsonify({'error': 'No se pudo registrar el pago dividido.'}), 500
     except (ValueError, TypeError) as e:
-        print(f"Datos inválidos en pago dividido: {e}")
+        logger.warning("Datos inválidos en pago dividido: %s", e)
         return jsonify({'error': 'Datos inválidos para el pago dividido.'}), 400
     except Exception as e:
-        print(f"Error al registrar pago dividido: {e}")
+        logger.error("Error al registrar pago dividido: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/pagos/registrar_multiple', methods=['POST'])
@@ -711,21 +862,28 @@ def registrar_multiple_v2():
         if not ninos_ids or not id_empleado or not fecha or not tipo:
             return jsonify({'error': 'Faltan datos requeridos (ninos_ids, id_empleado, fecha, tipo)'}), 400
             
-        success_count = 0
         from database import calculate_debt_snapshot
         snapshot_debts = calculate_debt_snapshot(fecha)
         
+        pagos_lote = []
         for nino_id in ninos_ids:
             # Obtener el monto adeudado para este niño en esa fecha
             monto = snapshot_debts.get(str(nino_id), 0)
             if monto > 0:
-                result = add_pago(fecha, nino_id, int(id_empleado), monto, tipo)
-                if result:
-                    success_count += 1
+                pagos_lote.append({
+                    'fecha': fecha,
+                    'id_nino': nino_id,
+                    'id_empleado': int(id_empleado),
+                    'monto': monto,
+                    'tipo': tipo
+                })
+
+        resultados = add_pagos_lote(pagos_lote)
+        success_count = sum(1 for r in resultados if r['success'])
         
-        return jsonify({'success': True, 'count': success_count})
+        return jsonify({'success': True, 'count': success_count, 'resultados': resultados})
     except Exception as e:
-        print(f"Error en registrar_multiple: {e}")
+        logger.error("Error en registrar_multiple: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/asistencia', methods=['POST'])
@@ -744,7 +902,7 @@ def crear_asistencia():
             return jsonify({'success': True, 'data': result})
         return jsonify({'error': 'Error al crear el registro de asistencia'}), 500
     except Exception as e:
-        print(f"Error al crear asistencia: {e}")
+        logger.error("Error al crear asistencia: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/asistencia/multiple', methods=['POST'])
@@ -755,18 +913,24 @@ def crear_asistencia_multiple():
         data = request.json
         fecha = data['fecha']
         ninos = data['ninos']
-        
-        for nino in ninos:
-            add_asistencia(
-                fecha,
-                'nino',
-                nino['id_persona'],
-                nino['valor']
-            )
-            
-        return jsonify({'success': True})
+
+        resultados = add_asistencias_lote([
+            {
+                'fecha': fecha,
+                'tipo': 'nino',
+                'id_persona': nino.get('id_persona'),
+                'valor': nino.get('valor')
+            }
+            for nino in ninos
+        ])
+        success_count = sum(1 for r in resultados if r['success'])
+        if resultados and not success_count:
+            error = resultados[0]['error'] or 'No se pudo guardar la asistencia'
+            return jsonify({'error': error, 'resultados': resultados}), 500
+
+        return jsonify({'success': True, 'count': success_count, 'resultados': resultados})
     except Exception as e:
-        print(f"Error al crear asistencia múltiple: {e}")
+        logger.error("Error al crear asistencia múltiple: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/asistencia/<int:id>', methods=['PUT'])
@@ -780,7 +944,7 @@ def actualizar_asistencia(id):
             return jsonify({'success': True, 'data': result})
         return jsonify({'error': 'Error al actualizar el registro de asistencia'}), 500
     except Exception as e:
-        print(f"Error al actualizar asistencia: {e}")
+        logger.error("Error al actualizar asistencia: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/asistencia/<int:id>', methods=['DELETE'])
@@ -793,7 +957,7 @@ def eliminar_asistencia(id):
             return jsonify({'success': True})
         return jsonify({'error': 'Error al eliminar el registro'}), 500
     except Exception as e:
-        print(f"Error al eliminar asistencia: {e}")
+        logger.error("Error al eliminar asistencia: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/gastos/<int:id>', methods=['PUT'])
@@ -803,8 +967,8 @@ def actualizar_gasto(id):
         return jsonify({'error': 'No autorizado'}), 401
     try:
         data = request.json
-        print(f"\n=== Actualizando gasto {id} ===")
-        print(f"Datos recibidos: {data}")
+        logger.debug("Actualizando gasto %s", id)
+        log_payload(logger, "Datos recibidos: %s", data)
         
         if not all(key in data for key in ['fecha', 'motivo', 'monto']):
             return jsonify({'error': 'Faltan campos requeridos'}), 400
@@ -815,13 +979,13 @@ def actualizar_gasto(id):
             return jsonify({'error': 'El monto debe ser un número válido'}), 400
             
         result = update_gasto(id, data['fecha'], data['motivo'], monto)
-        print(f"Resultado de la actualización: {result}")
+        log_payload(logger, "Resultado de la actualización: %s", result)
         
         if result:
             return jsonify({'success': True, 'data': result})
         return jsonify({'error': 'Error al actualizar el gasto'}), 500
     except Exception as e:
-        print(f"Error al actualizar gasto: {e}")
+        logger.error("Error al actualizar gasto: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/gastos/<int:id>', methods=['DELETE'])
@@ -841,7 +1005,7 @@ def api_get_ninos():
         ninos = get_ninos()
         return jsonify(ninos)
     except Exception as e:
-        print(f"Error al obtener niños: {e}")
+        logger.error("Error al obtener niños: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/ninos/con_deuda', methods=['GET'])
@@ -852,7 +1016,7 @@ def api_get_ninos_con_deuda():
         ninos = get_ninos_con_deuda()
         return jsonify(ninos)
     except Exception as e:
-        print(f"Error al obtener niños con deuda: {e}")
+        logger.error("Error al obtener niños con deuda: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/gastos/ajustar_pagos', methods=['POST'])
@@ -870,17 +1034,35 @@ def ajustar_pagos():
         from database import calculate_debt_snapshot
         snapshot_debts = calculate_debt_snapshot(fecha)
 
+        pagos_lote = []
         for nino_id in ninos_ids:
             nino_id_str = str(nino_id)
             monto_deuda = snapshot_debts.get(nino_id_str, 0)
             
             if monto_deuda > 0:
                 # Usamos ID 9 (Caja/Casa) para los ajustes
-                add_pago(fecha, nino_id, 9, monto_deuda, 'Ajuste')
-
-        return jsonify({'success': True})
+                pagos_lote.append({
+                    'fecha': fecha,
+                    'id_nino': nino_id,
+                    'id_empleado': 9,
+                    'monto': monto_deuda,
+                    'tipo': 'Ajuste'
+                })
+
+        resultados = add_pagos_lote(pagos_lote)
+        fallidos = [r for r in resultados if not r['success']]
+        if fallidos and len(fallidos) == len(resultados):
+            error = fallidos[0]['error'] or 'No se pudo registrar ningún ajuste'
+            return jsonify({'error': error, 'resultados': resultados}), 500
+
+        return jsonify({
+            'success': True,
+            'count': len(resultados) - len(fallidos),
+            'fallidos': [r['id_nino'] for r in fallidos],
+            'resultados': resultados
+        })
     except Exception as e:
-        print(f"Error al ajustar pagos: {e}")
+        logger.error("Error al ajustar pagos: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/pagos/revertir/<int:id>', methods=['POST'])
@@ -893,7 +1075,7 @@ def revertir_pago_api(id):
             return jsonify({'success': True})
         return jsonify({'error': 'No se pudo revertir el pago'}), 500
     except Exception as e:
-        print(f"Error en revertir_pago_api: {e}")
+        logger.error("Error en revertir_pago_api: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/pagos/revertir_grupo', methods=['POST'])
@@ -904,17 +1086,13 @@ def revertir_grupo_api():
     try:
         data = request.json
         pago_ids = data.get('pago_ids', [])
-        
-        success_count = 0
-        for pid in pago_ids:
-            if delete_pago(pid):
-                success_count += 1
-                
-        if success_count > 0:
-            return jsonify({'success': True, 'count': success_count})
+
+        eliminados = delete_pagos(pago_ids)
+        if eliminados:
+            return jsonify({'success': True, 'count': len(eliminados)})
         return jsonify({'error': 'No se pudo revertir ningún pago'}), 500
     except Exception as e:
-        print(f"Error en revertir_grupo_api: {e}")
+        logger.error("Error en revertir_grupo_api: %s", e)
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/pagos/reasignar_empleada', methods=['POST'])
@@ -937,9 +1115,48 @@ def reasignar_pago_empleada_api():
     except (TypeError, ValueError):
         return jsonify({'error': 'Datos invalidos para reasignar el pago'}), 400
     except Exception as e:
-        print(f"Error en reasignar_pago_empleada_api: {e}")
+        logger.error("Error en reasignar_pago_empleada_api: %s", e)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/warmup', methods=['GET'])
+def warmup_api():
+    """Crear el cliente de Supabase y abrir su conexión antes del primer request real.
+
+    Pensado para un cron o un ping tras el deploy: el primer request a una instancia fría
+    no paga la importación de supabase ni el handshake TLS. La ruta no pide sesión, así que
+    solo responde si funcionó; el estado del pool está en /debug/pool (solo Admin).
+    """
+    ok = warmup()
+    return jsonify({'ok': ok}), 200 if ok else 503
+
+_RECONSTRUCCIONES = (
+    ('Libro de deuda', '003_deuda_semanal.sql', reconcile_debt_ledger),
+    ('Índice de deuda acumulada', '004_deuda_acumulada.sql', reconcile_debt_snapshot_index),
+)
+
+@app.cli.command('reconciliar-deuda')
+def reconciliar_deuda():
+    """Reconstruir desde cero el libro de deuda semanal y el índice de deuda acumulada."""
+    fallas = 0
+    for nombre, migracion, reconstruir in _RECONSTRUCCIONES:
+        try:
+            filas = reconstruir()
+        except Exception as e:
+            fallas += 1
+            if getattr(e, 'code', None) == '42501':
+                # Migración aplicada con una versión anterior que solo concedía la función a service_role
+                print(f"{nombre}: permiso denegado. Volver a aplicar migrations/{migracion} "
+                      f"o correr el comando con la clave service_role en SUPABASE_KEY.")
+            else:
+                print(f"{nombre}: error al reconstruir: {e}")
+            continue
+        if filas is None:
+            print(f"{nombre}: no está instalado (migrations/{migracion}).")
+        else:
+            print(f"{nombre} reconstruido: {filas} filas.")
+    if fallas:
+        raise SystemExit(1)
+
 @app.route('/logout', methods=['GET', 'POST'])
 def logout():
     session.pop('user', None)
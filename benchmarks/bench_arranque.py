@@ -0,0 +1,80 @@
+"""Benchmark del arranque en frío: cuánto tarda `import app` en un proceso nuevo.
+
+En Vercel cada instancia fría importa app.py antes de atender el primer request, así que lo
+que se importe o se cree al cargar los módulos se suma a la latencia de ese request. Este
+script importa app en procesos nuevos, reporta la mediana y verifica que las dependencias
+pesadas (supabase, postgrest, httpx...) no se carguen hasta la primera consulta.
+
+Termina con código 1 si la mediana supera el presupuesto o si se importa algo de la lista.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_arranque.py
+    python benchmarks/bench_arranque.py --presupuesto-ms 250 --repeticiones 9
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que solo deben cargarse al crear el cliente de Supabase.
+DIFERIDOS = ('supabase', 'postgrest', 'gotrue', 'storage3', 'realtime', 'httpx')
+
+_MEDIR = """
+import json, sys, time
+inicio = time.perf_counter()
+import app
+ms = (time.perf_counter() - inicio) * 1000
+cargados = sorted({m.split('.')[0] for m in sys.modules} & set(json.loads(sys.argv[1])))
+print(json.dumps({'ms': ms, 'cargados': cargados}))
+"""
+
+def medir_una_vez():
+    """Importar app en un proceso nuevo; devuelve {'ms', 'cargados'}."""
+    env = dict(os.environ)
+    # Sin red ni credenciales reales: importar app no debe conectarse a nada.
+    env.update({
+        'SUPABASE_URL': 'http://localhost:54321',
+        'SUPABASE_KEY': 'eyJhbGciOiJIUzI1NiJ9.e30.benchmark',
+        'LOG_LEVEL': 'ERROR',
+        'PYTHONDONTWRITEBYTECODE': '1',
+    })
+    salida = subprocess.run([sys.executable, '-c', _MEDIR, json.dumps(DIFERIDOS)],
+                            cwd=RAIZ, env=env, capture_output=True, text=True, check=True)
+    return json.loads(salida.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repeticiones', type=int, default=7)
+    parser.add_argument('--presupuesto-ms', type=float, default=300.0,
+                        help='mediana máxima aceptada para `import app`')
+    args = parser.parse_args(argv)
+
+    medir_una_vez()  # calentar la caché de bytecode y del sistema de archivos
+    resultados = [medir_una_vez() for _ in range(args.repeticiones)]
+    tiempos = [r['ms'] for r in resultados]
+    cargados = sorted({m for r in resultados for m in r['cargados']})
+
+    print(f"import app: mediana {statistics.median(tiempos):.1f} ms "
+          f"(min {min(tiempos):.1f}, max {max(tiempos):.1f}, {args.repeticiones} procesos)")
+
+    fallas = []
+    if statistics.median(tiempos) > args.presupuesto_ms:
+        fallas.append(f"la mediana supera el presupuesto de {args.presupuesto_ms:.0f} ms")
+    if cargados:
+        fallas.append(f"se importan al arrancar: {', '.join(cargados)}")
+
+    if fallas:
+        print("\nRegresiones en el arranque:")
+        for f in fallas:
+            print(f"  - {f}")
+        return 1
+    print(f"\nDentro del presupuesto de {args.presupuesto_ms:.0f} ms.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
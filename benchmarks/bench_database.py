@@ -0,0 +1,297 @@
+"""Benchmark de las rutas calientes de database.py sobre datos sembrados en memoria.
+
+Siembra un ClienteMemoria (supabase_memoria.py) con niños, empleadas, asistencia, pagos y gastos
+a la escala indicada, ejecuta cada función y reporta el tiempo de pared, los round-trips a
+Supabase y el tiempo estimado con red (tiempo + round-trips * RTT). Compara los round-trips
+contra benchmarks/baseline.json y termina con código 1 si alguno sube.
+
+Los datos se siembran hasta FECHA_REFERENCIA, que también es "hoy" para database.py durante
+la medición, así dos corridas miden lo mismo sin importar el día. El tiempo de pared depende
+de la máquina, por eso se reporta pero no se compara con el baseline.
+
+Uso (desde la raíz del repo):
+    python benchmarks/bench_database.py                       # 200 niños, 3 años
+    python benchmarks/bench_database.py --ninos 50 --anos 1
+    python benchmarks/bench_database.py --guardar-baseline    # actualizar el baseline
+
+Las funciones de Postgres de migrations/ no existen en memoria, así que se mide la ruta en
+Python de cada función (salvo ajustar_saldos, emulada para el caso "con 007");
+bench_deuda_pg.py mide deuda_a_fecha en un Postgres real.
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+import pytz
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# database.py crea el cliente real al importarse; con estos valores no se conecta a nada.
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.e30.benchmark")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("QUERY_STATS", "0")
+
+import database as db
+from supabase_memoria import ClienteMemoria
+
+BASELINE_PATH = os.path.join(RAIZ, 'benchmarks', 'baseline.json')
+
+# Último día de los datos sembrados (un viernes)
+FECHA_REFERENCIA = date(2026, 3, 13)
+
+def fijar_reloj(hoy):
+    """Hacer que database.get_current_time devuelva el mediodía de `hoy` en la zona del negocio."""
+    ahora = pytz.timezone('America/Chicago').localize(datetime(hoy.year, hoy.month, hoy.day, 12))
+    db.get_current_time = lambda: ahora
+
+def sembrar(ninos=200, empleadas=8, anos=3, semilla=7, hoy=FECHA_REFERENCIA):
+    """Crear un ClienteMemoria con datos de `anos` años de operación hasta `hoy`.
+
+    Cada niño asiste de lunes a viernes con probabilidad 0.85 y se le registra un pago semanal
+    que liquida su semana. Los pagos del primer tercio del período son "legacy" (asistencias
+    pagadas sin id_pago), un 5% de los pagos son divididos, y un tercio de los niños deja sin
+    pagar las dos últimas semanas. Los pagos tienen la columna split_group_id
+    (migrations/006_split_group_id.sql).
+    """
+    rnd = random.Random(semilla)
+    inicio = hoy - timedelta(days=365 * anos)
+    inicio = inicio - timedelta(days=inicio.weekday())
+    corte_legacy = inicio + (hoy - inicio) / 3
+    lunes_actual = hoy - timedelta(days=hoy.weekday())
+    semanas_pendientes = lunes_actual - timedelta(days=7)
+
+    tabla_ninos = [{
+        'id': i,
+        'nombre': f'Niño {i:03d}',
+        'monto': rnd.choice([15, 20, 25, 30]),
+        'Representante': f'Representante {i:03d}',
+        'status': 1 if i <= ninos * 0.85 else 0,
+        'saldo': 0
+    } for i in range(1, ninos + 1)]
+    morosos = {n['id'] for n in tabla_ninos if rnd.random() < 0.33}
+
+    tabla_employees = [{
+        'id': i,
+        'nombre': f'Empleada {i}',
+        'horas': 8,
+        'usuario': f'empleada{i}',
+        'contrasena': 'x',
+        'nivel': 'Admin' if i == 1 else 'Regular',
+        'status': 1
+    } for i in range(1, empleadas + 1)]
+
+    asistencia, pagos, gastos = [], [], []
+    semana = inicio
+    while semana <= hoy:
+        dias = [semana + timedelta(days=d) for d in range(5) if semana + timedelta(days=d) <= hoy]
+        for dia in dias:
+            fecha = dia.isoformat()
+            for e in tabla_employees:
+                asistencia.append({'id': len(asistencia) + 1, 'fecha': fecha, 'tipo': 'trabajadora',
+                                   'id_persona': e['id'], 'valor': float(rnd.choice([6, 7, 8])),
+                                   'pagado': False, 'id_pago': None})
+
+        for nino in tabla_ninos:
+            filas = []
+            for dia in dias:
+                if rnd.random() < 0.85:
+                    fila = {'id': len(asistencia) + 1, 'fecha': dia.isoformat(), 'tipo': 'nino',
+                            'id_persona': nino['id'], 'valor': float(nino['monto']),
+                            'pagado': False, 'id_pago': None}
+                    asistencia.append(fila)
+                    filas.append(fila)
+            if not filas:
+                continue
+
+            if semana >= semanas_pendientes and nino['id'] in morosos:
+                nino['saldo'] += sum(f['valor'] for f in filas)
+                continue
+
+            fecha_pago = filas[-1]['fecha']
+            total = sum(f['valor'] for f in filas)
+            if rnd.random() < 0.05 and total > 1:
+                grupo = f'{len(pagos):032x}'
+                primera = round(total / 2, 2)
+                partes = [(primera, 'Efectivo'), (total - primera, 'Zelle')]
+                for monto, tipo in partes:
+                    pagos.append({'id': len(pagos) + 1, 'date': fecha_pago, 'id_nino': nino['id'],
+                                  'id_empleado': rnd.choice(tabla_employees)['id'], 'monto': monto,
+                                  'tipo': tipo, 'split_group_id': grupo})
+            else:
+                pagos.append({'id': len(pagos) + 1, 'date': fecha_pago, 'id_nino': nino['id'],
+                              'id_empleado': rnd.choice(tabla_employees)['id'], 'monto': total,
+                              'tipo': rnd.choice(['Efectivo', 'Zelle']), 'split_group_id': None})
+
+            legacy = semana < corte_legacy
+            for f in filas:
+                f['pagado'] = True
+                f['id_pago'] = None if legacy else pagos[-1]['id']
+
+        for _ in range(2):
+            dia = semana + timedelta(days=rnd.randrange(5))
+            if dia <= hoy:
+                gastos.append({'id': len(gastos) + 1, 'fecha': dia.isoformat(),
+                               'motivo': rnd.choice(['Comida', 'Materiales', 'Limpieza']),
+                               'monto': float(rnd.randrange(20, 200))})
+        semana += timedelta(days=7)
+
+    cliente = ClienteMemoria()
+    cliente.cargar('ninos', tabla_ninos)
+    cliente.cargar('employees', tabla_employees)
+    cliente.cargar('asistencia', asistencia)
+    cliente.cargar('pagos', pagos)
+    cliente.cargar('gastos', gastos)
+    return cliente
+
+def _pago(cliente, dividido=False, legacy=False):
+    """El pago más reciente del tipo pedido."""
+    enlazados = {a['id_pago'] for a in cliente.filas('asistencia') if a['id_pago'] is not None}
+    for pago in reversed(cliente.filas('pagos')):
+        es_dividido = db._split_group_id(pago) is not None
+        if es_dividido != dividido:
+            continue
+        if dividido or legacy == (pago['id'] not in enlazados):
+            return pago['id']
+    return None
+
+def ajustar_saldos(cliente, params):
+    """Equivalente en memoria de ajustar_saldos (migrations/007_ajustar_saldos.sql)."""
+    por_id = {fila['id']: fila for fila in cliente.filas('ninos')}
+    filas = []
+    for id_nino, delta in params['p_deltas'].items():
+        fila = por_id.get(int(id_nino))
+        if fila is not None:
+            fila['saldo'] = float(fila.get('saldo') or 0) + float(delta)
+            filas.append({'id': fila['id'], 'saldo': fila['saldo']})
+    return filas
+
+def _con_ajustar_saldos(funcion):
+    def correr():
+        db.supabase.funciones['ajustar_saldos'] = ajustar_saldos
+        return funcion()
+    return correr
+
+def casos(cliente, hoy=FECHA_REFERENCIA):
+    """{nombre: (función, muta_datos)}."""
+    lunes = hoy - timedelta(days=hoy.weekday())
+    domingo = lunes + timedelta(days=6)
+    pago_enlazado = _pago(cliente)
+    pago_legacy = _pago(cliente, legacy=True)
+    pago_dividido = _pago(cliente, dividido=True)
+    lote = [p['id'] for p in cliente.filas('pagos')[-20:]]
+    asistencias = [{'fecha': hoy.isoformat(), 'tipo': 'nino', 'id_persona': n['id'], 'valor': n['monto']}
+                   for n in cliente.filas('ninos')[:50]]
+    return {
+        'get_week_employees_earnings': (lambda: db.get_week_employees_earnings(lunes, domingo), False),
+        'get_pending_payments': (db.get_pending_payments, False),
+        'get_week_attendance_payment_summary': (lambda: db.get_week_attendance_payment_summary(lunes, domingo), False),
+        'calculate_debt_snapshot': (lambda: db.calculate_debt_snapshot(hoy.isoformat()), False),
+        'delete_pago (enlazado)': (lambda: db.delete_pago(pago_enlazado), True),
+        'delete_pago (legacy)': (lambda: db.delete_pago(pago_legacy), True),
+        'delete_pago (dividido)': (lambda: db.delete_pago(pago_dividido), True),
+        'delete_pagos (20 pagos)': (lambda: db.delete_pagos(lote), True),
+        # Sin la migración 007 el saldo se escribe niño por niño; con ella es una sola llamada
+        'add_asistencias_lote (50 niños, sin 007)': (lambda: db.add_asistencias_lote(asistencias), True),
+        'add_asistencias_lote (50 niños, con 007)': (
+            _con_ajustar_saldos(lambda: db.add_asistencias_lote(asistencias)), True),
+    }
+
+def medir(base, funcion, muta, repeticiones):
+    """Ejecutar la función con el roster frío; devuelve (ms mediana, round-trips)."""
+    tiempos, round_trips = [], 0
+    for _ in range(repeticiones):
+        cliente = base.copiar() if muta else base
+        cliente.llamadas.clear()
+        db.supabase = cliente
+        db.invalidate_roster()
+        db._rpc_no_disponibles.clear()
+
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        round_trips = len(cliente.llamadas)
+    return statistics.median(tiempos), round_trips
+
+def comparar(resultados, baseline, escala):
+    """Lista de casos con más round-trips que en el baseline, o None si no hay baseline de la
+    misma escala."""
+    if not baseline:
+        return None
+    if baseline.get('escala') != escala:
+        print(f"\nEl baseline es de otra escala ({baseline.get('escala')}); no se compara.")
+        return None
+
+    regresiones = []
+    for nombre, actual in resultados.items():
+        previo = baseline['resultados'].get(nombre)
+        if not previo:
+            continue
+        if actual['round_trips'] > previo['round_trips']:
+            regresiones.append(f"{nombre}: round-trips {previo['round_trips']} -> {actual['round_trips']}")
+    return regresiones
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--ninos', type=int, default=200)
+    parser.add_argument('--empleadas', type=int, default=8)
+    parser.add_argument('--anos', type=int, default=3)
+    parser.add_argument('--repeticiones', type=int, default=3)
+    parser.add_argument('--rtt-ms', type=float, default=25.0,
+                        help='latencia simulada por round-trip para la columna "con red"')
+    parser.add_argument('--latencia-ms', type=float, default=0.0,
+                        help='latencia real inyectada en cada execute() del emulador')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--guardar-baseline', action='store_true')
+    parser.add_argument('--solo', action='append', help='medir solo estos casos')
+    args = parser.parse_args(argv)
+
+    escala = {'ninos': args.ninos, 'empleadas': args.empleadas, 'anos': args.anos,
+              'hasta': FECHA_REFERENCIA.isoformat()}
+    fijar_reloj(FECHA_REFERENCIA)
+    inicio = time.perf_counter()
+    base = sembrar(args.ninos, args.empleadas, args.anos)
+    base.latencia_ms = args.latencia_ms
+    print(f"Datos sembrados en {time.perf_counter() - inicio:.1f}s: "
+          + ', '.join(f"{t}={len(filas)}" for t, filas in base.tablas.items()))
+
+    resultados = {}
+    print(f"\n{'caso':40} {'ms':>10} {'round-trips':>12} {'con red (ms)':>14}")
+    for nombre, (funcion, muta) in casos(base).items():
+        if args.solo and nombre not in args.solo:
+            continue
+        ms, round_trips = medir(base, funcion, muta, args.repeticiones)
+        resultados[nombre] = {'round_trips': round_trips}
+        print(f"{nombre:40} {ms:10.1f} {round_trips:12d} {ms + round_trips * args.rtt_ms:14.1f}")
+
+    baseline = None
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    if args.guardar_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'escala': escala, 'resultados': resultados}, f, indent=2, ensure_ascii=False)
+            f.write('\n')
+        print(f"\nBaseline guardado en {args.baseline}")
+        return 0
+
+    regresiones = comparar(resultados, baseline, escala)
+    if regresiones:
+        print("\nRegresiones respecto al baseline:")
+        for r in regresiones:
+            print(f"  - {r}")
+        return 1
+    if regresiones is not None:
+        print("\nSin regresiones respecto al baseline.")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
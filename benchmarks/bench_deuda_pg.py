@@ -0,0 +1,157 @@
+"""Benchmark de deuda_a_fecha (migrations/004_deuda_acumulada.sql) en un Postgres real.
+
+bench_database.py corre sobre el emulador en memoria, donde las funciones de Postgres no
+existen, así que su caso calculate_debt_snapshot mide la ruta en Python. Este script carga
+las migraciones en una base desechable (postgres_local.py), siembra varios tamaños de
+historial y compara, para todos los niños a la fecha de hoy:
+
+  indice    select * from deuda_a_fecha(hoy, ids): una búsqueda por niño en deuda_acumulada
+  escaneo   las sumas de asistencia y pagos hasta hoy sobre las tablas completas, lo que
+            tendría que hacer la base sin el índice (sin contar la transferencia a Python)
+
+Además mide lo que el índice agrega a cada escritura: insertar una asistencia de hoy (solo
+toca la última fila del niño) y una del inicio del período (ajusta todas las posteriores).
+
+Termina con código 1 si deuda_a_fecha y el escaneo no dan los mismos totales.
+
+Uso (desde la raíz del repo, con las dependencias de requirements-dev.txt):
+    python benchmarks/bench_deuda_pg.py
+    python benchmarks/bench_deuda_pg.py --ninos 100 --anos 1 5 10 --repeticiones 9
+    POSTGRES_PRUEBAS_URL=postgresql://postgres@localhost/postgres python benchmarks/bench_deuda_pg.py
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from datetime import date, timedelta
+
+from postgres_local import PostgresNoDisponible, base_desechable
+
+_SEMBRAR = """
+alter table public.asistencia disable trigger user;
+alter table public.pagos disable trigger user;
+truncate public.ninos, public.asistencia, public.pagos restart identity;
+
+select setseed(0.42);
+insert into public.ninos (nombre, monto, status)
+select 'Niño ' || n, (array[15, 20, 25, 30])[1 + n %% 4], 1
+from generate_series(1, %(ninos)s) n;
+
+-- Lunes a viernes con probabilidad 0.85
+insert into public.asistencia (fecha, tipo, id_persona, valor, pagado)
+select d::date, 'nino', n.id, n.monto, true
+from public.ninos n
+cross join generate_series(%(inicio)s::date, %(hoy)s::date, interval '1 day') d
+where extract(isodow from d) < 6 and random() < 0.85;
+
+-- Un pago por semana y niño con lo que asistió
+insert into public.pagos (date, id_nino, id_empleado, monto, tipo)
+select max(fecha), id_persona, 1, sum(valor), 'Efectivo'
+from public.asistencia
+group by id_persona, date_trunc('week', fecha);
+
+alter table public.asistencia enable trigger user;
+alter table public.pagos enable trigger user;
+select public.reconstruir_deuda_acumulada();
+analyze;
+"""
+
+_ESCANEO = """
+select n.id, coalesce(a.total, 0), coalesce(p.total, 0)
+from unnest(%(ids)s::bigint[]) as n(id)
+left join (
+    select id_persona, sum(valor) as total
+    from public.asistencia
+    where tipo = 'nino' and id_persona = any(%(ids)s) and fecha <= %(fecha)s
+    group by id_persona
+) a on a.id_persona = n.id
+left join (
+    select id_nino, sum(monto) as total
+    from public.pagos
+    where id_nino = any(%(ids)s) and date <= %(fecha)s
+    group by id_nino
+) p on p.id_nino = n.id
+"""
+
+def cronometrar(cur, sql, params, repeticiones):
+    """Mediana en ms de ejecutar la consulta y traer sus filas; devuelve (ms, filas)."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        cur.execute(sql, params)
+        filas = cur.fetchall()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return statistics.median(tiempos), filas
+
+def cronometrar_escritura(conn, fecha, id_nino, repeticiones):
+    """Mediana en ms de insertar una asistencia (con los triggers) y deshacerla."""
+    tiempos = []
+    conn.autocommit = False
+    try:
+        with conn.cursor() as cur:
+            for _ in range(repeticiones):
+                inicio = time.perf_counter()
+                cur.execute("insert into public.asistencia (fecha, tipo, id_persona, valor) "
+                            "values (%s, 'nino', %s, 20)", (fecha, id_nino))
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+                conn.rollback()
+    finally:
+        conn.autocommit = True
+    return statistics.median(tiempos)
+
+def medir(conn, ninos, anos, repeticiones):
+    hoy = date.today()
+    inicio = hoy - timedelta(days=365 * anos)
+    with conn.cursor() as cur:
+        cur.execute(_SEMBRAR, {'ninos': ninos, 'inicio': inicio, 'hoy': hoy})
+        cur.execute("select (select count(*) from public.asistencia), (select count(*) from public.pagos), "
+                    "(select count(*) from public.deuda_acumulada)")
+        asistencia, pagos, indice = cur.fetchone()
+        cur.execute("select id from public.ninos order by id")
+        ids = [fila[0] for fila in cur.fetchall()]
+
+        params = {'fecha': hoy, 'ids': ids}
+        ms_indice, por_indice = cronometrar(cur, "select * from public.deuda_a_fecha(%(fecha)s, %(ids)s::bigint[])",
+                                            params, repeticiones)
+        ms_escaneo, por_escaneo = cronometrar(cur, _ESCANEO, params, repeticiones)
+
+    coinciden = sorted(por_indice) == sorted(por_escaneo)
+    return {
+        'anos': anos, 'asistencia': asistencia, 'pagos': pagos, 'indice_filas': indice,
+        'indice_ms': ms_indice, 'escaneo_ms': ms_escaneo, 'coinciden': coinciden,
+        'escritura_hoy_ms': cronometrar_escritura(conn, hoy, ids[0], repeticiones),
+        'escritura_inicio_ms': cronometrar_escritura(conn, inicio, ids[0], repeticiones),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--ninos', type=int, default=200)
+    parser.add_argument('--anos', type=int, nargs='+', default=[1, 3, 6],
+                        help='tamaños de historial a medir, en años')
+    parser.add_argument('--repeticiones', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    try:
+        with base_desechable() as conn:
+            resultados = [medir(conn, args.ninos, anos, args.repeticiones) for anos in args.anos]
+    except PostgresNoDisponible as e:
+        print(f"No hay Postgres para el benchmark: {e}")
+        return 2
+
+    print(f"\n{args.ninos} niños, mediana de {args.repeticiones} ejecuciones")
+    print(f"{'años':>4} {'asistencia':>11} {'pagos':>8} {'índice':>8} {'deuda_a_fecha':>14} "
+          f"{'escaneo':>9} {'insert hoy':>11} {'insert inicio':>14}")
+    for r in resultados:
+        print(f"{r['anos']:>4} {r['asistencia']:>11} {r['pagos']:>8} {r['indice_filas']:>8} "
+              f"{r['indice_ms']:>11.2f} ms {r['escaneo_ms']:>6.2f} ms {r['escritura_hoy_ms']:>8.2f} ms "
+              f"{r['escritura_inicio_ms']:>11.2f} ms")
+
+    distintos = [r['anos'] for r in resultados if not r['coinciden']]
+    if distintos:
+        print(f"\ndeuda_a_fecha no coincide con el escaneo en: {', '.join(f'{a} años' for a in distintos)}")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,58 @@
+-- Tablas base que en producción ya existen en Supabase (las migraciones de migrations/ las
+-- suponen), con las columnas que usa database.py, más los roles y los permisos por defecto
+-- de un proyecto de Supabase. Solo para la base desechable de postgres_local.py.
+
+do $$ begin create role anon nologin; exception when duplicate_object then null; end $$;
+do $$ begin create role authenticated nologin; exception when duplicate_object then null; end $$;
+do $$ begin create role service_role nologin; exception when duplicate_object then null; end $$;
+
+-- Supabase concede todo sobre lo que se crea en public; las migraciones revocan lo que no corresponde
+grant usage on schema public to anon, authenticated, service_role;
+alter default privileges in schema public grant all on tables to anon, authenticated, service_role;
+alter default privileges in schema public grant all on sequences to anon, authenticated, service_role;
+alter default privileges in schema public grant all on functions to anon, authenticated, service_role;
+
+create table public.ninos (
+    id bigint generated by default as identity primary key,
+    nombre text,
+    monto numeric,
+    "Representante" text,
+    status integer default 1,
+    saldo numeric default 0
+);
+
+create table public.employees (
+    id bigint generated by default as identity primary key,
+    nombre text,
+    horas numeric,
+    usuario text,
+    contrasena text,
+    nivel text,
+    status integer default 1
+);
+
+create table public.asistencia (
+    id bigint generated by default as identity primary key,
+    fecha date,
+    tipo text,
+    id_persona bigint,
+    valor numeric,
+    pagado boolean default false,
+    id_pago bigint
+);
+
+create table public.pagos (
+    id bigint generated by default as identity primary key,
+    date date,
+    id_nino bigint,
+    id_empleado bigint,
+    monto numeric,
+    tipo text
+);
+
+create table public.gastos (
+    id bigint generated by default as identity primary key,
+    fecha date,
+    motivo text,
+    monto numeric
+);
@@ -0,0 +1,94 @@
+"""Base de Postgres desechable para medir y probar las funciones de migrations/.
+
+Crea una base nueva, carga esquema_base.sql (las tablas que en producción ya tiene Supabase)
+y las migraciones, y la borra al terminar. El servidor sale de POSTGRES_PRUEBAS_URL (p. ej.
+postgresql://postgres@localhost/postgres; nunca la base de Supabase, se crean roles y una base
+temporal) o, si no está definida, de un servidor temporal levantado con pgserver.
+
+Dependencias: pip install -r requirements-dev.txt
+"""
+
+import contextlib
+import os
+import shutil
+import tempfile
+import uuid
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MIGRACIONES_DIR = os.path.join(RAIZ, 'migrations')
+ESQUEMA_BASE = os.path.join(RAIZ, 'benchmarks', 'esquema_base.sql')
+
+class PostgresNoDisponible(RuntimeError):
+    """No hay psycopg2, o no hay POSTGRES_PRUEBAS_URL ni pgserver."""
+
+def migraciones():
+    """Rutas de migrations/*.sql en el orden en que se aplican."""
+    return [os.path.join(MIGRACIONES_DIR, nombre)
+            for nombre in sorted(os.listdir(MIGRACIONES_DIR)) if nombre.endswith('.sql')]
+
+@contextlib.contextmanager
+def _servidor():
+    url = os.getenv('POSTGRES_PRUEBAS_URL')
+    if url:
+        yield url
+        return
+    try:
+        import pgserver
+    except ImportError as e:
+        raise PostgresNoDisponible("Definir POSTGRES_PRUEBAS_URL o instalar pgserver") from e
+
+    directorio = tempfile.mkdtemp(prefix='guarderia-pg-')
+    servidor = pgserver.get_server(directorio, cleanup_mode='delete')
+    try:
+        yield servidor.get_uri()
+    finally:
+        servidor.cleanup()
+        shutil.rmtree(directorio, ignore_errors=True)
+
+def ejecutar_archivo(conn, ruta):
+    with open(ruta, encoding='utf-8') as f, conn.cursor() as cur:
+        cur.execute(f.read())
+
+@contextlib.contextmanager
+def base_desechable(archivos=None):
+    """Conexión psycopg2 (autocommit) a una base nueva con el esquema base y `archivos`
+    (por defecto todas las migraciones, en orden)."""
+    try:
+        import psycopg2
+    except ImportError as e:
+        raise PostgresNoDisponible("psycopg2 no está instalado") from e
+
+    nombre = f"guarderia_prueba_{uuid.uuid4().hex[:12]}"
+    with _servidor() as url:
+        admin = psycopg2.connect(url)
+        admin.autocommit = True
+        try:
+            with admin.cursor() as cur:
+                cur.execute(f'create database {nombre}')
+            conn = psycopg2.connect(url, dbname=nombre)
+            conn.autocommit = True
+            try:
+                ejecutar_archivo(conn, ESQUEMA_BASE)
+                for ruta in (migraciones() if archivos is None else archivos):
+                    ejecutar_archivo(conn, ruta)
+                yield conn
+            finally:
+                conn.close()
+                with admin.cursor() as cur:
+                    cur.execute(f'drop database if exists {nombre}')
+        finally:
+            admin.close()
+
+def cargar(conn, tabla, filas):
+    """Insertar filas (dicts con las mismas columnas) y avanzar la secuencia de id."""
+    if not filas:
+        return
+    columnas = list(filas[0])
+    lista = ', '.join(f'"{c}"' for c in columnas)
+    marcas = ', '.join(['%s'] * len(columnas))
+    with conn.cursor() as cur:
+        cur.executemany(f'insert into public.{tabla} ({lista}) values ({marcas})',
+                        [tuple(fila[c] for c in columnas) for fila in filas])
+        if 'id' in columnas:
+            cur.execute(f"select setval(pg_get_serial_sequence('public.{tabla}', 'id'), "
+                        f"(select max(id) from public.{tabla}))")
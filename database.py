@@ -1,62 +1,28 @@
 # database.py - Archivo completo y corregido (Versión con más Debug)
 
 import os
-from dotenv import load_dotenv
 from datetime import datetime, timedelta # Asegúrate de que esta línea esté aquí al principio
 import pytz
 import uuid
-
-# Intentar importar supabase; si no está disponible, crear un cliente de respaldo (fake)
-try:
-    from supabase import create_client
-    SUPABASE_AVAILABLE = True
-except Exception as e:
-    print(f"Aviso: supabase no disponible ({e}). Usando cliente de respaldo (fake).")
-    SUPABASE_AVAILABLE = False
-
-    class _FakeResponse:
-        def __init__(self, data=None, count=0):
-            self.data = data or []
-            self.count = count
-
-    class _FakeQuery:
-        def __init__(self, data=None):
-            self._data = data or []
-
-        def select(self, *args, **kwargs):
-            return self
-        def eq(self, *args, **kwargs):
-            return self
-        def gte(self, *args, **kwargs):
-            return self
-        def lte(self, *args, **kwargs):
-            return self
-        def in_(self, *args, **kwargs):
-            return self
-        def range(self, *args, **kwargs):
-            return self
-        def insert(self, *args, **kwargs):
-            return self
-        def update(self, *args, **kwargs):
-            return self
-        def delete(self, *args, **kwargs):
-            return self
-        def execute(self):
-            return _FakeResponse(data=self._data, count=len(self._data))
-
-    class _FakeClient:
-        def __init__(self):
-            # Estructuras de ejemplo vacías
-            self._tables = {}
-
-        def from_(self, name):
-            return _FakeQuery([])
-
-        def table(self, name):
-            return _FakeQuery([])
-
-    def create_client(url, key):
-        return _FakeClient()
+import time
+import threading
+import contextvars
+import copy
+import functools
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from logs import get_logger, log_payload
+from query_stats import instrument, current_caller, attributed_to
+
+logger = get_logger('database')
+
+# Cargar variables de entorno. En Vercel vienen del entorno y no hay .env, así que en el
+# arranque en frío no se importa python-dotenv.
+_ENV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+if os.path.exists(_ENV_FILE):
+    from dotenv import load_dotenv
+    load_dotenv(_ENV_FILE)
 
 def get_current_time():
     """Returns the current time in 'America/Chicago' timezone."""
@@ -64,42 +30,596 @@ def get_current_time():
     local_tz = pytz.timezone('America/Chicago')
     return utc_now.astimezone(local_tz)
 
-# Cargar variables de entorno
-load_dotenv()
-
 # Configuración de Supabase
 supabase_url = os.getenv("SUPABASE_URL")
 supabase_key = os.getenv("SUPABASE_KEY")
 
-print(f"URL de Supabase: {supabase_url}")
-print(f"Key de Supabase: {supabase_key[:10]}...") # Solo mostramos el inicio de la key por seguridad
+# Se decide al crear el cliente: False si se usa el emulador en memoria.
+SUPABASE_AVAILABLE = None
+
+def _create_supabase_client():
+    """Importar supabase (o el emulador en memoria) y crear el cliente.
+
+    Si supabase no está instalado se usa supabase_memoria.py; SUPABASE_MEMORIA=1 lo fuerza,
+    p. ej. para pruebas de carga sin red.
+    """
+    global SUPABASE_AVAILABLE
+    if os.getenv("SUPABASE_MEMORIA", "0") == "1":
+        from supabase_memoria import create_client
+        SUPABASE_AVAILABLE = False
+    else:
+        try:
+            from supabase import create_client
+            SUPABASE_AVAILABLE = True
+        except Exception as e:
+            logger.warning("supabase no disponible (%s). Usando el cliente en memoria (supabase_memoria.py).", e)
+            SUPABASE_AVAILABLE = False
+            from supabase_memoria import create_client
+
+    logger.debug("Conectando a Supabase en %s", supabase_url)
+    client = create_client(supabase_url, supabase_key)
+    if SUPABASE_AVAILABLE:
+        try:
+            import http_pool
+            http_pool.attach(client)
+        except Exception as e:
+            logger.warning("No se pudo configurar el pool HTTP de Supabase (%s); se usa el de httpx.", e)
+    logger.info("Cliente de Supabase creado exitosamente")
+    return instrument(client)
+
+class _LazyClient:
+    """Cliente de Supabase que se crea en el primer uso.
+
+    Importar supabase/postgrest/httpx y crear el cliente cuesta cientos de ms; así el arranque
+    en frío no lo paga hasta la primera consulta. Si la creación falla se reintenta en el
+    siguiente uso.
+    """
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = _create_supabase_client()
+        return self._client
+
+    def __getattr__(self, name):
+        return getattr(self.get(), name)
+
+supabase = _LazyClient()
+
+def warmup():
+    """Crear el cliente y abrir su conexión HTTP. Devuelve True si Supabase respondió.
+
+    El roster (que casi todas las páginas necesitan) solo se carga si venció: /warmup no
+    pide sesión y no debe poder forzar lecturas completas de niños y empleadas en cada hit.
+    Con el roster vigente alcanza una consulta de una fila para abrir la conexión.
+    """
+    try:
+        vencidas = [tabla for tabla in ('employees', 'ninos') if _fresh_roster_entry(tabla) is None]
+        for tabla in vencidas:
+            _get_roster(tabla)
+        if not vencidas:
+            supabase.from_('employees').select('id').limit(1).execute()
+        return True
+    except Exception as e:
+        logger.error("Error al precalentar la conexión a Supabase: %s", e)
+        return False
+
+def pool_stats():
+    """Estado del pool HTTP de Supabase (http_pool.stats()), o None si no hay pool (cliente
+    en memoria o cliente aún sin crear)."""
+    if not SUPABASE_AVAILABLE:
+        return None
+    import http_pool
+    return http_pool.stats()
+
+# Funciones de Postgres (migrations/) que no están instaladas en la base actual.
+_rpc_no_disponibles = set()
 
-# Crear cliente de Supabase
-try:
-    supabase = create_client(supabase_url, supabase_key)
-    print("Cliente de Supabase creado exitosamente")
-except Exception as e:
-    print(f"Error al crear cliente de Supabase: {e}")
+def _is_missing_rpc_error(error):
+    """PostgREST responde PGRST202 cuando la función no existe en su caché de esquema."""
+    return getattr(error, 'code', None) == 'PGRST202' or 'Could not find the function' in str(error)
+
+def _call_rpc(name, params):
+    """Llamar una función de Postgres vía PostgREST.
+
+    Devuelve None si la función no está instalada (migración pendiente) para que el llamador
+    use la ruta equivalente en Python; cualquier otro error se propaga.
+    """
+    if name in _rpc_no_disponibles or not hasattr(supabase, 'rpc'):
+        return None
+    try:
+        response = supabase.rpc(name, params).execute()
+    except Exception as e:
+        if _is_missing_rpc_error(e):
+            logger.warning("RPC '%s' no disponible, usando la ruta en Python: %s", name, e)
+            _rpc_no_disponibles.add(name)
+            return None
+        raise
+    return response.data if response.data is not None else []
+
+# Páginas que se piden a la vez cuando la consulta trae count='exact'.
+PAGINATION_WORKERS = int(os.getenv("PAGINATION_WORKERS", "4"))
+
+def _fetch_page(query_builder, start, page_size):
+    # range() modifica el builder, así que cada página usa su propia copia
+    return copy.copy(query_builder).range(start, start + page_size - 1).execute()
+
+def _without_count(query_builder):
+    """Copia del builder sin 'Prefer: count=...' para las páginas después de la primera.
+
+    copy.copy comparte los headers con el original; con el count cada página le pediría a
+    PostgREST un COUNT completo de la consulta además de sus filas.
+    """
+    builder = copy.copy(query_builder)
+    headers = query_builder.headers.copy()
+    prefer = [p for p in headers.get('prefer', '').split(',') if p.strip() and not p.strip().startswith('count=')]
+    if prefer:
+        headers['prefer'] = ','.join(prefer)
+    elif 'prefer' in headers:
+        del headers['prefer']
+    builder.headers = headers
+    return builder
+
+def iter_paginated(query_builder, page_size=1000, workers=None):
+    """Generador de páginas (listas de filas), en orden, de una consulta sin límite de filas.
+
+    Si el select se construyó con count='exact', la primera página trae el total (es la única
+    que lo pide) y las siguientes se piden en paralelo con hasta `workers` consultas en vuelo; se entregan en
+    orden y solo se retienen las páginas ya pedidas que el llamador aún no consumió. Sin
+    count se pagina de forma secuencial hasta recibir una página incompleta. Para que las
+    páginas no se solapen, la consulta debe tener un orden estable (p. ej. .order('id')).
+    """
+    response = _fetch_page(query_builder, 0, page_size)
+    data = response.data or []
+    if data:
+        yield data
+    if len(data) < page_size:
+        return
+
+    total = getattr(response, 'count', None)
+    query_builder = _without_count(query_builder)
+    workers = PAGINATION_WORKERS if workers is None else workers
+    if total is None or workers <= 1:
+        start = page_size
+        while True:
+            data = _fetch_page(query_builder, start, page_size).data
+            if not data:
+                return
+            yield data
+            if len(data) < page_size:
+                return
+            start += page_size
+
+    starts = iter(range(page_size, total, page_size))
+    caller = current_caller()
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pagina')
+    pending = []
+    try:
+        def submit(start):
+            # Copia del contexto del request para que la instrumentación cuente la página
+            return executor.submit(contextvars.copy_context().run,
+                                   attributed_to(caller, _fetch_page), query_builder, start, page_size)
+
+        pending.extend(submit(start) for start in itertools.islice(starts, workers))
+        while pending:
+            data = pending.pop(0).result(timeout=QUERY_TIMEOUT).data
+            next_start = next(starts, None)
+            if next_start is not None:
+                pending.append(submit(next_start))
+            if data:
+                yield data
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
 
 def fetch_all_paginated(query_builder, page_size=1000):
     """Auxiliar para obtener todos los registros de una consulta manejando el límite de 1000 de Supabase."""
     all_data = []
-    start = 0
-    while True:
-        response = query_builder.range(start, start + page_size - 1).execute()
-        data = response.data
-        if not data:
-            break
-        all_data.extend(data)
-        if len(data) < page_size:
-            break
-        start += page_size
+    for page in iter_paginated(query_builder, page_size):
+        all_data.extend(page)
     return all_data
 
+# --- Recorridos en streaming de asistencia y pagos ---
+# Los reportes históricos solo necesitan (persona, fecha, valor) de cada fila. Los recorridos
+# entregan esas tuplas página por página y los reductores las consumen sin guardar las filas,
+# así la memoria queda acotada por el tamaño de página y no por el tamaño de la tabla.
+
+def _scan_rows(rows, persona, fecha, valor):
+    """Tuplas (persona, fecha, valor) a partir de filas de Supabase."""
+    for row in rows:
+        yield row[persona], row.get(fecha), float(row.get(valor) or 0)
+
+def _scan(table, persona, fecha, valor, filters, desde, hasta, ids, page_size):
+    for chunk in ([None] if ids is None else _chunked(ids)):
+        query = supabase.from_(table).select(f'{persona}, {fecha}, {valor}', count='exact')
+        for column, value in filters:
+            query = query.eq(column, value)
+        if desde is not None:
+            query = query.gte(fecha, desde.isoformat() if hasattr(desde, 'isoformat') else desde)
+        if hasta is not None:
+            query = query.lte(fecha, hasta.isoformat() if hasattr(hasta, 'isoformat') else hasta)
+        if chunk is not None:
+            query = query.in_(persona, chunk)
+        for page in iter_paginated(query.order('id'), page_size):
+            yield from _scan_rows(page, persona, fecha, valor)
+
+def scan_asistencia(tipo=None, desde=None, hasta=None, ids=None, pagado=None, page_size=1000):
+    """Generador de (id_persona, fecha, valor) de la asistencia que cumple los filtros.
+
+    desde/hasta son inclusivos (date o ISO); ids limita a esas personas.
+    """
+    filters = []
+    if tipo is not None:
+        filters.append(('tipo', tipo))
+    if pagado is not None:
+        filters.append(('pagado', pagado))
+    return _scan('asistencia', 'id_persona', 'fecha', 'valor', filters, desde, hasta, ids, page_size)
+
+def scan_pagos(desde=None, hasta=None, ids=None, page_size=1000):
+    """Generador de (id_nino, date, monto) de los pagos que cumplen los filtros."""
+    return _scan('pagos', 'id_nino', 'date', 'monto', [], desde, hasta, ids, page_size)
+
+def sum_by_person(rows):
+    """{persona: suma de valor} de un recorrido."""
+    totals = {}
+    for persona, _, valor in rows:
+        totals[persona] = totals.get(persona, 0) + valor
+    return totals
+
+def sum_by_day(rows):
+    """{fecha: suma de valor} de un recorrido."""
+    totals = {}
+    for _, fecha, valor in rows:
+        totals[fecha] = totals.get(fecha, 0) + valor
+    return totals
+
+def count_distinct(rows, field=0):
+    """Cantidad de valores distintos de un campo (0 persona, 1 fecha) de un recorrido."""
+    return len({row[field] for row in rows})
+
+# --- Caché de roster (ninos / employees) ---
+# El roster cambia pocas veces por semana pero se lee en casi todas las páginas solo para
+# traducir ids a nombres. Se guarda en memoria del proceso con un TTL y se invalida en cada
+# escritura de niños/empleados. Las columnas volátiles o sensibles no se guardan.
+ROSTER_CACHE_TTL = int(os.getenv("ROSTER_CACHE_TTL", "300"))
+_ROSTER_EXCLUDED_COLUMNS = {
+    'ninos': {'saldo'},
+    'employees': {'contrasena'}
+}
+_roster_cache = {}
+# Cada tabla tiene su lock (solo para leer y escribir la caché, nunca durante la consulta), su
+# generación (sube al invalidar, para no guardar un roster leído antes de la escritura) y a lo
+# sumo una carga en vuelo que esperan los demás lectores de esa tabla.
+_roster_locks = {}
+_roster_locks_guard = threading.Lock()
+_roster_generations = {}
+_roster_loads = {}
+
+class _RosterLoad:
+    """Carga del roster en vuelo; los lectores que llegan mientras tanto esperan su resultado."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+def _roster_lock(table):
+    with _roster_locks_guard:
+        return _roster_locks.setdefault(table, threading.Lock())
+
+def invalidate_roster(table=None):
+    """Invalidar el roster en caché de una tabla ('ninos' / 'employees') o de ambas."""
+    tables = [table] if table is not None else set(_ROSTER_TABLES) | set(_roster_cache)
+    for t in tables:
+        with _roster_lock(t):
+            _roster_cache.pop(t, None)
+            _roster_generations[t] = _roster_generations.get(t, 0) + 1
+            # Una carga que empezó antes de la escritura no sirve a los lectores nuevos
+            _roster_loads.pop(t, None)
+
+def _fresh_roster_entry(table):
+    """Entrada del roster si sigue vigente (sin consultar la base)."""
+    entry = _roster_cache.get(table)
+    if entry and time.monotonic() - entry['loaded_at'] < ROSTER_CACHE_TTL:
+        return entry
+    return None
+
+def _store_roster_entry(table, rows, generation=None):
+    """Guardar en caché las filas leídas de la tabla. Si el roster se invalidó mientras se
+    leían (generation ya no es la actual), la entrada se devuelve pero no se guarda."""
+    excluded = _ROSTER_EXCLUDED_COLUMNS.get(table, set())
+    entry = {
+        'loaded_at': time.monotonic(),
+        'by_id': {
+            item['id']: {k: v for k, v in item.items() if k.lower() not in excluded}
+            for item in rows
+        },
+        'missing': set()
+    }
+    with _roster_lock(table):
+        if generation is None or generation == _roster_generations.get(table, 0):
+            _roster_cache[table] = entry
+    return entry
+
+def _get_roster_entry(table, force=False):
+    entry = None if force else _fresh_roster_entry(table)
+    if entry:
+        return entry
+
+    lock = _roster_lock(table)
+    with lock:
+        entry = None if force else _fresh_roster_entry(table)
+        if entry:
+            return entry
+        load = None if force else _roster_loads.get(table)
+        leader = load is None
+        if leader:
+            load = _RosterLoad()
+            if not force:
+                _roster_loads[table] = load
+        generation = _roster_generations.get(table, 0)
+
+    if not leader:
+        load.done.wait()
+        if load.error is not None:
+            raise load.error
+        return load.entry
+
+    try:
+        logger.debug("Recargando roster de '%s'", table)
+        rows = fetch_all_paginated(supabase.from_(table).select('*'))
+        load.entry = _store_roster_entry(table, rows, generation)
+        return load.entry
+    except Exception as e:
+        load.error = e
+        raise
+    finally:
+        with lock:
+            if _roster_loads.get(table) is load:
+                del _roster_loads[table]
+        load.done.set()
+
+def _get_roster(table, force=False):
+    """Devolver {id: registro} de la tabla, recargándolo si expiró el TTL."""
+    return _get_roster_entry(table, force)['by_id']
+
+def _unknown_roster_ids(entry, ids):
+    return [i for i in ids if i not in entry['by_id'] and i not in entry['missing']]
+
+def _roster_records(table, ids):
+    """Registros del roster para los ids indicados. Si falta alguno (p. ej. creado desde otra
+    instancia), se recarga el roster una vez; los ids que siguen sin existir (registros borrados
+    con historial) se recuerdan para no recargar en cada lectura."""
+    entry = _get_roster_entry(table)
+    unknown = _unknown_roster_ids(entry, ids)
+    if unknown:
+        entry = _get_roster_entry(table, force=True)
+        entry['missing'].update(i for i in unknown if i not in entry['by_id'])
+    return {i: entry['by_id'][i] for i in ids if i in entry['by_id']}
+
+def _roster_names(table, ids):
+    """Mapa {id: nombre} para los ids indicados."""
+    return {i: item.get('nombre') for i, item in _roster_records(table, ids).items()}
+
+def _roster_active(table):
+    """Registros con status = 1."""
+    return [item for item in _get_roster(table).values() if int(item.get('status') or 0) == 1]
+
+# Tiempo máximo (segundos) que una página espera por sus consultas en paralelo.
+QUERY_TIMEOUT = float(os.getenv("QUERY_TIMEOUT", "20"))
+
+def run_parallel(calls, defaults=None, timeout=None):
+    """Ejecutar en paralelo llamadas independientes a funciones de este módulo.
+
+    calls: {nombre: función sin argumentos}. Devuelve {nombre: resultado}; si una llamada
+    lanza una excepción o no termina dentro del timeout, su resultado es defaults[nombre]
+    (o None) y las demás no se ven afectadas. La latencia es la de la llamada más lenta.
+    """
+    defaults = defaults or {}
+    timeout = QUERY_TIMEOUT if timeout is None else timeout
+    results = {}
+
+    executor = ThreadPoolExecutor(max_workers=max(len(calls), 1), thread_name_prefix='consulta')
+    try:
+        # Cada hilo corre con una copia del contexto del request (instrumentación de consultas)
+        futures = {
+            name: executor.submit(contextvars.copy_context().run, fn)
+            for name, fn in calls.items()
+        }
+        deadline = time.monotonic() + timeout
+        for name, future in futures.items():
+            try:
+                results[name] = future.result(timeout=max(deadline - time.monotonic(), 0))
+            except FuturesTimeoutError:
+                logger.warning("Consulta '%s' excedió %ss; se usa el valor por defecto", name, timeout)
+                results[name] = defaults.get(name)
+            except Exception as e:
+                logger.error("Error en consulta paralela '%s': %s", name, e)
+                results[name] = defaults.get(name)
+    finally:
+        # No esperar a las consultas que excedieron el timeout
+        executor.shutdown(wait=False)
+    return results
+
+# Máximo de valores por filtro in_(); PostgREST los envía en la URL.
+IN_FILTER_CHUNK_SIZE = 500
+
+def _chunked(values, size=IN_FILTER_CHUNK_SIZE):
+    """Partir una lista de ids en bloques aptos para un filtro in_()."""
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+# --- Diario de escrituras ---
+# Cada función que escribe registra las claves (tabla, semana, persona) que tocó: semana es el
+# lunes ISO de la fila afectada (None si no se conoce) y persona el id del niño o trabajadora
+# (None si no aplica, p. ej. gastos). Al terminar la escritura, aunque falle a mitad de camino,
+# las claves se publican a los suscriptores (subscribe_writes) para que cada caché invalide
+# solo las semanas y personas afectadas. ninos.saldo (legado) no se registra: ninguna caché
+# lo guarda.
+WRITE_JOURNAL_SIZE = int(os.getenv("WRITE_JOURNAL_SIZE", "200"))
+_write_journal = deque(maxlen=WRITE_JOURNAL_SIZE)
+_write_seq = 0
+_write_subscribers = []
+_write_lock = threading.Lock()
+_current_write = contextvars.ContextVar('current_write', default=None)
+_ROSTER_TABLES = {'ninos', 'employees'}
+
+def _week_start_iso(fecha):
+    """Lunes (ISO) de la semana de una fecha (date o ISO)."""
+    if not hasattr(fecha, 'weekday'):
+        fecha = datetime.strptime(str(fecha)[:10], '%Y-%m-%d').date()
+    return (fecha - timedelta(days=fecha.weekday())).isoformat()
+
+def subscribe_writes(callback):
+    """Llamar callback(claves) después de cada escritura; claves es un set de
+    (tabla, semana, persona)."""
+    with _write_lock:
+        if callback not in _write_subscribers:
+            _write_subscribers.append(callback)
+
+def unsubscribe_writes(callback):
+    with _write_lock:
+        if callback in _write_subscribers:
+            _write_subscribers.remove(callback)
+
+def recent_writes(since=0):
+    """Entradas del diario con seq > since: {'seq', 'origen', 'claves', 'ts'}."""
+    with _write_lock:
+        return [dict(entry) for entry in _write_journal if entry['seq'] > since]
+
+def _publish_write(origen, claves):
+    global _write_seq
+    with _write_lock:
+        _write_seq += 1
+        _write_journal.append({
+            'seq': _write_seq,
+            'origen': origen,
+            'claves': sorted(claves, key=str),
+            'ts': time.time()
+        })
+        subscribers = list(_write_subscribers)
+    for callback in subscribers:
+        try:
+            callback(claves)
+        except Exception as e:
+            logger.error("Error en suscriptor del diario de escrituras (%s): %s", origen, e)
+
+def _journaled(fn):
+    """Publicar al terminar las claves que registró la escritura (ver _journal).
+
+    Las escrituras anidadas (p. ej. un pago dentro de un lote) se publican con la exterior.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if _current_write.get() is not None:
+            return fn(*args, **kwargs)
+        claves = set()
+        token = _current_write.set(claves)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _current_write.reset(token)
+            if claves:
+                _publish_write(fn.__name__, claves)
+    return wrapper
+
+def _journal(tabla, fecha=None, persona=None):
+    """Registrar que la escritura en curso tocó (tabla, semana de fecha, persona)."""
+    clave = (tabla, None if fecha is None else _week_start_iso(fecha), persona)
+    claves = _current_write.get()
+    if claves is None:
+        _publish_write(tabla, {clave})
+    else:
+        claves.add(clave)
+
+def _journal_rows(tabla, rows, fecha_col, persona_col):
+    for row in rows or []:
+        _journal(tabla, row.get(fecha_col), row.get(persona_col))
+
+def _journal_pago_asistencias(pago_ids):
+    """Registrar las asistencias liquidadas por esos pagos (cuando las escribió una función
+    de Postgres y no se conocen sus fechas)."""
+    for ids in _chunked(pago_ids):
+        response = supabase.from_('asistencia').select('fecha, id_persona').in_('id_pago', ids).execute()
+        _journal_rows('asistencia', response.data, 'fecha', 'id_persona')
+
+# --- Versión de datos por semana ---
+# La caché de reportes de app.py (report_cache.py) guarda cada página junto con la versión de
+# datos de su semana. Con la migración 008 la versión vive en Postgres (tabla version_datos,
+# mantenida por triggers), así que la ve cualquier instancia. Sin ella, el diario sube en el
+# proceso la versión de cada semana escrita, o la global si una escritura no conoce sus semanas
+# o cambia el roster (los reportes muestran nombres); esa versión no ve las escrituras de otras
+# instancias, por eso data_version la marca como no compartida.
+_data_versions = {}
+_data_version_global = (0, time.time())
+_data_version_lock = threading.Lock()
+# Distingue las versiones locales de este proceso de las de cualquier otro (todas empiezan en 0)
+_data_version_epoch = uuid.uuid4().hex[:8]
+
+def _bump_data_version(claves):
+    global _data_version_global
+    now = time.time()
+    with _data_version_lock:
+        for tabla, semana, _ in claves:
+            if semana is None or tabla in _ROSTER_TABLES:
+                _data_version_global = (_data_version_global[0] + 1, now)
+                return
+        for semana in {semana for _, semana, _ in claves}:
+            _data_versions[semana] = (_data_versions.get(semana, (0, 0))[0] + 1, now)
+
+def _shared_data_version(semanas):
+    """Versión de version_datos (migración 008), o None si no está disponible."""
+    try:
+        filas = _call_rpc('version_datos', {'p_semanas': semanas})
+    except Exception as e:
+        logger.error("Error al leer version_datos: %s", e)
+        return None
+    if filas is None:
+        return None
+    por_clave = {fila['clave']: fila for fila in filas}
+    stamps = []
+    for clave in ['global'] + semanas:
+        fila = por_clave.get(clave)
+        if fila is None:
+            stamps.append((0, 0))
+        else:
+            actualizado = datetime.fromisoformat(str(fila['actualizado']).replace('Z', '+00:00'))
+            stamps.append((int(fila['version']), actualizado.timestamp()))
+    return stamps
+
+def data_version(*weeks):
+    """(versión, timestamp de la última modificación, compartida) de los datos de esas semanas.
+
+    La versión cambia cada vez que una escritura toca alguna de las semanas (o todas).
+    compartida es True si la versión sale de Postgres y vale para todas las instancias; si es
+    False solo refleja las escrituras de este proceso.
+    """
+    semanas = [_week_start_iso(w) for w in weeks]
+    stamps = _shared_data_version(semanas)
+    if stamps is not None:
+        return tuple(v for v, _ in stamps), max(ts for _, ts in stamps), True
+    with _data_version_lock:
+        stamps = [_data_version_global] + [_data_versions.get(s, (0, 0)) for s in semanas]
+    return (_data_version_epoch,) + tuple(v for v, _ in stamps), max(ts for _, ts in stamps), False
+
+def _invalidate_roster_on_write(claves):
+    for tabla in {tabla for tabla, _, _ in claves} & _ROSTER_TABLES:
+        invalidate_roster(tabla)
+
+subscribe_writes(_invalidate_roster_on_write)
+subscribe_writes(_bump_data_version)
+
 def verify_employee_credentials(usuario, contrasena):
     """Verificar credenciales del empleado y retornar sus datos si son válidos"""
     try:
-        print(f"\n=== Verificando credenciales para usuario: {usuario} ===")
+        logger.debug("Verificando credenciales para usuario: %s", usuario)
         response = supabase.from_('employees').select('*').eq('usuario', usuario).eq('contrasena', contrasena).eq('status', 1).execute()
         
         if hasattr(response, 'data') and len(response.data) > 0:
@@ -112,7 +632,7 @@ def verify_employee_credentials(usuario, contrasena):
             }
         return None
     except Exception as e:
-        print(f"Error al verificar credenciales: {e}")
+        logger.error("Error al verificar credenciales: %s", e)
         return None
 
 def get_nino(id):
@@ -123,50 +643,44 @@ def get_nino(id):
             return response.data[0]
         return None
     except Exception as e:
-        print(f"Error al obtener niño: {e}")
+        logger.error("Error al obtener niño: %s", e)
         return None
 
 def get_ninos():
     """Obtener todos los niños de la base de datos"""
     try:
-        print("\n=== Iniciando obtención de niños ===")
+        logger.debug("Iniciando obtención de niños")
         
-        # Consulta simple usando el cliente
-        print("\nEjecutando consulta...")
-        response = supabase.from_('ninos').select('*').execute()
-        print(f"Respuesta completa: {response}")
+        # Roster en caché (se recarga al expirar el TTL o tras una escritura)
+        logger.debug("Leyendo roster de niños...")
+        roster = list(_get_roster('ninos').values())
+        log_payload(logger, "Datos obtenidos: %s", roster)
+
+        # Convertir los datos para manejar la columna Representante
+        data_converted = []
+        for item in roster:
+            converted = {
+                'id': item['id'],
+                'nombre': item['nombre'],
+                'monto': int(float(item.get('monto', 0))),
+                'representante': item.get('Representante', ''),
+                'status': int(item.get('status', 0))
+            }
+            data_converted.append(converted)
         
-        if hasattr(response, 'data'):
-            print(f"Datos obtenidos: {response.data}")
-            # Convertir los datos para manejar la columna Representante
-            data_converted = []
-            for item in response.data:
-                converted = {
-                    'id': item['id'],
-                    'nombre': item['nombre'],
-                    'monto': int(float(item.get('monto', 0))),
-                    'representante': item.get('Representante', ''),
-                    'status': int(item.get('status', 0))
-                }
-                data_converted.append(converted)
-            
-            # Ordenar la lista: primero por status (descendente) y luego por nombre
-            data_converted.sort(key=lambda x: (-x['status'], x['nombre']))
-            
-            print(f"Datos convertidos y ordenados: {data_converted}")
-            return data_converted
-        else:
-            print("No se encontraron datos")
-            return []
+        # Ordenar la lista: primero por status (descendente) y luego por nombre
+        data_converted.sort(key=lambda x: (-x['status'], x['nombre']))
+        
+        log_payload(logger, "Datos convertidos y ordenados: %s", data_converted)
+        return data_converted
     except Exception as e:
-        print(f"\nError al obtener niños: {e}")
-        print(f"Tipo de error: {type(e)}")
+        logger.error("Error al obtener niños: %s", e)
         
         # Intentar con el método alternativo
         try:
-            print("\nIntentando método alternativo...")
+            logger.debug("Intentando método alternativo...")
             response = supabase.table('ninos').select('*').execute()
-            print(f"Respuesta del método alternativo: {response}")
+            log_payload(logger, "Respuesta del método alternativo: %s", response)
             
             if hasattr(response, 'data'):
                 # Usar la misma lógica que en el método principal
@@ -186,14 +700,13 @@ def get_ninos():
                 return data_converted
             return []
         except Exception as e2:
-            print(f"Error en método alternativo: {e2}")
+            logger.error("Error en método alternativo: %s", e2)
             return []
     except Exception as e: # Este catch es redundante si el anterior ya captura todo
-        print(f"Error al obtener niños: {e}")
-        print(f"Error completo: {str(e)}")
-        print(f"Tipo de error: {type(e)}")
+        logger.error("Error al obtener niños: %s", e)
         return []
 
+@_journaled
 def add_nino(nombre, monto, representante, status=1):
     """Agregar un nuevo niño a la base de datos"""
     try:
@@ -209,23 +722,25 @@ def add_nino(nombre, monto, representante, status=1):
             "status": status # Ahora siempre será 0 o 1
         }
         response = supabase.table('ninos').insert(data).execute()
+        _journal('ninos', persona=response.data[0]['id'] if response.data else None)
         return response.data[0] if response.data else None
     except Exception as e:
-        print(f"Error al agregar niño: {e}")
+        logger.error("Error al agregar niño: %s", e)
         return None
 
+@_journaled
 def update_nino(id, nombre, monto, representante, status):
     """Actualizar datos de un niño"""
     try:
-        print(f"\n=== Iniciando actualización de niño {id} ===")
+        logger.debug("Iniciando actualización de niño %s", id)
         
         # Primero verificamos si el niño existe
-        print("Verificando existencia del niño...")
+        logger.debug("Verificando existencia del niño...")
         check = supabase.from_('ninos').select('*').eq('id', id).execute()
-        print(f"Resultado de verificación: {check}")
+        log_payload(logger, "Resultado de verificación: %s", check)
         
         if not check.data:
-            print(f"No se encontró el niño con ID {id}")
+            logger.warning("No se encontró el niño con ID %s", id)
             return None
         
         # Convertir monto a entero
@@ -237,81 +752,78 @@ def update_nino(id, nombre, monto, representante, status):
             "Representante": representante, # Nota la R mayúscula
             "status": status
         }
-        print(f"Datos a actualizar: {data}")
+        log_payload(logger, "Datos a actualizar: %s", data)
         
         response = supabase.from_('ninos').update(data).eq('id', id).execute()
-        print(f"Respuesta de Supabase: {response}")
+        _journal('ninos', persona=id)
+        log_payload(logger, "Respuesta de Supabase: %s", response)
         
         if hasattr(response, 'data') and response.data:
-            print(f"Datos actualizados: {response.data[0]}")
+            log_payload(logger, "Datos actualizados: %s", response.data[0])
             return response.data[0]
         else:
-            print("No se recibieron datos en la respuesta")
-            print("Intentando verificar si la actualización fue exitosa...")
+            logger.debug("No se recibieron datos en la respuesta")
+            logger.debug("Intentando verificar si la actualización fue exitosa...")
             
             # Verificar si la actualización fue exitosa consultando el registro
             verify = supabase.from_('ninos').select('*').eq('id', id).execute()
             if verify.data and verify.data[0]:
-                print(f"Verificación exitosa, datos actualizados: {verify.data[0]}")
+                log_payload(logger, "Verificación exitosa, datos actualizados: %s", verify.data[0])
                 return verify.data[0]
             
-            print("No se pudo verificar la actualización")
+            logger.debug("No se pudo verificar la actualización")
             return None
     except Exception as e:
-        print(f"Error al actualizar niño: {e}")
-        print(f"Tipo de error: {type(e)}")
-        print(f"Error completo: {str(e)}")
+        logger.error("Error al actualizar niño: %s", e)
         return None
 
+@_journaled
 def delete_nino(id):
     """Eliminar un niño de la base de datos"""
     try:
         response = supabase.table('ninos').delete().eq('id', id).execute()
+        _journal('ninos', persona=id)
         return True
     except Exception as e:
-        print(f"Error al eliminar niño: {e}")
+        logger.error("Error al eliminar niño: %s", e)
         return False
 
 def get_employees():
     """Obtener todos los empleados de la base de datos"""
     try:
-        print("\n=== Iniciando obtención de empleados ===")
+        logger.debug("Iniciando obtención de empleados")
         
-        # Consulta simple usando el cliente
-        print("\nEjecutando consulta...")
-        response = supabase.from_('employees').select('*').execute()
-        print(f"Respuesta completa: {response}")
+        # Roster en caché (se recarga al expirar el TTL o tras una escritura)
+        logger.debug("Leyendo roster de empleados...")
+        roster = list(_get_roster('employees').values())
+        log_payload(logger, "Datos obtenidos: %s", roster)
+
+        data_converted = []
+        for item in roster:
+            # Imprimir cada item para debug
+            log_payload(logger, "Procesando item: %s", item)
+            # Convertir todo a minúsculas para manejar posibles diferencias en nombres de columnas
+            item_lower = {k.lower(): v for k, v in item.items()}
+            converted = {
+                'id': item_lower.get('id'),
+                'nombre': item_lower.get('nombre', ''),
+                'horas': int(float(item_lower.get('horas', 0))),
+                'usuario': item_lower.get('usuario', ''),
+                'nivel': item_lower.get('nivel', 'Regular'),
+                'status': int(item_lower.get('status', 0))
+            }
+            data_converted.append(converted)
         
-        if hasattr(response, 'data'):
-            print(f"Datos obtenidos: {response.data}")
-            data_converted = []
-            for item in response.data:
-                # Imprimir cada item para debug
-                print(f"Procesando item: {item}")
-                # Convertir todo a minúsculas para manejar posibles diferencias en nombres de columnas
-                item_lower = {k.lower(): v for k, v in item.items()}
-                converted = {
-                    'id': item_lower.get('id'),
-                    'nombre': item_lower.get('nombre', ''),
-                    'horas': int(float(item_lower.get('horas', 0))),
-                    'usuario': item_lower.get('usuario', ''),
-                    'nivel': item_lower.get('nivel', 'Regular'),
-                    'status': int(item_lower.get('status', 0))
-                }
-                data_converted.append(converted)
-            
-            # Ordenar la lista: primero por status (descendente) y luego por nombre
-            data_converted.sort(key=lambda x: (-x['status'], x['nombre']))
-            
-            print(f"Datos convertidos y ordenados: {data_converted}")
-            return data_converted
-        else:
-            print("No se encontraron datos")
-            return []
+        # Ordenar la lista: primero por status (descendente) y luego por nombre
+        data_converted.sort(key=lambda x: (-x['status'], x['nombre']))
+        
+        log_payload(logger, "Datos convertidos y ordenados: %s", data_converted)
+        return data_converted
     except Exception as e:
-        print(f"Error al obtener empleados: {e}")
+        logger.error("Error al obtener empleados: %s", e)
         return []
 
+@_journaled
 def add_employee(nombre, horas, usuario, contrasena, nivel, status=1):
     """Agregar un nuevo empleado a la base de datos"""
     try:
@@ -333,15 +845,17 @@ def add_employee(nombre, horas, usuario, contrasena, nivel, status=1):
             "status": status
         }
         response = supabase.table('employees').insert(data).execute()
+        _journal('employees', persona=response.data[0]['id'] if response.data else None)
         return response.data[0] if response.data else None
     except Exception as e:
-        print(f"Error al agregar empleado: {e}")
+        logger.error("Error al agregar empleado: %s", e)
         return None
 
+@_journaled
 def update_employee(id, nombre, horas, usuario, nivel, status):
     """Actualizar datos de un empleado"""
     try:
-        print(f"\n=== Iniciando actualización de empleado {id} ===")
+        logger.debug("Iniciando actualización de empleado %s", id)
         
         # Validaciones
         if nivel not in ['Admin', 'Regular']:
@@ -359,60 +873,52 @@ def update_employee(id, nombre, horas, usuario, nivel, status):
             "nivel": nivel,
             "status": status
         }
-        print(f"Datos a actualizar: {data}")
+        log_payload(logger, "Datos a actualizar: %s", data)
         
         response = supabase.from_('employees').update(data).eq('id', id).execute()
-        print(f"Respuesta de Supabase: {response}")
+        _journal('employees', persona=id)
+        log_payload(logger, "Respuesta de Supabase: %s", response)
         
         if hasattr(response, 'data') and response.data:
             return response.data[0]
         return None
     except Exception as e:
-        print(f"Error al actualizar empleado: {e}")
+        logger.error("Error al actualizar empleado: %s", e)
         return None
 
+@_journaled
 def delete_employee(id):
     """Eliminar un empleado de la base de datos"""
     try:
         response = supabase.table('employees').delete().eq('id', id).execute()
+        _journal('employees', persona=id)
         return True
     except Exception as e:
-        print(f"Error al eliminar empleado: {e}")
+        logger.error("Error al eliminar empleado: %s", e)
         return False
 
 def get_active_employees_count():
     """Obtener el número de empleados activos (status = 1)"""
     try:
-        print("\n=== Obteniendo conteo de empleados activos ===")
+        logger.debug("Obteniendo conteo de empleados activos")
         
-        # Consulta para contar empleados con status = 1
-        response = supabase.from_('employees').select('*', count='exact').eq('status', 1).execute()
-        print(f"Respuesta de conteo: {response}")
-        
-        if hasattr(response, 'count'):
-            print(f"Número de empleados activos: {response.count}")
-            return response.count
-        else:
-            # Fallback: contar manualmente
-            response = supabase.from_('employees').select('*').eq('status', 1).execute()
-            if hasattr(response, 'data'):
-                count = len(response.data)
-                print(f"Número de empleados activos (fallback): {count}")
-                return count
-            return 0
+        # Contar empleados con status = 1 desde el roster en caché
+        count = len(_roster_active('employees'))
+        logger.debug("Número de empleados activos: %s", count)
+        return count
     except Exception as e:
-        print(f"Error al obtener conteo de empleados activos: {e}")
+        logger.error("Error al obtener conteo de empleados activos: %s", e)
         return 0
 
 def get_active_ninos():
     """Obtener solo los niños activos (status = 1)"""
     try:
-        print("\n=== Obteniendo niños activos ===")
-        response = supabase.from_('ninos').select('*').eq('status', 1).execute()
+        logger.debug("Obteniendo niños activos")
+        active = _roster_active('ninos')
         
-        if hasattr(response, 'data'):
+        if active:
             data_converted = []
-            for item in response.data:
+            for item in active:
                 converted = {
                     'id': item['id'],
                     'nombre': item['nombre'],
@@ -427,18 +933,18 @@ def get_active_ninos():
             return data_converted
         return []
     except Exception as e:
-        print(f"Error al obtener niños activos: {e}")
+        logger.error("Error al obtener niños activos: %s", e)
         return []
 
 def get_active_employees():
     """Obtener solo los empleados activos (status = 1)"""
     try:
-        print("\n=== Obteniendo empleados activos ===")
-        response = supabase.from_('employees').select('*').eq('status', 1).execute()
+        logger.debug("Obteniendo empleados activos")
+        active = _roster_active('employees')
         
-        if hasattr(response, 'data'):
+        if active:
             data_converted = []
-            for item in response.data:
+            for item in active:
                 item_lower = {k.lower(): v for k, v in item.items()}
                 converted = {
                     'id': item_lower.get('id'),
@@ -455,14 +961,15 @@ def get_active_employees():
             return data_converted
         return []
     except Exception as e:
-        print(f"Error al obtener empleados activos: {e}")
+        logger.error("Error al obtener empleados activos: %s", e)
         return []
 
+@_journaled
 def add_asistencia(fecha, tipo, id_persona, valor):
     """Agregar un nuevo registro de asistencia"""
     try:
-        print(f"\n=== Agregando asistencia ===")
-        print(f"Fecha: {fecha}, Tipo: {tipo}, ID Persona: {id_persona}, Valor: {valor}")
+        logger.debug("Agregando asistencia")
+        logger.debug("Fecha: %s, Tipo: %s, ID Persona: %s, Valor: %s", fecha, tipo, id_persona, valor)
         
         data = {
             "fecha": fecha,
@@ -474,115 +981,279 @@ def add_asistencia(fecha, tipo, id_persona, valor):
         response = supabase.table('asistencia').insert(data).execute()
         if response.data:
             record = response.data[0]
+            _journal('asistencia', fecha, id_persona)
             # Si es niño, actualizar su saldo guardado
             if tipo == 'nino':
-                child = supabase.table('ninos').select('saldo').eq('id', id_persona).execute()
-                if child.data:
-                    old_saldo = float(child.data[0].get('saldo') or 0)
-                    new_saldo = old_saldo + float(valor)
-                    supabase.table('ninos').update({'saldo': new_saldo}).eq('id', id_persona).execute()
+                _adjust_nino_saldo(id_persona, float(valor))
             
-            print(f"Asistencia agregada exitosamente: {record}")
+            log_payload(logger, "Asistencia agregada exitosamente: %s", record)
             return record
         return None
     except Exception as e:
-        print(f"Error al agregar asistencia: {e}")
+        logger.error("Error al agregar asistencia: %s", e)
         return None
 
-def get_today_ninos_total():
+@_journaled
+def add_asistencias_lote(asistencias):
+    """Registrar varias asistencias con un solo insert y el ajuste de saldos de todo el lote.
+
+    El ajuste es una llamada con migrations/007_ajustar_saldos.sql; sin ella _adjust_ninos_saldo
+    escribe el saldo niño por niño.
+
+    asistencias: lista de dicts con fecha, tipo, id_persona y valor.
+    Devuelve, en el mismo orden, {'id_persona', 'success', 'asistencia', 'error'} por cada fila.
+    """
+    resultados = [
+        {'id_persona': a.get('id_persona'), 'success': False, 'asistencia': None, 'error': None}
+        for a in asistencias
+    ]
+
+    # Las filas con datos inválidos no van al insert (uno solo fallaría el lote entero)
+    filas, indices = [], []
+    for i, a in enumerate(asistencias):
+        try:
+            filas.append({
+                "fecha": a['fecha'],
+                "tipo": a['tipo'],
+                "id_persona": int(a['id_persona']),
+                "valor": float(a['valor'])
+            })
+            indices.append(i)
+        except (KeyError, TypeError, ValueError) as e:
+            resultados[i]['error'] = f"Datos de asistencia inválidos: {e}"
+    if not filas:
+        return resultados
+
+    try:
+        # 1. Un solo insert con todas las filas (PostgREST las devuelve en orden)
+        response = supabase.table('asistencia').insert(filas).execute()
+        insertadas = response.data or []
+        _journal_rows('asistencia', insertadas, 'fecha', 'id_persona')
+        if len(insertadas) != len(filas):
+            raise RuntimeError("No se insertaron todas las asistencias del lote")
+
+        saldo_delta = {}
+        for i, record in zip(indices, insertadas):
+            resultados[i]['success'] = True
+            resultados[i]['asistencia'] = record
+            if record.get('tipo') == 'nino':
+                id_nino = record['id_persona']
+                saldo_delta[id_nino] = saldo_delta.get(id_nino, 0) + float(record.get('valor') or 0)
+    except Exception as e:
+        logger.error("Error al registrar lote de asistencia: %s", e)
+        for resultado in resultados:
+            if not resultado['success'] and not resultado['error']:
+                resultado['error'] = str(e)
+        return resultados
+
+    # 2. (Legado) Un solo ajuste de saldo con el delta agregado por niño. Las filas ya
+    #    quedaron guardadas, así que un error aquí no las marca como fallidas.
+    try:
+        _adjust_ninos_saldo(saldo_delta)
+    except Exception as e:
+        logger.error("Error al ajustar saldos del lote de asistencia: %s", e)
+
+    logger.debug("Lote de asistencia registrado: %s filas", len(insertadas))
+    return resultados
+
+def empty_week_aggregate(start_date, end_date, include_gastos=True):
+    """Agregado vacío de un rango (sin asistencia ni gastos)."""
+    return {
+        'start_date': start_date,
+        'end_date': end_date,
+        'registros': 0,
+        # {id_persona: {fecha: [monto, registros]}} en orden de primera asistencia
+        'ninos_por_persona': {},
+        'trabajadoras_por_persona': {},
+        'ninos_por_dia': {},
+        'horas_por_dia': {},
+        'ninos_total': 0,
+        'horas_total': 0,
+        'ninos_ids': set(),
+        'employee_stats': {},
+        'incluye_gastos': include_gastos,
+        'gastos': [],
+        'total_gastos': 0,
+        'nino_names': None,
+        'employee_names': None
+    }
+
+def get_week_aggregate(start_date, end_date, include_gastos=True):
+    """Obtener en una sola pasada la asistencia (y los gastos) de un rango de fechas.
+
+    Todas las métricas del dashboard se derivan de este resultado en memoria, así la
+    página cuesta una consulta de asistencia más una de gastos en lugar de una por métrica.
+    Con la migración 005 la asistencia llega ya agrupada por persona y día.
+    """
+    aggregate = empty_week_aggregate(start_date, end_date, include_gastos)
+    try:
+        start_date_str = start_date.isoformat()
+        end_date_str = end_date.isoformat()
+        logger.debug("Agregando asistencia del período %s a %s", start_date_str, end_date_str)
+
+        rows = _call_rpc('asistencia_semana', {'p_desde': start_date_str, 'p_hasta': end_date_str})
+        if rows is not None:
+            _fold_week_grouped(aggregate, rows)
+        else:
+            query = supabase.from_('asistencia').select('fecha, tipo, valor, id_persona', count='exact')\
+                .gte('fecha', start_date_str).lte('fecha', end_date_str).order('id')
+            for page in iter_paginated(query):
+                _fold_week_asistencia(aggregate, page)
+
+        if include_gastos:
+            aggregate['gastos'], aggregate['total_gastos'] = get_week_gastos(start_date, end_date)
+
+        logger.debug("Registros de asistencia agregados: %s", aggregate['registros'])
+        return aggregate
+    except Exception as e:
+        logger.error("Error al agregar asistencia del período: %s", e)
+        return aggregate
+
+def _fold_persona_dia(aggregate, tipo, id_persona, fecha, valor, registros=1):
+    """Acumular en el agregado el monto (niños) u horas (trabajadoras) de una persona en un día."""
+    aggregate['registros'] += registros
+
+    if tipo == 'nino':
+        por_persona = aggregate['ninos_por_persona']
+        aggregate['ninos_por_dia'][fecha] = aggregate['ninos_por_dia'].get(fecha, 0) + valor
+        aggregate['ninos_total'] += valor
+        aggregate['ninos_ids'].add(id_persona)
+    elif tipo == 'trabajadora':
+        por_persona = aggregate['trabajadoras_por_persona']
+        aggregate['horas_por_dia'][fecha] = aggregate['horas_por_dia'].get(fecha, 0) + valor
+        aggregate['horas_total'] += valor
+
+        if id_persona not in aggregate['employee_stats']:
+            aggregate['employee_stats'][id_persona] = {
+                'total_horas': 0,
+                'dias_trabajados': set()
+            }
+        aggregate['employee_stats'][id_persona]['total_horas'] += valor
+        aggregate['employee_stats'][id_persona]['dias_trabajados'].add(fecha)
+    else:
+        return
+
+    dias = por_persona.setdefault(id_persona, {})
+    if fecha in dias:
+        dias[fecha][0] += valor
+        dias[fecha][1] += registros
+    else:
+        dias[fecha] = [valor, registros]
+
+def _fold_week_asistencia(aggregate, asistencia_data):
+    """Acumular en el agregado las filas de asistencia (fecha, tipo, valor, id_persona)."""
+    for item in asistencia_data:
+        _fold_persona_dia(aggregate, item['tipo'], item['id_persona'], item['fecha'],
+                          float(item.get('valor') or 0))
+    return aggregate
+
+def _fold_week_grouped(aggregate, rows):
+    """Acumular en el agregado las filas de asistencia_semana (una por persona)."""
+    for row in rows:
+        for fecha, monto, registros in zip(row['fechas'], row['montos'], row['registros']):
+            _fold_persona_dia(aggregate, row['tipo'], row['id_persona'], fecha,
+                              float(monto or 0), int(registros))
+    return aggregate
+
+def _aggregate_covers(aggregate, target_date):
+    """Indica si un agregado ya contiene la fecha indicada (ISO o date)."""
+    if not aggregate:
+        return False
+    target_date_str = target_date.isoformat() if hasattr(target_date, 'isoformat') else target_date
+    return aggregate['start_date'].isoformat() <= target_date_str <= aggregate['end_date'].isoformat()
+
+def _aggregate_names(aggregate, ninos=True, employees=True):
+    """Resolver (una sola vez por agregado) los nombres de niños y trabajadoras que asistieron."""
+    if ninos and aggregate['nino_names'] is None:
+        aggregate['nino_names'] = _roster_names('ninos', list(aggregate['ninos_ids']))
+
+    if employees and aggregate['employee_names'] is None:
+        aggregate['employee_names'] = _roster_names('employees', list(aggregate['employee_stats'].keys()))
+
+    return aggregate['nino_names'] or {}, aggregate['employee_names'] or {}
+
+def get_today_ninos_total(aggregate=None):
     """Obtener la suma total de montos de niños para hoy"""
     try:
-        today = get_current_time().date().isoformat() # Usar datetime.now().date()
-        
-        print(f"\n=== Obteniendo total de niños para hoy ({today}) ===")
-        
-        response = supabase.from_('asistencia').select('valor').eq('fecha', today).eq('tipo', 'nino').execute()
-        
-        if hasattr(response, 'data'):
-            total = sum(float(item['valor']) for item in response.data)
-            print(f"Total de niños para hoy: ${total}")
-            return total
-        return 0
+        today = get_current_time().date()
+
+        logger.debug("Obteniendo total de niños para hoy (%s)", today.isoformat())
+
+        # Reutilizar el agregado de la semana si ya incluye hoy
+        if not _aggregate_covers(aggregate, today):
+            aggregate = get_week_aggregate(today, today, include_gastos=False)
+
+        total = aggregate['ninos_por_dia'].get(today.isoformat(), 0)
+        logger.debug("Total de niños para hoy: $%s", total)
+        return total
     except Exception as e:
-        print(f"Error al obtener total de niños para hoy: {e}")
+        logger.error("Error al obtener total de niños para hoy: %s", e)
         return 0
 
-def get_today_payment_per_hour():
+def get_today_payment_per_hour(aggregate=None):
     """Obtener el pago por hora de hoy (total niños / total horas trabajadoras)"""
     try:
-        today = get_current_time().date().isoformat() # Usar datetime.now().date()
-        
-        print(f"\n=== Calculando pago por hora para hoy ({today}) ===")
-        
-        # Obtener total de niños
-        ninos_response = supabase.from_('asistencia').select('valor').eq('fecha', today).eq('tipo', 'nino').execute()
-        total_ninos = 0
-        if hasattr(ninos_response, 'data'):
-            total_ninos = sum(float(item['valor']) for item in ninos_response.data)
-        
-        # Obtener total de horas trabajadoras
-        trabajadoras_response = supabase.from_('asistencia').select('valor').eq('fecha', today).eq('tipo', 'trabajadora').execute()
-        total_horas = 0
-        if hasattr(trabajadoras_response, 'data'):
-            total_horas = sum(float(item['valor']) for item in trabajadoras_response.data)
-        
+        today = get_current_time().date()
+
+        logger.debug("Calculando pago por hora para hoy (%s)", today.isoformat())
+
+        if not _aggregate_covers(aggregate, today):
+            aggregate = get_week_aggregate(today, today, include_gastos=False)
+
+        total_ninos = aggregate['ninos_por_dia'].get(today.isoformat(), 0)
+        total_horas = aggregate['horas_por_dia'].get(today.isoformat(), 0)
+
         # Calcular pago por hora
         if total_horas > 0:
             payment_per_hour = total_ninos / total_horas
-            print(f"Total niños: ${total_ninos}, Total horas: {total_horas}, Pago por hora: ${payment_per_hour:.2f}")
+            logger.debug("Total niños: $%s, Total horas: %s, Pago por hora: $%.2f", total_ninos, total_horas, payment_per_hour)
             return round(payment_per_hour, 2)
         else:
-            print("No hay horas registradas para hoy")
+            logger.debug("No hay horas registradas para hoy")
             return 0
     except Exception as e:
-        print(f"Error al calcular pago por hora: {e}")
+        logger.error("Error al calcular pago por hora: %s", e)
         return 0
 
 def get_date_ninos_asistencia(target_date):
     """Obtener asistencia de niños para una fecha específica con información del niño"""
     try:
-        print(f"\n=== Obteniendo asistencia de niños para {target_date} ===")
+        logger.debug("Obteniendo asistencia de niños para %s", target_date)
         
         # Primero obtener los registros de asistencia
         response = supabase.from_('asistencia').select('*').eq('fecha', target_date).eq('tipo', 'nino').execute()
         
         if hasattr(response, 'data') and response.data:
+            # Nombres de todos los niños del día desde el roster en caché
+            nino_ids = list(set(item['id_persona'] for item in response.data))
+            nino_names_map = _roster_names('ninos', nino_ids)
+
             data_converted = []
             total_monto = 0
             for item in response.data:
-                # Obtener el nombre del niño usando el id_persona
-                try:
-                    nino_response = supabase.from_('ninos').select('nombre').eq('id', item['id_persona']).execute()
-                    nombre = 'N/A'
-                    if hasattr(nino_response, 'data') and nino_response.data:
-                        nombre = nino_response.data[0]['nombre']
-                    
-                    valor = float(item['valor'])
-                    total_monto += valor
-                    
-                    converted = {
-                        'id': item['id'],
-                        'id_persona': item['id_persona'],
-                        'valor': valor,
-                        'fecha': item['fecha'],
-                        'tipo': item['tipo'],
-                        'nombre': nombre
-                    }
-                    data_converted.append(converted)
-                except Exception as e:
-                    print(f"Error al obtener nombre del niño {item['id_persona']}: {e}")
-                    continue
+                valor = float(item['valor'])
+                total_monto += valor
+                
+                converted = {
+                    'id': item['id'],
+                    'id_persona': item['id_persona'],
+                    'valor': valor,
+                    'fecha': item['fecha'],
+                    'tipo': item['tipo'],
+                    'nombre': nino_names_map.get(item['id_persona'], 'N/A')
+                }
+                data_converted.append(converted)
             
             # Ordenar por nombre
             data_converted.sort(key=lambda x: x['nombre'])
-            print(f"Asistencia de niños obtenida: {data_converted}")
-            print(f"Total monto niños: ${total_monto}")
+            log_payload(logger, "Asistencia de niños obtenida: %s", data_converted)
+            logger.debug("Total monto niños: $%s", total_monto)
             return data_converted, total_monto
         else:
-            print(f"No se encontraron registros de asistencia de niños para {target_date}")
+            logger.debug("No se encontraron registros de asistencia de niños para %s", target_date)
             return [], 0
     except Exception as e:
-        print(f"Error al obtener asistencia de niños: {e}")
+        logger.error("Error al obtener asistencia de niños: %s", e)
         return [], 0
 # DEBUG LINE: get_date_ninos_asistencia function is loaded.
 
@@ -596,48 +1267,42 @@ def get_today_ninos_asistencia(): # ESTA ES LA FUNCIÓN QUE SE SUGIRIÓ EN EL ER
 def get_date_employees_asistencia(target_date):
     """Obtener asistencia de empleados para una fecha específica con información del empleado"""
     try:
-        print(f"\n=== Obteniendo asistencia de empleados para {target_date} ===")
+        logger.debug("Obteniendo asistencia de empleados para %s", target_date)
         
         # Primero obtener los registros de asistencia
         response = supabase.from_('asistencia').select('*').eq('fecha', target_date).eq('tipo', 'trabajadora').execute()
         
         if hasattr(response, 'data') and response.data:
+            # Nombres de todos los empleados del día desde el roster en caché
+            employee_ids = list(set(item['id_persona'] for item in response.data))
+            employee_names_map = _roster_names('employees', employee_ids)
+
             data_converted = []
             total_horas = 0
             for item in response.data:
-                # Obtener el nombre del empleado usando el id_persona
-                try:
-                    employee_response = supabase.from_('employees').select('nombre').eq('id', item['id_persona']).execute()
-                    nombre = 'N/A'
-                    if hasattr(employee_response, 'data') and employee_response.data:
-                        nombre = employee_response.data[0]['nombre']
-                    
-                    valor = float(item['valor'])
-                    total_horas += valor
-                    
-                    converted = {
-                        'id': item['id'],
-                        'id_persona': item['id_persona'],
-                        'valor': valor,
-                        'fecha': item['fecha'],
-                        'tipo': item['tipo'],
-                        'nombre': nombre
-                    }
-                    data_converted.append(converted)
-                except Exception as e:
-                    print(f"Error al obtener nombre del empleado {item['id_persona']}: {e}")
-                    continue
+                valor = float(item['valor'])
+                total_horas += valor
+                
+                converted = {
+                    'id': item['id'],
+                    'id_persona': item['id_persona'],
+                    'valor': valor,
+                    'fecha': item['fecha'],
+                    'tipo': item['tipo'],
+                    'nombre': employee_names_map.get(item['id_persona'], 'N/A')
+                }
+                data_converted.append(converted)
             
             # Ordenar por nombre
             data_converted.sort(key=lambda x: x['nombre'])
-            print(f"Asistencia de empleados obtenida: {data_converted}")
-            print(f"Total horas empleados: {total_horas}")
+            log_payload(logger, "Asistencia de empleados obtenida: %s", data_converted)
+            logger.debug("Total horas empleados: %s", total_horas)
             return data_converted, total_horas
         else:
-            print(f"No se encontraron registros de asistencia de empleados para {target_date}")
+            logger.debug("No se encontraron registros de asistencia de empleados para %s", target_date)
             return [], 0
     except Exception as e:
-        print(f"Error al obtener asistencia de empleados: {e}")
+        logger.error("Error al obtener asistencia de empleados: %s", e)
         return [], 0
 
 def get_today_employees_asistencia(): # ESTA ES LA FUNCIÓN QUE SE SUGIRIÓ EN EL ERROR ANTERIOR
@@ -646,6 +1311,7 @@ def get_today_employees_asistencia(): # ESTA ES LA FUNCIÓN QUE SE SUGIRIÓ EN E
     # Para evitar duplicación de lógica, haremos que llame a la función general
     return get_date_employees_asistencia(get_current_time().date().isoformat())
 
+@_journaled
 def update_asistencia(id, valor):
     """Actualizar el valor de un registro de asistencia"""
     try:
@@ -664,22 +1330,19 @@ def update_asistencia(id, valor):
         response = supabase.from_('asistencia').update(data).eq('id', id).execute()
         
         if hasattr(response, 'data') and response.data:
+            _journal('asistencia', old_record.get('fecha'), id_persona)
             # 3. Si es niño, ajustar el saldo (diferencia)
             if tipo == 'nino':
-                child = supabase.table('ninos').select('saldo').eq('id', id_persona).execute()
-                if child.data:
-                    current_saldo = float(child.data[0].get('saldo') or 0)
-                    diferencia = float(valor) - old_valor
-                    new_saldo = current_saldo + diferencia
-                    supabase.table('ninos').update({'saldo': new_saldo}).eq('id', id_persona).execute()
+                _adjust_nino_saldo(id_persona, float(valor) - old_valor)
             
-            print(f"Asistencia actualizada exitosamente: {response.data[0]}")
+            log_payload(logger, "Asistencia actualizada exitosamente: %s", response.data[0])
             return response.data[0]
         return None
     except Exception as e:
-        print(f"Error al actualizar asistencia: {e}")
+        logger.error("Error al actualizar asistencia: %s", e)
         return None
 
+@_journaled
 def delete_asistencia(id):
     """Eliminar un registro de asistencia"""
     try:
@@ -693,80 +1356,60 @@ def delete_asistencia(id):
 
             # 2. Borrar
             supabase.from_('asistencia').delete().eq('id', id).execute()
+            _journal('asistencia', old_record.get('fecha'), id_persona)
 
             # 3. Ajustar saldo si es niño
             if tipo == 'nino':
-                child = supabase.table('ninos').select('saldo').eq('id', id_persona).execute()
-                if child.data:
-                    current_saldo = float(child.data[0].get('saldo') or 0)
-                    new_saldo = current_saldo - valor
-                    supabase.table('ninos').update({'saldo': new_saldo}).eq('id', id_persona).execute()
+                _adjust_nino_saldo(id_persona, -valor)
         
-        print(f"Asistencia eliminada exitosamente")
+        logger.debug("Asistencia eliminada exitosamente")
         return True
     except Exception as e:
-        print(f"Error al eliminar asistencia: {e}")
+        logger.error("Error al eliminar asistencia: %s", e)
         return False
 
-def get_week_ninos_unique_count(start_date, end_date):
+def get_week_ninos_unique_count(start_date, end_date, aggregate=None):
     """Obtener el número de niños únicos en un rango de fechas"""
     try:
-        print(f"\n=== Obteniendo niños únicos del período ===")
-        print(f"Fecha inicio: {start_date}")
-        print(f"Fecha fin: {end_date}")
-        
-        # Obtener todos los registros de asistencia de niños para el período especificado
-        response = supabase.from_('asistencia').select('id_persona').eq('tipo', 'nino').gte('fecha', start_date.isoformat()).lte('fecha', end_date.isoformat()).execute()
-        
-        if hasattr(response, 'data') and response.data:
-            # Obtener IDs únicos de niños
-            unique_ninos_ids = set()
-            for item in response.data:
-                unique_ninos_ids.add(item['id_persona'])
-            
-            count = len(unique_ninos_ids)
-            print(f"Niños únicos en el período: {count}")
-            print(f"IDs únicos: {unique_ninos_ids}")
-            return count
-        else:
-            print("No se encontraron registros de asistencia de niños en el período especificado")
-            return 0
+        logger.debug("Obteniendo niños únicos del período")
+        logger.debug("Fecha inicio: %s", start_date)
+        logger.debug("Fecha fin: %s", end_date)
+
+        if aggregate is None:
+            aggregate = get_week_aggregate(start_date, end_date, include_gastos=False)
+
+        count = len(aggregate['ninos_ids'])
+        logger.debug("Niños únicos en el período: %s", count)
+        return count
     except Exception as e:
-        print(f"Error al obtener conteo de niños únicos del período: {e}")
+        logger.error("Error al obtener conteo de niños únicos del período: %s", e)
         return 0
 
-def get_week_ninos_total(start_date, end_date):
+def get_week_ninos_total(start_date, end_date, aggregate=None):
     """Obtener la suma total de montos de niños para un rango de fechas específico"""
     try:
-        print(f"\n=== Obteniendo total de niños del período ===")
-        print(f"Fecha inicio: {start_date}")
-        print(f"Fecha fin: {end_date}")
-        
-        # Obtener todos los registros de asistencia de niños para el período especificado
-        response = supabase.from_('asistencia').select('valor').eq('tipo', 'nino').gte('fecha', start_date.isoformat()).lte('fecha', end_date.isoformat()).execute()
-        
-        if hasattr(response, 'data') and response.data:
-            total = sum(float(item['valor']) for item in response.data)
-            print(f"Total de niños del período: ${total}")
-            return total
-        else:
-            print("No se encontraron registros de asistencia de niños en la semana")
-            return 0
+        logger.debug("Obteniendo total de niños del período")
+        logger.debug("Fecha inicio: %s", start_date)
+        logger.debug("Fecha fin: %s", end_date)
+
+        if aggregate is None:
+            aggregate = get_week_aggregate(start_date, end_date, include_gastos=False)
+
+        total = aggregate['ninos_total']
+        logger.debug("Total de niños del período: $%s", total)
+        return total
     except Exception as e:
-        print(f"Error al obtener total de niños del período: {e}")
+        logger.error("Error al obtener total de niños del período: %s", e)
         return 0
 
 
-def get_week_children_summary(start_of_week, end_of_week):
+def get_week_children_summary(start_of_week, end_of_week, aggregate=None):
     """Obtener resumen semanal de niÃ±os con total y desglose por dÃ­a (Lunes a Viernes)."""
     try:
-        start_date_str = start_of_week.isoformat()
-        end_date_str = end_of_week.isoformat()
+        if aggregate is None:
+            aggregate = get_week_aggregate(start_of_week, end_of_week, include_gastos=False)
 
-        response = supabase.from_('asistencia').select('fecha, valor, id_persona')\
-            .eq('tipo', 'nino').gte('fecha', start_date_str).lte('fecha', end_date_str).execute()
-
-        if not (hasattr(response, 'data') and response.data):
+        if not aggregate['ninos_por_persona']:
             return []
 
         spanish_months = ['Ene', 'Feb', 'Mar', 'Abr', 'May', 'Jun',
@@ -782,47 +1425,38 @@ def get_week_children_summary(start_of_week, end_of_week):
                 'label_full': label_full
             })
 
-        nino_ids = list(set(item['id_persona'] for item in response.data))
-        nino_names_map = {}
-        if nino_ids:
-            ninos_response = supabase.from_('ninos').select('id, nombre').in_('id', nino_ids).execute()
-            if hasattr(ninos_response, 'data') and ninos_response.data:
-                nino_names_map = {item['id']: item['nombre'] for item in ninos_response.data}
+        nino_names_map, _ = _aggregate_names(aggregate, employees=False)
 
         children_summary = {}
-        for item in response.data:
-            nino_id = item['id_persona']
-            fecha = item['fecha']
-            valor = float(item.get('valor') or 0)
-
-            if nino_id not in children_summary:
-                children_summary[nino_id] = {
-                    'id': nino_id,
-                    'nombre': nino_names_map.get(nino_id, 'Desconocido'),
-                    'total': 0,
-                    'daily': [{'label': d['label'], 'label_full': d['label_full'], 'date': d['date'], 'amount': 0} for d in week_days]
-                }
-
-            for daily_item in children_summary[nino_id]['daily']:
-                if daily_item['date'] == fecha:
-                    daily_item['amount'] += valor
-                    children_summary[nino_id]['total'] += valor
-                    break
+        for nino_id, dias in aggregate['ninos_por_persona'].items():
+            daily = [{'label': d['label'], 'label_full': d['label_full'], 'date': d['date'], 'amount': 0} for d in week_days]
+            total = 0
+            for daily_item in daily:
+                if daily_item['date'] in dias:
+                    daily_item['amount'] = dias[daily_item['date']][0]
+                    total += daily_item['amount']
+
+            children_summary[nino_id] = {
+                'id': nino_id,
+                'nombre': nino_names_map.get(nino_id, 'Desconocido'),
+                'total': total,
+                'daily': daily
+            }
 
         result = sorted(children_summary.values(), key=lambda x: x['total'], reverse=True)
         return result
     except Exception as e:
-        print(f"Error al obtener resumen semanal de niÃ±os: {e}")
+        logger.error("Error al obtener resumen semanal de niÃ±os: %s", e)
         return []
 
-def get_week_daily_amounts(start_date, end_date):
+def get_week_daily_amounts(start_date, end_date, aggregate=None):
     """Obtener los montos diarios para un rango de fechas específico.
     Esto incluye los nombres de niños y trabajadoras que asistieron cada día.
     """
     try:
-        print(f"\n--- DEBUG get_week_daily_amounts ---")
-        print(f"Fecha inicio: {start_date.isoformat()}")
-        print(f"Fecha fin: {end_date.isoformat()}")
+        logger.debug("DEBUG get_week_daily_amounts")
+        logger.debug("Fecha inicio: %s", start_date.isoformat())
+        logger.debug("Fecha fin: %s", end_date.isoformat())
 
         # Calcular el número de días en el rango
         days_range = (end_date - start_date).days + 1
@@ -839,145 +1473,70 @@ def get_week_daily_amounts(start_date, end_date):
             }
             for i in range(days_range)
         }
-        print(f"Estructura week_data inicializada: {week_data}")
 
-        # 1. Obtener todos los registros de asistencia de niños para la semana en una sola consulta.
-        # Obtener asistencia de niños para el rango de fechas especificado
-        ninos_asistencia_response = supabase.from_('asistencia').select('fecha, valor, id_persona').eq('tipo', 'nino').gte('fecha', start_date.isoformat()).lte('fecha', end_date.isoformat()).execute()
-        
-        print(f"Respuesta cruda de asistencia de niños: {ninos_asistencia_response}")
-
-        # 2. Obtener los nombres de todos los niños que asistieron en el período
-        nino_names_map = {}
-        if hasattr(ninos_asistencia_response, 'data') and ninos_asistencia_response.data:
-            nino_ids = list(set(item['id_persona'] for item in ninos_asistencia_response.data)) # Obtener IDs únicos
-            print(f"IDs de niños con asistencia esta semana: {nino_ids}")
-            if nino_ids: # Solo consultar si hay IDs
-                ninos_data_response = supabase.from_('ninos').select('id, nombre').in_('id', nino_ids).execute()
-                if hasattr(ninos_data_response, 'data'):
-                    nino_names_map = {item['id']: item['nombre'] for item in ninos_data_response.data}
-                    print(f"Mapa de nombres de niños: {nino_names_map}")
-            
-            # Procesar los datos de asistencia de niños y agregarlos a week_data
-            for item in ninos_asistencia_response.data:
-                fecha = item['fecha']
-                valor = float(item['valor'])
-                id_persona = item['id_persona']
-                
-                print(f"Procesando asistencia de niño: Fecha={fecha}, Valor={valor}, ID_Persona={id_persona}")
-                
+        # 1. Toda la asistencia del período viene del agregado (una sola consulta)
+        if aggregate is None:
+            aggregate = get_week_aggregate(start_date, end_date, include_gastos=False)
+
+        # 2. Nombres de niños y trabajadoras que asistieron en el período
+        nino_names_map, employee_names_map = _aggregate_names(aggregate)
+
+        # 3. Procesar la asistencia de niños (el nombre se repite por cada registro del día)
+        for nino_id, dias in aggregate['ninos_por_persona'].items():
+            nombre = nino_names_map.get(nino_id, 'Desconocido')
+            for fecha, (monto, registros) in dias.items():
                 if fecha in week_data:
-                    week_data[fecha]['amount'] += valor
-                    # Añadir nombre del niño si existe, si no, 'Desconocido'
-                    week_data[fecha]['ninos'].append(nino_names_map.get(id_persona, 'Desconocido'))
+                    week_data[fecha]['amount'] += monto
+                    week_data[fecha]['ninos'].extend([nombre] * registros)
 
-        # 3. Obtener todos los registros de asistencia de trabajadoras para el período especificado
-        employees_asistencia_response = supabase.from_('asistencia').select('fecha, id_persona').eq('tipo', 'trabajadora').gte('fecha', start_date.isoformat()).lte('fecha', end_date.isoformat()).execute()
-        
-        print(f"Respuesta cruda de asistencia de trabajadoras: {employees_asistencia_response}")
-
-        # 4. Obtener los nombres de todas las trabajadoras que asistieron en el período
-        employee_names_map = {}
-        if hasattr(employees_asistencia_response, 'data') and employees_asistencia_response.data:
-            employee_ids = list(set(item['id_persona'] for item in employees_asistencia_response.data)) # Obtener IDs únicos
-            print(f"IDs de trabajadoras con asistencia esta semana: {employee_ids}")
-            if employee_ids: # Solo consultar si hay IDs
-                employees_data_response = supabase.from_('employees').select('id, nombre').in_('id', employee_ids).execute()
-                if hasattr(employees_data_response, 'data'):
-                    employee_names_map = {item['id']: item['nombre'] for item in employees_data_response.data}
-                    print(f"Mapa de nombres de trabajadoras: {employee_names_map}")
-            
-            # Procesar los datos de asistencia de trabajadoras y agregarlos a week_data
-            for item in employees_asistencia_response.data:
-                fecha = item['fecha']
-                id_persona = item['id_persona']
-                
-                print(f"Procesando asistencia de trabajadora: Fecha={fecha}, ID_Persona={id_persona}")
-                
+        # 4. Procesar la asistencia de trabajadoras
+        for id_persona, dias in aggregate['trabajadoras_por_persona'].items():
+            nombre = employee_names_map.get(id_persona, 'Desconocido')
+            for fecha, (_, registros) in dias.items():
                 if fecha in week_data:
-                    # Añadir nombre de la trabajadora si existe
-                    week_data[fecha]['trabajadoras'].append(employee_names_map.get(id_persona, 'Desconocido'))
+                    week_data[fecha]['trabajadoras'].extend([nombre] * registros)
 
         # 5. Convertir el diccionario de datos semanales en una lista ordenada por fecha para el frontend
         daily_amounts = sorted(list(week_data.values()), key=lambda x: x['date'])
         
-        print(f"DEBUG: Datos finales enviados al gráfico: {daily_amounts}")
-        print(f"--- FIN DEBUG get_week_daily_amounts ---")
+        logger.debug("FIN DEBUG get_week_daily_amounts")
         return daily_amounts
 
     except Exception as e:
-        print(f"ERROR: Fallo en get_week_daily_amounts: {e}")
+        logger.error("Fallo en get_week_daily_amounts: %s", e)
         return []
 
-def get_week_employees_earnings(start_of_week, end_of_week):
+def get_week_employees_earnings(start_of_week, end_of_week, aggregate=None):
     """Obtener los montos de ganancias de empleados de la semana especificada.
        CALCULO SEMANAL: (Total Ingresos Semana - Total Gastos Semana) / Total Horas Semana
     """
     try:
-        print(f"\n--- DEBUG get_week_employees_earnings (Weekly Calculation) ---")
-        start_date_str = start_of_week.isoformat()
-        end_date_str = end_of_week.isoformat()
-
-        # 1. Obtener todas las asistencias de la semana
-        query = supabase.from_('asistencia').select('fecha, tipo, valor, id_persona')\
-            .gte('fecha', start_date_str).lte('fecha', end_date_str)
-        asistencia_data = fetch_all_paginated(query)
-        
-        if not asistencia_data:
+        logger.debug("DEBUG get_week_employees_earnings (Weekly Calculation)")
+
+        # 1. Asistencias y gastos de la semana desde el agregado
+        if aggregate is None:
+            aggregate = get_week_aggregate(start_of_week, end_of_week)
+
+        if not aggregate['registros']:
             return []
 
-        # 2. Obtener todos los gastos de la semana
-        gastos_response = supabase.from_('gastos').select('monto').gte('fecha', start_date_str).lte('fecha', end_date_str).execute()
-        
-        # 3. Calcular Totales Semanales
-        total_ingresos_semana = 0
-        total_horas_semana = 0
-        
-        # Agrupar horas por empleado para el resultado final
-        employee_stats = {} 
-        
-        for item in asistencia_data:
-            tipo = item['tipo']
-            valor = float(item['valor'])
-            
-            if tipo == 'nino':
-                total_ingresos_semana += valor
-            elif tipo == 'trabajadora':
-                total_horas_semana += valor
-                id_persona = item['id_persona']
-                
-                # Inicializar empleada si no existe
-                if id_persona not in employee_stats:
-                    employee_stats[id_persona] = {
-                        'total_horas': 0, 
-                        'dias_trabajados': set()
-                    }
-                
-                employee_stats[id_persona]['total_horas'] += valor
-                employee_stats[id_persona]['dias_trabajados'].add(item['fecha'])
+        # 2. Totales Semanales
+        total_ingresos_semana = aggregate['ninos_total']
+        total_horas_semana = aggregate['horas_total']
+        total_gastos_semana = aggregate['total_gastos']
+        employee_stats = aggregate['employee_stats']
 
-        total_gastos_semana = 0
-        if hasattr(gastos_response, 'data'):
-            for gasto in gastos_response.data:
-                total_gastos_semana += float(gasto.get('monto', 0))
-                
-        # 4. Calcular Ingreso Neto y Pago por Hora Global
+        # 3. Calcular Ingreso Neto y Pago por Hora Global
         ingreso_neto_semana = total_ingresos_semana - total_gastos_semana
         pago_por_hora_semanal = 0
         
         if total_horas_semana > 0 and ingreso_neto_semana > 0:
             pago_por_hora_semanal = ingreso_neto_semana / total_horas_semana
             
-        print(f"DEBUG: Ingresos: {total_ingresos_semana}, Gastos: {total_gastos_semana}, Neto: {ingreso_neto_semana}, Horas: {total_horas_semana}, Rate: {pago_por_hora_semanal}")
+        logger.debug("Ingresos: %s, Gastos: %s, Neto: %s, Horas: %s, Rate: %s", total_ingresos_semana, total_gastos_semana, ingreso_neto_semana, total_horas_semana, pago_por_hora_semanal)
 
-        # 5. Formatear resultado final
-        employee_ids = list(employee_stats.keys())
-        employee_names_map = {}
-        
-        if employee_ids:
-            employees_data_response = supabase.from_('employees').select('id, nombre').in_('id', employee_ids).execute()
-            if hasattr(employees_data_response, 'data'):
-                employee_names_map = {item['id']: item['nombre'] for item in employees_data_response.data}
+        # 4. Formatear resultado final
+        _, employee_names_map = _aggregate_names(aggregate, ninos=False)
         
         final_earnings = []
         for id_persona, stats in employee_stats.items():
@@ -996,7 +1555,7 @@ def get_week_employees_earnings(start_of_week, end_of_week):
         return final_earnings
 
     except Exception as e:
-        print(f"ERROR: Fallo en get_week_employees_earnings: {e}")
+        logger.error("Fallo en get_week_employees_earnings: %s", e)
         return []
 
 def get_week_attendance_payment_summary(start_date, end_date):
@@ -1006,7 +1565,7 @@ def get_week_attendance_payment_summary(start_date, end_date):
         end_date_str = end_date.isoformat()
 
         query = supabase.from_('asistencia')\
-            .select('id, fecha, valor, id_persona, pagado, id_pago')\
+            .select('id, fecha, valor, id_persona, pagado, id_pago', count='exact')\
             .eq('tipo', 'nino')\
             .gte('fecha', start_date_str).lte('fecha', end_date_str)\
             .order('fecha', desc=False).order('id', desc=False)
@@ -1022,11 +1581,7 @@ def get_week_attendance_payment_summary(start_date, end_date):
             return empty_summary
 
         nino_ids = list({item['id_persona'] for item in attendance_data})
-        nino_names = {}
-        if nino_ids:
-            ninos_response = supabase.from_('ninos').select('id, nombre').in_('id', nino_ids).execute()
-            if hasattr(ninos_response, 'data'):
-                nino_names = {item['id']: item['nombre'] for item in ninos_response.data}
+        nino_names = _roster_names('ninos', nino_ids)
 
         pago_ids = list({
             item.get('id_pago') for item in attendance_data
@@ -1034,17 +1589,18 @@ def get_week_attendance_payment_summary(start_date, end_date):
         })
         pagos_map = {}
         if pago_ids:
-            pagos_response = supabase.from_('pagos').select('*, employees(nombre)').in_('id', pago_ids).execute()
+            pagos_response = supabase.from_('pagos').select('*').in_('id', pago_ids).execute()
             if hasattr(pagos_response, 'data'):
+                employee_names = _roster_names('employees', list({
+                    pago.get('id_empleado') for pago in pagos_response.data
+                    if pago.get('id_empleado') is not None
+                }))
                 for pago in pagos_response.data:
                     employee_id = pago.get('id_empleado')
-                    employee_dict = pago.get('employees')
                     if employee_id == 9:
                         employee_name = 'Caja/Casa'
-                    elif isinstance(employee_dict, dict):
-                        employee_name = employee_dict.get('nombre', 'Desconocida')
                     else:
-                        employee_name = 'Desconocida'
+                        employee_name = employee_names.get(employee_id) or 'Desconocida'
 
                     pagos_map[pago.get('id')] = {
                         'id': pago.get('id'),
@@ -1117,7 +1673,7 @@ def get_week_attendance_payment_summary(start_date, end_date):
         summary['total_pendiente'] = round(summary['total_pendiente'], 2)
         return summary
     except Exception as e:
-        print(f"ERROR: Fallo en get_week_attendance_payment_summary: {e}")
+        logger.error("Fallo en get_week_attendance_payment_summary: %s", e)
         return {
             'employees': {},
             'total_asistencias': 0,
@@ -1125,6 +1681,7 @@ def get_week_attendance_payment_summary(start_date, end_date):
             'total_pendiente': 0
         }
 
+@_journaled
 def update_pagos_empleado(pago_ids, id_empleado):
     """Cambiar la empleada que recibio uno o varios pagos."""
     try:
@@ -1132,31 +1689,64 @@ def update_pagos_empleado(pago_ids, id_empleado):
         if not clean_pago_ids:
             return False
 
-        supabase.from_('pagos').update({'id_empleado': int(id_empleado)})\
+        response = supabase.from_('pagos').update({'id_empleado': int(id_empleado)})\
             .in_('id', clean_pago_ids).execute()
+        # El resumen de pagos muestra la empleada en la semana de cada asistencia liquidada
+        _journal_rows('pagos', response.data, 'date', 'id_nino')
+        _journal_pago_asistencias(clean_pago_ids)
         return True
     except Exception as e:
-        print(f"Error al reasignar pagos: {e}")
+        logger.error("Error al reasignar pagos: %s", e)
         return False
 
+# Marcador del grupo de un pago dividido dentro de tipo ("Efectivo [DIV:<grupo>]"). Solo se
+# escribe si pagos.split_group_id no existe (migrations/006_split_group_id.sql).
 SPLIT_TIPO_MARKER = ' [DIV:'
 
+# None mientras no se sepa si existe la columna pagos.split_group_id
+_split_column = None
+
+def _is_missing_column_error(error):
+    """42703: columna inexistente en Postgres; PGRST204: columna desconocida para PostgREST."""
+    return getattr(error, 'code', None) in ('42703', 'PGRST204') or 'does not exist' in str(error)
+
+def _has_split_column():
+    """True si pagos tiene la columna split_group_id (se consulta una sola vez)."""
+    global _split_column
+    if _split_column is None:
+        try:
+            supabase.from_('pagos').select('split_group_id').limit(1).execute()
+            _split_column = True
+        except Exception as e:
+            if not _is_missing_column_error(e):
+                raise
+            logger.warning("pagos.split_group_id no existe, se usa el marcador en tipo: %s", e)
+            _split_column = False
+    return _split_column
+
 def _format_split_tipo(tipo, split_group_id):
     return f"{tipo}{SPLIT_TIPO_MARKER}{split_group_id}]"
 
 def _display_tipo(tipo):
     if not tipo:
         return 'Efectivo'
-    return str(tipo).split(SPLIT_TIPO_MARKER, 1)[0]
+    tipo = str(tipo)
+    # Solo las filas sin migrar llevan el grupo dentro de tipo
+    return tipo.split(SPLIT_TIPO_MARKER, 1)[0] if SPLIT_TIPO_MARKER in tipo else tipo
+
+def _split_group_id(pago):
+    """Grupo dividido de un pago (fila de pagos), o None si es un pago simple."""
+    if pago.get('split_group_id'):
+        return pago['split_group_id']
 
-def _split_group_id(tipo):
+    tipo = pago.get('tipo')
     if not tipo or SPLIT_TIPO_MARKER not in str(tipo):
         return None
 
     raw_group = str(tipo).split(SPLIT_TIPO_MARKER, 1)[1]
     return raw_group[:-1] if raw_group.endswith(']') else raw_group
 
-def _insert_pago_record(fecha, id_nino, id_empleado, monto, tipo):
+def _insert_pago_record(fecha, id_nino, id_empleado, monto, tipo, split_group_id=None):
     data = {
         "date": fecha,
         "id_nino": id_nino,
@@ -1164,42 +1754,139 @@ def _insert_pago_record(fecha, id_nino, id_empleado, monto, tipo):
         "monto": float(monto),
         "tipo": tipo
     }
+    if split_group_id:
+        data["split_group_id"] = split_group_id
 
     response = supabase.table('pagos').insert(data).execute()
+    _journal('pagos', fecha, id_nino)
     return response.data[0] if response.data else None
 
-def _mark_asistencias_pagadas(id_nino, monto, pago_id):
-    unpaid = supabase.from_('asistencia').select('id, valor') \
-        .eq('tipo', 'nino').eq('id_persona', id_nino).eq('pagado', False) \
-        .order('fecha', desc=False).order('id', desc=False).execute()
+def _allocate_asistencias(asistencias, monto):
+    """Recorrer las asistencias en el orden dado y devolver los ids que el monto alcanza a cubrir.
 
+    Una asistencia que no cabe en el remanente se salta (puede caber una posterior más chica).
+    """
     monto_restante = float(monto)
     EPSILON = 0.001
-    for a in (unpaid.data or []):
+    cubiertas = []
+    for a in asistencias:
         valor = float(a.get('valor') or 0)
         if valor <= 0:
             continue
         if monto_restante + EPSILON >= valor:
-            supabase.from_('asistencia').update({
-                'pagado': True,
-                'id_pago': pago_id
-            }).eq('id', a['id']).execute()
+            cubiertas.append(a['id'])
             monto_restante -= valor
         if monto_restante <= EPSILON:
             break
+    return cubiertas
+
+def _mark_asistencias_pagadas(id_nino, monto, pago_id):
+    unpaid = supabase.from_('asistencia').select('id, valor, fecha') \
+        .eq('tipo', 'nino').eq('id_persona', id_nino).eq('pagado', False) \
+        .order('fecha', desc=False).order('id', desc=False)
+
+    # FIFO calculado en memoria y aplicado en una sola actualización
+    asistencias = fetch_all_paginated(unpaid)
+    cubiertas = _allocate_asistencias(asistencias, monto)
+    cubiertas_set = set(cubiertas)
+    for a in asistencias:
+        if a['id'] in cubiertas_set:
+            _journal('asistencia', a['fecha'], id_nino)
+    for ids in _chunked(cubiertas):
+        supabase.from_('asistencia').update({
+            'pagado': True,
+            'id_pago': pago_id
+        }).in_('id', ids).execute()
+    return cubiertas
 
 def _adjust_nino_saldo(id_nino, delta):
-    child = supabase.table('ninos').select('saldo').eq('id', id_nino).execute()
-    if child.data:
-        old_saldo = float(child.data[0].get('saldo') or 0)
-        new_saldo = old_saldo + float(delta)
-        supabase.table('ninos').update({'saldo': new_saldo}).eq('id', id_nino).execute()
-        return new_saldo
-    return None
+    """Sumar delta al saldo legado del niño; devuelve el saldo nuevo (None si no existe)."""
+    return _adjust_ninos_saldo({id_nino: delta}).get(int(id_nino))
+
+def _rpc_registrar_pago(fecha, id_nino, partes):
+    """Insertar las partes, liquidar FIFO y ajustar saldo en una sola transacción
+    (migrations/001_registrar_pago.sql). Devuelve (pagos, liquidadas) para _journal_rpc_pagos,
+    o None si la función no está instalada."""
+    rows = _call_rpc('registrar_pago', {
+        'p_fecha': fecha,
+        'p_id_nino': int(id_nino),
+        'p_partes': [
+            {
+                'id_empleado': parte['id_empleado'],
+                'monto': float(parte['monto']),
+                'tipo': parte['tipo'],
+                'split_group_id': parte.get('split_group_id')
+            }
+            for parte in partes
+        ]
+    })
+    if rows is None:
+        return None
+    if rows and 'pago' in rows[0]:
+        # migrations/009: {pago, liquidadas} por parte, con las fechas en la última
+        liquidadas = [(int(id_nino), f) for row in rows for f in (row.get('liquidadas') or [])]
+        return [row['pago'] for row in rows], liquidadas
+    return rows, None
+
+def _journal_rpc_pagos(pagos, liquidadas):
+    """Registrar los pagos que insertó una función de Postgres y las asistencias que liquidó.
+
+    liquidadas: [(id_nino, fecha)] que devolvió la función (migrations/009), o None con las
+    versiones anteriores, que no las devuelven; entonces se buscan por id_pago.
+    """
+    _journal_rows('pagos', pagos, 'date', 'id_nino')
+    if liquidadas is None:
+        _journal_pago_asistencias([p['id'] for p in pagos if p.get('id') is not None])
+        return
+    for id_nino, fecha in liquidadas:
+        _journal('asistencia', fecha, id_nino)
+
+def _adjust_ninos_saldo(deltas):
+    """Aplicar {id_nino: delta} al saldo legado. Devuelve {id_nino: saldo nuevo}.
+
+    Con migrations/007_ajustar_saldos.sql es un solo update atómico para todos los niños.
+    Sin la función se leen los saldos (una consulta por bloque de ids) y se hace un update por
+    niño: PostgREST no actualiza filas distintas con valores distintos en una llamada, y un
+    upsert de {id, saldo} volvería a insertar un niño borrado entre la lectura y la escritura.
+    """
+    # Los ids pueden llegar como texto desde el JSON del request
+    sumados = {}
+    for nid, d in deltas.items():
+        if d:
+            sumados[int(nid)] = sumados.get(int(nid), 0) + float(d)
+    deltas = {nid: d for nid, d in sumados.items() if d}
+    if not deltas:
+        return {}
+
+    rows = _call_rpc('ajustar_saldos', {'p_deltas': {str(nid): d for nid, d in deltas.items()}})
+    if rows is not None:
+        return {row['id']: float(row['saldo'] or 0) for row in rows}
+
+    saldos = {}
+    for ids in _chunked(deltas.keys()):
+        response = supabase.table('ninos').select('id, saldo').in_('id', ids).execute()
+        for child in (response.data or []):
+            saldos[child['id']] = float(child.get('saldo') or 0)
+
+    nuevos = {}
+    for id_nino, old_saldo in saldos.items():
+        nuevos[id_nino] = old_saldo + deltas[id_nino]
+        supabase.table('ninos').update({'saldo': nuevos[id_nino]}).eq('id', id_nino).execute()
+    return nuevos
 
+@_journaled
 def add_pago(fecha, id_nino, id_empleado, monto, tipo):
     """Agregar un nuevo pago. Marca asistencias pendientes FIFO hasta cubrir el monto."""
     try:
+        registrado = _rpc_registrar_pago(fecha, id_nino, [
+            {'id_empleado': id_empleado, 'monto': monto, 'tipo': tipo}
+        ])
+        if registrado is not None:
+            pagos, liquidadas = registrado
+            _journal_rpc_pagos(pagos, liquidadas)
+            return pagos[0] if pagos else None
+
+        # Ruta en Python (la función registrar_pago no está instalada)
         pago = _insert_pago_record(fecha, id_nino, id_empleado, monto, tipo)
         if not pago:
             return None
@@ -1214,9 +1901,10 @@ def add_pago(fecha, id_nino, id_empleado, monto, tipo):
 
         return pago
     except Exception as e:
-        print(f"Error al agregar pago: {e}")
+        logger.error("Error al agregar pago: %s", e)
         return None
 
+@_journaled
 def add_pago_dividido(fecha, id_nino, partes):
     """Registrar dos pagos para un niño, liquidando asistencias con la suma total."""
     inserted = []
@@ -1225,19 +1913,36 @@ def add_pago_dividido(fecha, id_nino, partes):
             raise ValueError("El pago dividido requiere exactamente 2 partes")
 
         split_group_id = uuid.uuid4().hex
-        total = 0
-
+        columna = _has_split_column()
+        partes_formateadas = []
         for parte in partes:
             monto = float(parte['monto'])
             if monto <= 0:
                 raise ValueError("Cada parte del pago dividido debe ser mayor que cero")
+            partes_formateadas.append({
+                'id_empleado': int(parte['id_empleado']),
+                'monto': monto,
+                'tipo': parte['tipo'] if columna else _format_split_tipo(parte['tipo'], split_group_id),
+                'split_group_id': split_group_id if columna else None
+            })
+
+        registrado = _rpc_registrar_pago(fecha, id_nino, partes_formateadas)
+        if registrado is not None:
+            pagos, liquidadas = registrado
+            _journal_rpc_pagos(pagos, liquidadas)
+            return pagos
 
+        # Ruta en Python con rollback compensatorio (la función registrar_pago no está instalada)
+        total = 0
+        for parte in partes_formateadas:
+            monto = parte['monto']
             pago = _insert_pago_record(
                 fecha,
                 id_nino,
-                int(parte['id_empleado']),
+                parte['id_empleado'],
                 monto,
-                _format_split_tipo(parte['tipo'], split_group_id)
+                parte['tipo'],
+                parte['split_group_id']
             )
             if not pago:
                 raise RuntimeError("No se pudo insertar una parte del pago dividido")
@@ -1251,7 +1956,7 @@ def add_pago_dividido(fecha, id_nino, partes):
 
         return inserted
     except Exception as e:
-        print(f"Error al agregar pago dividido: {e}")
+        logger.error("Error al agregar pago dividido: %s", e)
         if inserted:
             try:
                 supabase.from_('asistencia').update({
@@ -1259,158 +1964,319 @@ def add_pago_dividido(fecha, id_nino, partes):
                     'id_pago': None
                 }).in_('id_pago', [p['id'] for p in inserted]).execute()
             except Exception as rollback_error:
-                print(f"Error al deshacer asistencias de pago dividido parcial: {rollback_error}")
+                logger.error("Error al deshacer asistencias de pago dividido parcial: %s", rollback_error)
         for pago in inserted:
             try:
                 supabase.table('pagos').delete().eq('id', pago['id']).execute()
             except Exception as rollback_error:
-                print(f"Error al deshacer pago dividido parcial: {rollback_error}")
+                logger.error("Error al deshacer pago dividido parcial: %s", rollback_error)
         return None
 
-def delete_pago(pago_id):
-    """Eliminar un pago y revertir las asistencias que cubrió (pagado=false)."""
+@_journaled
+def add_pagos_lote(pagos):
+    """Registrar pagos de varios niños.
+
+    Con migrations/002_registrar_pagos_lote.sql es una sola llamada. Sin la función, la ruta
+    en Python hace un insert para todo el lote, una lectura de las asistencias pendientes, una
+    actualización de asistencia por cada pago que liquida algo (cada una lleva su id_pago) y el
+    ajuste de saldos.
+
+    pagos: lista de dicts con fecha, id_nino, id_empleado, monto y tipo.
+    Devuelve, en el mismo orden, {'id_nino', 'success', 'pago', 'error'} por cada pago.
+    """
+    resultados = [
+        {'id_nino': p['id_nino'], 'success': False, 'pago': None, 'error': None}
+        for p in pagos
+    ]
+    if not pagos:
+        return resultados
+
     try:
-        print(f"\n=== Revirtiendo Pago {pago_id} ===")
-        pago_resp = supabase.table('pagos').select('*').eq('id', pago_id).execute()
-        if not (pago_resp.data and len(pago_resp.data) > 0):
-            return False
+        rows = _call_rpc('registrar_pagos_lote', {
+            'p_pagos': [
+                {
+                    'fecha': p['fecha'],
+                    'id_nino': int(p['id_nino']),
+                    'id_empleado': int(p['id_empleado']),
+                    'monto': float(p['monto']),
+                    'tipo': p['tipo']
+                }
+                for p in pagos
+            ]
+        })
+        if rows is not None:
+            for row in rows:
+                resultado = resultados[row['indice']]
+                resultado['success'] = bool(row.get('ok'))
+                resultado['pago'] = row.get('pago')
+                resultado['error'] = row.get('error')
+            # Con migrations/009 cada fila trae las fechas que liquidó
+            liquidadas = None
+            if all('liquidadas' in row for row in rows):
+                liquidadas = [(int(row['id_nino']), f) for row in rows for f in (row['liquidadas'] or [])]
+            _journal_rpc_pagos([r['pago'] for r in resultados if r['pago']], liquidadas)
+            return resultados
+
+        # Ruta en Python (la función registrar_pagos_lote no está instalada)
+        # Los ids llegan como texto desde los checkboxes del formulario
+        pagos = [dict(p, id_nino=int(p['id_nino']), id_empleado=int(p['id_empleado']),
+                      monto=float(p['monto'])) for p in pagos]
+
+        # 1. Un solo insert con todas las filas de pagos (PostgREST las devuelve en orden)
+        response = supabase.table('pagos').insert([
+            {
+                "date": p['fecha'],
+                "id_nino": p['id_nino'],
+                "id_empleado": p['id_empleado'],
+                "monto": p['monto'],
+                "tipo": p['tipo']
+            }
+            for p in pagos
+        ]).execute()
+        inserted = response.data or []
+        _journal_rows('pagos', inserted, 'date', 'id_nino')
+        try:
+            if len(inserted) != len(pagos):
+                raise RuntimeError("No se insertaron todos los pagos del lote")
+            _settle_pagos_lote(inserted)
+        except Exception:
+            # Sin transacción: deshacer para que reintentar no duplique los pagos
+            _undo_pagos(inserted)
+            raise
+
+        for pago, resultado in zip(inserted, resultados):
+            resultado['pago'] = pago
+            resultado['success'] = True
+        return resultados
+    except Exception as e:
+        logger.error("Error al registrar lote de pagos: %s", e)
+        for resultado in resultados:
+            if not resultado['success'] and not resultado['error']:
+                resultado['error'] = str(e)
+        return resultados
+
+def _settle_pagos_lote(inserted):
+    """Liquidar FIFO las asistencias de los pagos recién insertados y ajustar el saldo legado."""
+    # 2. Una sola lectura de las asistencias pendientes de todos los niños del lote
+    nino_ids = list({p['id_nino'] for p in inserted})
+    pendientes = {nid: [] for nid in nino_ids}
+    for ids in _chunked(nino_ids):
+        unpaid = supabase.from_('asistencia').select('id, valor, id_persona, fecha') \
+            .eq('tipo', 'nino').in_('id_persona', ids).eq('pagado', False) \
+            .order('fecha', desc=False).order('id', desc=False)
+        for a in fetch_all_paginated(unpaid):
+            pendientes[a['id_persona']].append(a)
 
-        pago = pago_resp.data[0]
+    # 3. FIFO en memoria para todos; las asistencias ya asignadas salen de la cola del niño
+    cubiertas_por_pago = {}
+    saldo_delta = {}
+    for pago in inserted:
         id_nino = pago['id_nino']
-        monto = float(pago['monto'])
-        split_group_id = _split_group_id(pago.get('tipo'))
-        if split_group_id:
-            pagos_resp = supabase.from_('pagos').select('*') \
-                .eq('id_nino', id_nino).eq('date', pago['date']).execute()
-            pagos_grupo = [
-                p for p in (pagos_resp.data or [])
-                if _split_group_id(p.get('tipo')) == split_group_id
-            ]
+        cubiertas = _allocate_asistencias(pendientes[id_nino], pago['monto'])
+        cubiertas_set = set(cubiertas)
+        for a in pendientes[id_nino]:
+            if a['id'] in cubiertas_set:
+                _journal('asistencia', a['fecha'], id_nino)
+        pendientes[id_nino] = [a for a in pendientes[id_nino] if a['id'] not in cubiertas_set]
+        cubiertas_por_pago[pago['id']] = cubiertas
+        saldo_delta[id_nino] = saldo_delta.get(id_nino, 0) - float(pago['monto'])
+
+    # 4. Marcar asistencias: una actualización por pago que liquidó algo. PostgREST no tiene un
+    # update con un valor distinto por fila, y un upsert de (id, pagado, id_pago) volvería a
+    # insertar, como pagada, una asistencia borrada entre la lectura y la escritura.
+    for pago_id, cubiertas in cubiertas_por_pago.items():
+        for ids in _chunked(cubiertas):
+            supabase.from_('asistencia').update({
+                'pagado': True,
+                'id_pago': pago_id
+            }).in_('id', ids).execute()
 
-            if not pagos_grupo:
-                pagos_grupo = [pago]
+    # 5. (Legado) Mantener ninos.saldo sincronizado con el delta agregado por niño
+    _adjust_ninos_saldo(saldo_delta)
 
-            pago_ids = [p['id'] for p in pagos_grupo]
-            monto_total = sum(float(p.get('monto') or 0) for p in pagos_grupo)
+def _undo_pagos(pagos):
+    """Deshacer pagos insertados por una escritura que falló a medias: liberar las asistencias
+    que alcanzaron a liquidar y borrar los pagos."""
+    pago_ids = [p['id'] for p in pagos]
+    for ids in _chunked(pago_ids):
+        try:
+            supabase.from_('asistencia').update({
+                'pagado': False,
+                'id_pago': None
+            }).in_('id_pago', ids).execute()
+            supabase.table('pagos').delete().in_('id', ids).execute()
+        except Exception as e:
+            logger.error("Error al deshacer pagos %s: %s", ids, e)
+
+def _pagos_con_grupo(pagos):
+    """Agregar a los pagos los demás pagos de sus grupos divididos."""
+    grupos = {_split_group_id(p) for p in pagos} - {None}
+    if not grupos:
+        return pagos
+
+    por_id = {p['id']: p for p in pagos}
+    if _has_split_column():
+        for ids in _chunked(grupos):
+            response = supabase.from_('pagos').select('*').in_('split_group_id', ids).execute()
+            for p in (response.data or []):
+                por_id.setdefault(p['id'], p)
+        return list(por_id.values())
+
+    # Sin la columna, el grupo está en tipo: traer los pagos del niño en esa fecha y parsear
+    divididos = [p for p in pagos if _split_group_id(p)]
+    ninos = list({p['id_nino'] for p in divididos})
+    fechas = list({p['date'] for p in divididos})
+    claves = {(p['id_nino'], p['date'], _split_group_id(p)) for p in divididos}
+    for ids in _chunked(ninos):
+        response = supabase.from_('pagos').select('*').in_('id_nino', ids).in_('date', fechas).execute()
+        for p in (response.data or []):
+            if (p['id_nino'], p['date'], _split_group_id(p)) in claves:
+                por_id.setdefault(p['id'], p)
+    return list(por_id.values())
+
+def _unidades_de_reversion(pagos, orden):
+    """Agrupar los pagos en unidades que se revierten juntas: un grupo dividido o un pago
+    suelto. Las unidades siguen el orden en que se pidió su primer pago."""
+    unidades = {}
+    for p in sorted(pagos, key=lambda p: orden.get(p['id'], len(orden))):
+        grupo = _split_group_id(p)
+        clave = (p['id_nino'], p['date'], grupo) if grupo else p['id']
+        unidades.setdefault(clave, []).append(p)
+    return list(unidades.values())
+
+def _unwind_legacy(unidades):
+    """Ids de asistencias pagadas sin id_pago que revierten las unidades legacy (sin
+    asistencias enlazadas): las más recientes de cada niño hasta cubrir el monto, como si las
+    unidades se revirtieran una tras otra. Una sola lectura para todos los niños."""
+    ninos = list({u[0]['id_nino'] for u in unidades})
+    pagadas = {nid: [] for nid in ninos}
+    for ids in _chunked(ninos):
+        paid = supabase.from_('asistencia').select('id, valor, fecha, id_persona', count='exact') \
+            .eq('tipo', 'nino').in_('id_persona', ids).eq('pagado', True) \
+            .is_('id_pago', 'null') \
+            .order('fecha', desc=True).order('id', desc=True)
+        for a in fetch_all_paginated(paid):
+            pagadas[a['id_persona']].append(a)
+
+    revertidas = []
+    for unidad in unidades:
+        id_nino = unidad[0]['id_nino']
+        monto = sum(float(p.get('monto') or 0) for p in unidad)
+        cubiertas = set(_allocate_asistencias(pagadas[id_nino], monto))
+        for a in pagadas[id_nino]:
+            if a['id'] in cubiertas:
+                _journal('asistencia', a['fecha'], id_nino)
+                revertidas.append(a['id'])
+        pagadas[id_nino] = [a for a in pagadas[id_nino] if a['id'] not in cubiertas]
+    return revertidas
+
+@_journaled
+def delete_pagos(pago_ids):
+    """Eliminar varios pagos (con los demás pagos de sus grupos divididos) y revertir las
+    asistencias que cubrieron, en un número constante de consultas.
+
+    Las asistencias enlazadas (id_pago) vuelven a pagado=false con una sola actualización;
+    para los pagos legacy sin enlaces se calcula en memoria qué asistencias desmarcar (ver
+    _unwind_legacy) y se aplican en otra. Devuelve los ids de los pagos eliminados.
+    """
+    orden = {}
+    for pid in pago_ids:
+        orden.setdefault(int(pid), len(orden))
+    if not orden:
+        return []
 
-            linked = supabase.from_('asistencia').select('id').in_('id_pago', pago_ids).execute()
-            linked_ids = [a['id'] for a in (linked.data or [])]
+    try:
+        logger.debug("Revirtiendo pagos %s", list(orden))
+        pagos = []
+        for ids in _chunked(orden):
+            pagos.extend(supabase.table('pagos').select('*').in_('id', ids).execute().data or [])
+        if not pagos:
+            return []
 
-            if linked_ids:
-                supabase.from_('asistencia').update({
-                    'pagado': False,
-                    'id_pago': None
-                }).in_('id_pago', pago_ids).execute()
-            else:
-                paid = supabase.from_('asistencia').select('id, valor, fecha') \
-                    .eq('tipo', 'nino').eq('id_persona', id_nino).eq('pagado', True) \
-                    .is_('id_pago', 'null') \
-                    .order('fecha', desc=True).order('id', desc=True).execute()
-
-                monto_restante = monto_total
-                EPSILON = 0.001
-                for a in (paid.data or []):
-                    valor = float(a.get('valor') or 0)
-                    if valor <= 0:
-                        continue
-                    if monto_restante + EPSILON >= valor:
-                        supabase.from_('asistencia').update({'pagado': False}) \
-                            .eq('id', a['id']).execute()
-                        monto_restante -= valor
-                    if monto_restante <= EPSILON:
-                        break
-
-            supabase.table('pagos').delete().in_('id', pago_ids).execute()
-            new_saldo = _adjust_nino_saldo(id_nino, monto_total)
-            if new_saldo is not None:
-                print(f"Pago dividido revertido. Nuevo saldo del niño {id_nino}: {new_saldo}")
-            return True
-
-        # 1a. Asistencias linkeadas a este pago (caso normal del código nuevo)
-        linked = supabase.from_('asistencia').select('id').eq('id_pago', pago_id).execute()
-        linked_ids = [a['id'] for a in (linked.data or [])]
-
-        if linked_ids:
+        pagos = _pagos_con_grupo(pagos)
+        todos = [p['id'] for p in pagos]
+        _journal_rows('pagos', pagos, 'date', 'id_nino')
+
+        # 1. Asistencias enlazadas a cualquiera de los pagos
+        linked = []
+        for ids in _chunked(todos):
+            linked.extend(supabase.from_('asistencia').select('id, fecha, id_persona, id_pago')
+                          .in_('id_pago', ids).execute().data or [])
+        _journal_rows('asistencia', linked, 'fecha', 'id_persona')
+        enlazados = {a['id_pago'] for a in linked}
+
+        # Una unidad con alguna asistencia enlazada se revierte por id_pago; sin enlaces, es legacy
+        unidades = _unidades_de_reversion(pagos, orden)
+        con_enlace = [p['id'] for u in unidades if any(p['id'] in enlazados for p in u) for p in u]
+        legacy = [u for u in unidades if not any(p['id'] in enlazados for p in u)]
+
+        for ids in _chunked(con_enlace):
             supabase.from_('asistencia').update({
                 'pagado': False,
                 'id_pago': None
-            }).eq('id_pago', pago_id).execute()
-        else:
-            # 1b. Fallback para pagos legacy: marcar como pagado=false las asistencias
-            #     más recientes del niño (pagado=true, sin id_pago) hasta cubrir el monto.
-            paid = supabase.from_('asistencia').select('id, valor, fecha') \
-                .eq('tipo', 'nino').eq('id_persona', id_nino).eq('pagado', True) \
-                .is_('id_pago', 'null') \
-                .order('fecha', desc=True).order('id', desc=True).execute()
-
-            monto_restante = monto
-            EPSILON = 0.001
-            for a in (paid.data or []):
-                valor = float(a.get('valor') or 0)
-                if valor <= 0:
-                    continue
-                if monto_restante + EPSILON >= valor:
-                    supabase.from_('asistencia').update({'pagado': False}) \
-                        .eq('id', a['id']).execute()
-                    monto_restante -= valor
-                if monto_restante <= EPSILON:
-                    break
-
-        # 2. Eliminar el pago
-        supabase.table('pagos').delete().eq('id', pago_id).execute()
+            }).in_('id_pago', ids).execute()
+
+        if legacy:
+            for ids in _chunked(_unwind_legacy(legacy)):
+                supabase.from_('asistencia').update({'pagado': False}).in_('id', ids).execute()
+
+        # 2. Eliminar los pagos
+        for ids in _chunked(todos):
+            supabase.table('pagos').delete().in_('id', ids).execute()
 
         # 3. (Legado) Mantener ninos.saldo sincronizado
-        child = supabase.table('ninos').select('saldo').eq('id', id_nino).execute()
-        if child.data:
-            current_saldo = float(child.data[0].get('saldo') or 0)
-            new_saldo = current_saldo + monto
-            supabase.table('ninos').update({'saldo': new_saldo}).eq('id', id_nino).execute()
-            print(f"Pago revertido. Nuevo saldo del niño {id_nino}: {new_saldo}")
+        saldo_delta = {}
+        for p in pagos:
+            saldo_delta[p['id_nino']] = saldo_delta.get(p['id_nino'], 0) + float(p.get('monto') or 0)
+        nuevos = _adjust_ninos_saldo(saldo_delta)
+        logger.debug("Pagos revertidos. Nuevos saldos: %s", nuevos)
 
-        return True
+        return todos
     except Exception as e:
-        print(f"Error al revertir pago: {e}")
-        return False
+        logger.error("Error al revertir pagos: %s", e)
+        return []
+
+def delete_pago(pago_id):
+    """Eliminar un pago (y los demás de su grupo dividido) y revertir las asistencias que cubrió."""
+    return bool(delete_pagos([pago_id]))
 
 def get_recent_pagos(limit=10):
     """Obtener los pagos más recientes."""
     try:
-        print("\n--- DEBUG: Iniciando get_recent_pagos ---")
-        query = '*, ninos(nombre), employees(nombre)'
-        print(f"Ejecutando consulta: .from_('pagos').select('{query}')")
+        logger.debug("Iniciando get_recent_pagos")
+        query = '*'
+        logger.debug("Ejecutando consulta: .from_('pagos').select('%s')", query)
         
         response = supabase.from_('pagos').select(query).order('date', desc=True).order('id', desc=True).limit(limit).execute()
         
-        print(f"Respuesta cruda de Supabase: {response}")
+        log_payload(logger, "Respuesta cruda de Supabase: %s", response)
         
         if hasattr(response, 'data'):
-            print(f"Datos recibidos: {response.data}")
+            log_payload(logger, "Datos recibidos: %s", response.data)
             if not response.data:
-                print("La consulta no devolvió datos.")
+                logger.debug("La consulta no devolvió datos.")
                 return []
 
+            # Nombres de niños y empleadas desde el roster en caché
+            ninos_roster = _roster_records('ninos', list({item.get('id_nino') for item in response.data}))
+            employees_roster = _roster_records('employees', list({item.get('id_empleado') for item in response.data}))
+
             pagos = []
-            print("Procesando registros...")
+            logger.debug("Procesando registros...")
             for i, item in enumerate(response.data):
-                print(f"  Item {i}: {item}")
+                log_payload(logger, "Item %s: %s", i, item)
                 
                 nombre_nino = 'No encontrado'
-                if item.get('ninos'):
-                    if isinstance(item['ninos'], dict):
-                        nombre_nino = item['ninos'].get('nombre', 'Nombre Ausente')
-                    else:
-                        print(f"  Advertencia: 'ninos' no es un diccionario: {item['ninos']}")
+                if item.get('id_nino') in ninos_roster:
+                    nombre_nino = ninos_roster[item['id_nino']].get('nombre', 'Nombre Ausente')
                 else:
-                    print("  Advertencia: No se encontró la clave 'ninos' en el item.")
+                    logger.warning("No se encontró el niño %s en el roster.", item.get('id_nino'))
 
                 nombre_empleada = 'No encontrada'
-                if item.get('employees'):
-                    if isinstance(item['employees'], dict):
-                        nombre_empleada = item['employees'].get('nombre', 'Nombre Ausente')
-                    else:
-                        print(f"  Advertencia: 'employees' no es un diccionario: {item['employees']}")
+                if item.get('id_empleado') in employees_roster:
+                    nombre_empleada = employees_roster[item['id_empleado']].get('nombre', 'Nombre Ausente')
                 else:
-                    print("  Advertencia: No se encontró la clave 'employees' en el item.")
+                    logger.warning("No se encontró la empleada %s en el roster.", item.get('id_empleado'))
 
                 pago_procesado = {
                     'id': item.get('id', 'N/A'),
@@ -1420,82 +2286,142 @@ def get_recent_pagos(limit=10):
                     'nombre_nino': nombre_nino,
                     'nombre_empleada': nombre_empleada
                 }
-                print(f"  Pago procesado {i}: {pago_procesado}")
+                log_payload(logger, "Pago procesado %s: %s", i, pago_procesado)
                 pagos.append(pago_procesado)
             
-            print(f"--- DEBUG: Finalizando get_recent_pagos. Total de pagos procesados: {len(pagos)} ---")
+            logger.debug("Finalizando get_recent_pagos. Total de pagos procesados: %s", len(pagos))
             return pagos
         else:
-            print("El objeto de respuesta de Supabase no tiene el atributo 'data'.")
+            logger.debug("El objeto de respuesta de Supabase no tiene el atributo 'data'.")
             return []
     except Exception as e:
-        print(f"ERROR CATASTRÓFICO en get_recent_pagos: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("ERROR CATASTRÓFICO en get_recent_pagos: %s", e)
         return []
 
 
+def _get_debt_ledger(monday_iso):
+    """Leer la deuda por niño del libro deuda_semanal (migrations/003_deuda_semanal.sql).
+    Devuelve None si la migración no está aplicada."""
+    rows = _call_rpc('deuda_pendiente', {'p_lunes': monday_iso})
+    if rows is None:
+        return None
+    return _debts_from_ledger(rows)
+
+def _debts_from_ledger(rows):
+    return {
+        r['id_nino']: {
+            'anterior': float(r.get('anterior') or 0),
+            'actual': float(r.get('actual') or 0)
+        }
+        for r in rows
+    }
+
+def _scan_pending_debts(monday_iso):
+    """Ruta sin libro: recorrer todas las asistencias no pagadas de niños."""
+    return _debts_from_asistencia(scan_asistencia(tipo='nino', pagado=False), monday_iso)
+
+def _debts_from_asistencia(rows, monday_iso):
+    """Sumar la deuda por niño separando lo anterior al lunes de la semana en curso.
+
+    rows: tuplas (id_persona, fecha, valor), p. ej. de scan_asistencia.
+    """
+    deudas = {}
+    for nid, fecha, valor in rows:
+        if nid not in deudas:
+            deudas[nid] = {'anterior': 0.0, 'actual': 0.0}
+        if (fecha or '') < monday_iso:
+            deudas[nid]['anterior'] += valor
+        else:
+            deudas[nid]['actual'] += valor
+    return deudas
+
+def reconcile_debt_ledger():
+    """Reconstruir desde cero el libro deuda_semanal. Devuelve las filas escritas,
+    o None si la migración no está aplicada."""
+    result = _call_rpc('reconciliar_deuda_semanal', {})
+    if result is None:
+        return None
+    return result if isinstance(result, int) else len(result or [])
+
+def _current_monday_iso():
+    """Lunes de la semana en curso (zona horaria del negocio)."""
+    today = get_current_time().date()
+    return (today - timedelta(days=today.weekday())).isoformat()
+
+def _debtor_ids(deudas):
+    return [nid for nid, d in (deudas or {}).items() if (d['anterior'] + d['actual']) > 0]
+
+def _build_pending_payments(deudas, ninos):
+    """Armar el resultado de pagos pendientes (solo niños activos con deuda)."""
+    nombres = {
+        nid: n['nombre'] for nid, n in ninos.items()
+        if int(n.get('status') or 0) == 1
+    }
+
+    pending = []
+    for nid, d in deudas.items():
+        total = d['anterior'] + d['actual']
+        if nid in nombres and total > 0:
+            pending.append({
+                'id_nino': nid,
+                'nombre': nombres[nid],
+                'saldo_pendiente': round(total, 2),
+                'deuda_anterior': round(d['anterior'], 2),
+                'deuda_actual': round(d['actual'], 2),
+                'solo_actual': d['anterior'] == 0
+            })
+
+    # Ordenar primero por deuda anterior (los morosos arriba), luego por total
+    pending.sort(key=lambda x: (x['deuda_anterior'], x['saldo_pendiente']), reverse=True)
+    return pending
+
 def get_pending_payments():
     """Saldo pendiente por niño = SUMA de asistencia.valor donde pagado=false.
     Cada item incluye 'solo_actual' = True si toda su deuda es de la semana en curso."""
     try:
-        # Lunes de la semana en curso (zona horaria del negocio)
-        today = get_current_time().date()
-        monday_current = today - timedelta(days=today.weekday())
-        monday_iso = monday_current.isoformat()
-
-        # 1. Asistencias no pagadas de niños (incluyendo fecha)
-        query = supabase.from_('asistencia').select('id_persona, valor, fecha') \
-            .eq('tipo', 'nino').eq('pagado', False)
-        asistencia_data = fetch_all_paginated(query)
+        monday_iso = _current_monday_iso()
 
-        if not asistencia_data:
-            return []
+        # 1-2. Deuda por niño separando deuda anterior vs. semana actual
+        deudas = _get_debt_ledger(monday_iso)
+        if deudas is None:
+            deudas = _scan_pending_debts(monday_iso)
 
-        # 2. Sumar por niño separando deuda anterior vs. semana actual
-        deudas = {}
-        for r in asistencia_data:
-            nid = r['id_persona']
-            valor = float(r.get('valor') or 0)
-            fecha = r.get('fecha') or ''
-            if nid not in deudas:
-                deudas[nid] = {'anterior': 0.0, 'actual': 0.0}
-            if fecha < monday_iso:
-                deudas[nid]['anterior'] += valor
-            else:
-                deudas[nid]['actual'] += valor
-
-        nino_ids = [nid for nid, d in deudas.items() if (d['anterior'] + d['actual']) > 0]
+        nino_ids = _debtor_ids(deudas)
         if not nino_ids:
             return []
 
-        # 3. Nombres de niños activos
-        ninos_resp = supabase.from_('ninos').select('id, nombre') \
-            .in_('id', nino_ids).eq('status', 1).execute()
-        nombres = {n['id']: n['nombre'] for n in (ninos_resp.data or [])}
-
-        # 4. Armar resultado (solo niños activos con deuda)
-        pending = []
-        for nid, d in deudas.items():
-            total = d['anterior'] + d['actual']
-            if nid in nombres and total > 0:
-                pending.append({
-                    'id_nino': nid,
-                    'nombre': nombres[nid],
-                    'saldo_pendiente': round(total, 2),
-                    'deuda_anterior': round(d['anterior'], 2),
-                    'deuda_actual': round(d['actual'], 2),
-                    'solo_actual': d['anterior'] == 0
-                })
-
-        # Ordenar primero por deuda anterior (los morosos arriba), luego por total
-        pending.sort(key=lambda x: (x['deuda_anterior'], x['saldo_pendiente']), reverse=True)
-        return pending
+        # 3. Niños con deuda desde el roster en caché
+        return _build_pending_payments(deudas, _roster_records('ninos', nino_ids))
 
     except Exception as e:
-        print(f"Error al obtener pagos pendientes: {e}")
+        logger.error("Error al obtener pagos pendientes: %s", e)
         return []
 
+def _get_debt_index_totals(target_date_str, nino_ids):
+    """Totales acumulados por niño a una fecha desde el índice deuda_acumulada
+    (migrations/004_deuda_acumulada.sql): una búsqueda por niño en lugar de sumar el historial.
+    Devuelve None si la migración no está aplicada."""
+    rows = _call_rpc('deuda_a_fecha', {'p_fecha': target_date_str, 'p_ids': nino_ids})
+    if rows is None:
+        return None
+    total_asistencia = {r['id_nino']: float(r.get('asistencia') or 0) for r in rows}
+    total_pagos = {r['id_nino']: float(r.get('pagos') or 0) for r in rows}
+    return total_asistencia, total_pagos
+
+def _scan_debt_totals(target_date_str, nino_ids):
+    """Ruta sin índice: sumar toda la asistencia y todos los pagos hasta la fecha."""
+    total_asistencia = sum_by_person(scan_asistencia(tipo='nino', hasta=target_date_str, ids=nino_ids))
+    total_pagos = sum_by_person(scan_pagos(hasta=target_date_str, ids=nino_ids))
+    return total_asistencia, total_pagos
+
+def reconcile_debt_snapshot_index():
+    """Reconstruir desde cero el índice deuda_acumulada. Devuelve las filas escritas,
+    o None si la migración no está aplicada."""
+    result = _call_rpc('reconstruir_deuda_acumulada', {})
+    if result is None:
+        return None
+    return result if isinstance(result, int) else len(result or [])
+
 def calculate_debt_snapshot(target_date):
     """Calcula la deuda de cada niño HASTA una fecha específica."""
     try:
@@ -1506,37 +2432,18 @@ def calculate_debt_snapshot(target_date):
         else:
             target_date_str = target_date
 
-        # 1. Obtener niños activos
-        ninos_response = supabase.from_('ninos').select('id, nombre, status').eq('status', 1).execute()
-        if not (hasattr(ninos_response, 'data') and ninos_response.data):
+        # 1. Obtener niños activos (roster en caché)
+        ninos = _roster_active('ninos')
+        if not ninos:
             return []
         
-        ninos = ninos_response.data
         nino_ids = [nino['id'] for nino in ninos]
 
-        # 2. Total asistencia HASTA la fecha (inclusive)
-        query = supabase.from_('asistencia').select('id_persona, valor')\
-            .eq('tipo', 'nino')\
-            .in_('id_persona', nino_ids)\
-            .lte('fecha', target_date_str)
-        asistencia_data = fetch_all_paginated(query)
-        
-        total_asistencia = {}
-        for record in asistencia_data:
-                nino_id = record['id_persona']
-                total_asistencia[nino_id] = total_asistencia.get(nino_id, 0) + float(record['valor'])
-
-        # 3. Total pagos HASTA la fecha (inclusive)
-        pagos_response = supabase.from_('pagos').select('id_nino, monto')\
-            .in_('id_nino', nino_ids)\
-            .lte('date', target_date_str)\
-            .execute()
-        
-        total_pagos = {}
-        if hasattr(pagos_response, 'data'):
-            for record in pagos_response.data:
-                nino_id = record['id_nino']
-                total_pagos[nino_id] = total_pagos.get(nino_id, 0) + float(record['monto'])
+        # 2-3. Totales de asistencia y pagos HASTA la fecha (inclusive)
+        totales = _get_debt_index_totals(target_date_str, nino_ids)
+        if totales is None:
+            totales = _scan_debt_totals(target_date_str, nino_ids)
+        total_asistencia, total_pagos = totales
 
         # 4. Calcular saldos
         snapshot_debts = {}
@@ -1552,7 +2459,7 @@ def calculate_debt_snapshot(target_date):
         return snapshot_debts
 
     except Exception as e:
-        print(f"Error al calcular snapshot de deuda: {e}")
+        logger.error("Error al calcular snapshot de deuda: %s", e)
         return {}
 
 def get_ninos_con_deuda():
@@ -1562,39 +2469,47 @@ def get_ninos_con_deuda():
         ninos_con_deuda = [p for p in pending_payments if p['saldo_pendiente'] > 0]
         return ninos_con_deuda
     except Exception as e:
-        print(f"Error al obtener niños con deuda: {e}")
+        logger.error("Error al obtener niños con deuda: %s", e)
         return []
 
-def get_week_gastos(start_date, end_date):
+def _convert_gastos(rows):
+    """Normalizar filas de gastos y devolver (gastos, total)."""
+    gastos_converted = []
+    total_gastos = 0
+    
+    for gasto in rows:
+        monto = float(gasto.get('monto', 0))
+        total_gastos += monto
+        
+        converted = {
+            'id': gasto.get('id'),
+            'fecha': gasto.get('fecha'),
+            'motivo': gasto.get('motivo', ''),
+            'monto': monto
+        }
+        gastos_converted.append(converted)
+    return gastos_converted, total_gastos
+
+def get_week_gastos(start_date, end_date, aggregate=None):
     """Obtener todos los gastos de la semana"""
     try:
-        print(f"\n=== Obteniendo gastos de la semana: {start_date} a {end_date} ===")
+        if aggregate is not None and aggregate.get('incluye_gastos'):
+            return aggregate['gastos'], aggregate['total_gastos']
+
+        logger.debug("Obteniendo gastos de la semana: %s a %s", start_date, end_date)
         response = supabase.from_('gastos').select('*').gte('fecha', start_date.isoformat()).lte('fecha', end_date.isoformat()).order('fecha', desc=True).execute()
         
         if hasattr(response, 'data'):
-            gastos_converted = []
-            total_gastos = 0
-            
-            for gasto in response.data:
-                monto = float(gasto.get('monto', 0))
-                total_gastos += monto
-                
-                converted = {
-                    'id': gasto.get('id'),
-                    'fecha': gasto.get('fecha'),
-                    'motivo': gasto.get('motivo', ''),
-                    'monto': monto
-                }
-                gastos_converted.append(converted)
-            
-            print(f"Total gastos de la semana: ${total_gastos}")
+            gastos_converted, total_gastos = _convert_gastos(response.data)
+            logger.debug("Total gastos de la semana: $%s", total_gastos)
             return gastos_converted, total_gastos
             
         return [], 0
     except Exception as e:
-        print(f"Error al obtener gastos de la semana: {e}")
+        logger.error("Error al obtener gastos de la semana: %s", e)
         return [], 0
 
+@_journaled
 def add_gasto(fecha, motivo, monto):
     """Agregar un nuevo gasto a la base de datos."""
     try:
@@ -1604,99 +2519,112 @@ def add_gasto(fecha, motivo, monto):
             "monto": float(monto)
         }
         response = supabase.table('gastos').insert(data).execute()
+        _journal('gastos', fecha)
         return response.data[0] if response.data else None
     except Exception as e:
-        print(f"Error al agregar gasto: {e}")
+        logger.error("Error al agregar gasto: %s", e)
         return None
 
+@_journaled
 def update_gasto(id, fecha, motivo, monto):
     """Actualizar un gasto existente"""
     try:
-        print(f"\n=== Actualizando gasto {id} ===")
+        logger.debug("Actualizando gasto %s", id)
         data = {
             "fecha": fecha,
             "motivo": motivo,
             "monto": float(monto)
         }
+        # La fecha anterior también es una semana afectada
+        old_response = supabase.from_('gastos').select('fecha').eq('id', id).execute()
         response = supabase.from_('gastos').update(data).eq('id', id).execute()
+        for old_record in old_response.data or []:
+            _journal('gastos', old_record.get('fecha'))
+        _journal('gastos', fecha)
         return response.data[0] if response.data else None
     except Exception as e:
-        print(f"Error al actualizar gasto: {e}")
+        logger.error("Error al actualizar gasto: %s", e)
         return None
 
+@_journaled
 def delete_gasto(id):
     """Eliminar un gasto"""
     try:
-        print(f"\n=== Eliminando gasto {id} ===")
+        logger.debug("Eliminando gasto %s", id)
         response = supabase.from_('gastos').delete().eq('id', id).execute()
+        for row in response.data or []:
+            _journal('gastos', row.get('fecha'))
         return True
     except Exception as e:
-        print(f"Error al eliminar gasto: {e}")
+        logger.error("Error al eliminar gasto: %s", e)
         return False
 
+def _group_pagos(rows, nino_names, empleada_names, limit):
+    """Agrupar pagos por fecha, empleada y tipo."""
+    grouped = {}
+    for item in rows:
+        fecha = item.get('date')
+        empleada_id = item.get('id_empleado')
+        tipo = _display_tipo(item.get('tipo', 'Efectivo'))
+        nino_nombre = nino_names.get(item.get('id_nino')) or 'Desconocido'
+        pago_id = item.get('id')
+        
+        empleada_nombre = 'Caja/Casa' if empleada_id == 9 else (empleada_names.get(empleada_id) or 'Desconocida')
+        
+        # Key única por fecha, empleada y tipo de pago
+        key = (fecha, empleada_id, tipo)
+        
+        if key not in grouped:
+            grouped[key] = {
+                'fecha': fecha,
+                'id_empleada': empleada_id,
+                'nombre_empleada': empleada_nombre,
+                'tipo': tipo,
+                'total': 0,
+                'cantidad_pagos': 0,
+                'ninos_nombres_list': [],
+                'pago_ids': []
+            }
+        
+        grouped[key]['total'] += float(item.get('monto', 0))
+        grouped[key]['cantidad_pagos'] += 1
+        grouped[key]['pago_ids'].append(pago_id)
+        if nino_nombre not in grouped[key]['ninos_nombres_list']:
+            grouped[key]['ninos_nombres_list'].append(nino_nombre)
+
+    # Convertir a lista y formatear strings
+    result_list = []
+    for key, val in grouped.items():
+        val['ninos_resumen'] = ", ".join(val['ninos_nombres_list'])
+        result_list.append(val)
+
+    # Ordenar por fecha descendente
+    result_list.sort(key=lambda x: x['fecha'], reverse=True)
+    return result_list[:limit]
+
 def get_grouped_pagos(limit=20):
     """Obtener el historial de pagos agrupado por fecha y empleada."""
     try:
         # Primero obtenemos los pagos recientes
         # Podemos agrupar en Python para más flexibilidad
-        query = '*, ninos(nombre), employees(nombre)'
-        response = supabase.from_('pagos').select(query).order('date', desc=True).limit(200).execute()
+        response = supabase.from_('pagos').select('*').order('date', desc=True).limit(200).execute()
         
         if not (hasattr(response, 'data') and response.data):
             return []
 
-        grouped = {}
-        for item in response.data:
-            fecha = item.get('date')
-            empleada_dict = item.get('employees')
-            empleada_id = item.get('id_empleado')
-            tipo = _display_tipo(item.get('tipo', 'Efectivo'))
-            nino_dict = item.get('ninos')
-            nino_nombre = nino_dict.get('nombre', 'Desconocido') if nino_dict else 'Desconocido'
-            pago_id = item.get('id')
-            
-            empleada_nombre = 'Caja/Casa' if empleada_id == 9 else (empleada_dict.get('nombre', 'Desconocida') if empleada_dict else 'Desconocida')
-            
-            # Key única por fecha, empleada y tipo de pago
-            key = (fecha, empleada_id, tipo)
-            
-            if key not in grouped:
-                grouped[key] = {
-                    'fecha': fecha,
-                    'id_empleada': empleada_id,
-                    'nombre_empleada': empleada_nombre,
-                    'tipo': tipo,
-                    'total': 0,
-                    'cantidad_pagos': 0,
-                    'ninos_nombres_list': [],
-                    'pago_ids': []
-                }
-            
-            grouped[key]['total'] += float(item.get('monto', 0))
-            grouped[key]['cantidad_pagos'] += 1
-            grouped[key]['pago_ids'].append(pago_id)
-            if nino_nombre not in grouped[key]['ninos_nombres_list']:
-                grouped[key]['ninos_nombres_list'].append(nino_nombre)
-
-        # Convertir a lista y formatear strings
-        result_list = []
-        for key, val in grouped.items():
-            val['ninos_resumen'] = ", ".join(val['ninos_nombres_list'])
-            result_list.append(val)
-
-        # Ordenar por fecha descendente
-        result_list.sort(key=lambda x: x['fecha'], reverse=True)
-        return result_list[:limit]
+        # Nombres desde el roster en caché en lugar de embeber ninos/employees en la consulta
+        nino_names = _roster_names('ninos', list({item.get('id_nino') for item in response.data}))
+        empleada_names = _roster_names('employees', list({item.get('id_empleado') for item in response.data}))
+        return _group_pagos(response.data, nino_names, empleada_names, limit)
 
     except Exception as e:
-        print(f"Error en get_grouped_pagos: {e}")
+        logger.error("Error en get_grouped_pagos: %s", e)
         return []
 
 def get_pagos_group_details(fecha, id_empleada):
     """Obtener los detalles de un grupo de pagos (mismos niños, montos, etc)."""
     try:
-        query = '*, ninos(nombre)'
-        q = supabase.from_('pagos').select(query).eq('date', fecha)
+        q = supabase.from_('pagos').select('*').eq('date', fecha)
         
         if id_empleada is None or id_empleada == 'None':
              q = q.is_('id_empleado', 'null')
@@ -1706,17 +2634,17 @@ def get_pagos_group_details(fecha, id_empleada):
         response = q.execute()
         
         if hasattr(response, 'data'):
+            nino_names = _roster_names('ninos', list({item.get('id_nino') for item in response.data}))
             details = []
             for item in response.data:
-                nino_dict = item.get('ninos')
                 details.append({
                     'id': item.get('id'),
-                    'nombre_nino': nino_dict.get('nombre', 'Desconocido') if nino_dict else 'Desconocido',
+                    'nombre_nino': nino_names.get(item.get('id_nino')) or 'Desconocido',
                     'monto': float(item.get('monto', 0)),
                     'tipo': _display_tipo(item.get('tipo', 'Efectivo'))
                 })
             return details
         return []
     except Exception as e:
-        print(f"Error al obtener detalles del grupo de pagos: {e}")
+        logger.error("Error al obtener detalles del grupo de pagos: %s", e)
         return []
@@ -0,0 +1,165 @@
+# http_pool.py - Pool de conexiones HTTP del cliente de Supabase
+#
+# supabase-py crea la sesión httpx de PostgREST con los valores por defecto de httpx: las
+# conexiones ociosas se cierran a los 5 s, así que tras una pausa cada request vuelve a pagar
+# DNS + TCP + TLS, y un corte de red se convierte directamente en un error de la página.
+# database.py reemplaza esa sesión por una configurada aquí: keep-alive largo, HTTP/2 si está
+# instalado h2, pool acotado, timeouts de conexión y lectura separados y reintentos con
+# backoff para lecturas.
+#
+# Solo se reintentan los errores en los que repetir no puede duplicar una escritura: fallas
+# al conectar (el request no llegó a enviarse) en cualquier método, y conexiones cortadas o
+# respuestas 502/503/504 en GET/HEAD. Las RPC van por POST y no se reintentan.
+#
+# Variables de entorno:
+#   SUPABASE_HTTP2             0 para usar HTTP/1.1. Activo por defecto si h2 está instalado.
+#   SUPABASE_POOL_MAX          máximo de conexiones abiertas. Por defecto 20.
+#   SUPABASE_POOL_KEEPALIVE    máximo de conexiones ociosas que se conservan. Por defecto 10.
+#   SUPABASE_KEEPALIVE_S       segundos que se conserva una conexión ociosa. Por defecto 120.
+#   SUPABASE_CONNECT_TIMEOUT   segundos para abrir una conexión. Por defecto 5.
+#   SUPABASE_READ_TIMEOUT      segundos de espera por la respuesta. Por defecto QUERY_TIMEOUT (20).
+#   SUPABASE_READ_RETRIES      reintentos de una lectura fallida. Por defecto 2.
+#   SUPABASE_RETRY_BACKOFF_MS  espera antes del primer reintento; se duplica en cada uno. Por defecto 100.
+
+import importlib.util
+import os
+import random
+import threading
+import time
+import weakref
+
+import httpx
+
+from logs import get_logger
+
+logger = get_logger('http_pool')
+
+HTTP2 = os.getenv("SUPABASE_HTTP2", "1").lower() not in ("0", "false", "no") \
+    and importlib.util.find_spec('h2') is not None
+POOL_MAX = int(os.getenv("SUPABASE_POOL_MAX", "20"))
+POOL_KEEPALIVE = int(os.getenv("SUPABASE_POOL_KEEPALIVE", "10"))
+KEEPALIVE_S = float(os.getenv("SUPABASE_KEEPALIVE_S", "120"))
+CONNECT_TIMEOUT = float(os.getenv("SUPABASE_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("SUPABASE_READ_TIMEOUT", os.getenv("QUERY_TIMEOUT", "20")))
+READ_RETRIES = int(os.getenv("SUPABASE_READ_RETRIES", "2"))
+RETRY_BACKOFF_MS = float(os.getenv("SUPABASE_RETRY_BACKOFF_MS", "100"))
+
+_IDEMPOTENTES = {'GET', 'HEAD', 'OPTIONS'}
+_ESTADOS_REINTENTABLES = {502, 503, 504}
+
+_lock = threading.Lock()
+_stats = {'requests': 0, 'reintentos': 0, 'errores': 0, 'conexiones_nuevas': 0}
+_transports = weakref.WeakSet()
+
+class _RetryTransport(httpx.BaseTransport):
+    """Transporte httpx que reintenta con backoff exponencial y cuenta las conexiones abiertas."""
+
+    def __init__(self, transport, retries=READ_RETRIES, backoff_ms=RETRY_BACKOFF_MS):
+        self._transport = transport
+        self._retries = retries
+        self._backoff_ms = backoff_ms
+        self._vistas = weakref.WeakSet()
+
+    def _reintentable(self, request, error=None, response=None):
+        if isinstance(error, (httpx.ConnectError, httpx.ConnectTimeout)):
+            return True
+        if request.method not in _IDEMPOTENTES:
+            return False
+        if error is not None:
+            return isinstance(error, (httpx.ReadError, httpx.RemoteProtocolError))
+        return response.status_code in _ESTADOS_REINTENTABLES
+
+    def _esperar(self, intento, request, motivo):
+        espera = self._backoff_ms * (2 ** intento) * random.uniform(0.5, 1.0) / 1000
+        logger.warning("Reintentando %s %s en %.0f ms (%s)", request.method, request.url.path,
+                       espera * 1000, motivo)
+        with _lock:
+            _stats['reintentos'] += 1
+        time.sleep(espera)
+
+    def _contar_conexiones(self):
+        nuevas = 0
+        for conexion in self.connections():
+            if conexion not in self._vistas:
+                self._vistas.add(conexion)
+                nuevas += 1
+        if nuevas:
+            with _lock:
+                _stats['conexiones_nuevas'] += nuevas
+
+    def connections(self):
+        pool = getattr(self._transport, '_pool', None)
+        return list(getattr(pool, 'connections', []))
+
+    def handle_request(self, request):
+        with _lock:
+            _stats['requests'] += 1
+        intento = 0
+        while True:
+            try:
+                response = self._transport.handle_request(request)
+            except httpx.TransportError as e:
+                if intento < self._retries and self._reintentable(request, error=e):
+                    self._esperar(intento, request, type(e).__name__)
+                    intento += 1
+                    continue
+                with _lock:
+                    _stats['errores'] += 1
+                raise
+            finally:
+                self._contar_conexiones()
+
+            if intento < self._retries and self._reintentable(request, response=response):
+                # Leer el cuerpo antes de cerrar para que la conexión vuelva al pool
+                response.read()
+                response.close()
+                self._esperar(intento, request, f"HTTP {response.status_code}")
+                intento += 1
+                continue
+            return response
+
+    def close(self):
+        self._transport.close()
+
+def create_session(base_url, headers):
+    """Sesión httpx para PostgREST con el pool, los timeouts y los reintentos configurados."""
+    transport = _RetryTransport(httpx.HTTPTransport(
+        http2=HTTP2,
+        limits=httpx.Limits(max_connections=POOL_MAX, max_keepalive_connections=POOL_KEEPALIVE,
+                            keepalive_expiry=KEEPALIVE_S)
+    ))
+    _transports.add(transport)
+    return httpx.Client(
+        base_url=base_url,
+        headers=headers,
+        timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT, pool=READ_TIMEOUT),
+        follow_redirects=True,
+        transport=transport
+    )
+
+def attach(client):
+    """Reemplazar la sesión de PostgREST del cliente de Supabase por una del pool.
+
+    Las consultas toman la sesión al construirse (client.from_, client.rpc), así que basta
+    con cambiarla una vez después de crear el cliente.
+    """
+    postgrest = client.postgrest
+    anterior = postgrest.session
+    postgrest.session = create_session(anterior.base_url, anterior.headers)
+    anterior.close()
+    logger.debug("Pool HTTP de Supabase: http2=%s, max=%s, keep-alive=%ss", HTTP2, POOL_MAX, KEEPALIVE_S)
+    return client
+
+def stats():
+    """Contadores de requests, reintentos, errores y conexiones, más el estado actual del pool."""
+    conexiones = [c for t in list(_transports) for c in t.connections()]
+    with _lock:
+        resultado = dict(_stats)
+    resultado.update({
+        'http2': HTTP2,
+        'conexiones': len(conexiones),
+        'ociosas': sum(1 for c in conexiones if c.is_idle()),
+        'pool_max': POOL_MAX,
+        'keepalive_s': KEEPALIVE_S
+    })
+    return resultado
@@ -0,0 +1,86 @@
+# logs.py - Configuración de logging de la aplicación
+#
+# Variables de entorno:
+#   LOG_LEVEL                nivel mínimo (DEBUG, INFO, WARNING, ERROR). Por defecto INFO.
+#   LOG_SAMPLE_RATE          fracción de mensajes DEBUG que se escriben (0-1). Por defecto 1.
+#   LOG_PAYLOADS             1 para volcar datos completos (listas, respuestas de Supabase)
+#                            a nivel DEBUG. Apagado por defecto.
+
+import contextvars
+import logging
+import os
+import random
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1"))
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "0").lower() in ("1", "true", "yes", "si")
+
+ROOT_LOGGER = 'guarderia'
+
+class _DebugSampler(logging.Filter):
+    """Deja pasar solo una fracción de los mensajes DEBUG; los demás niveles siempre pasan."""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or random.random() < self.rate
+
+class _ErrorTracker(logging.Filter):
+    """Cuenta los mensajes ERROR o más graves en el contador activo (ver track_errors)."""
+
+    def filter(self, record):
+        counter = _error_counter.get()
+        if counter is not None and record.levelno >= logging.ERROR:
+            counter.append(record.getMessage())
+        return True
+
+# Lista compartida por el contexto actual y las copias que hereda run_parallel
+_error_counter = contextvars.ContextVar('logs_error_counter', default=None)
+
+_configured = False
+
+def configure_logging():
+    """Configurar una vez el logger raíz de la aplicación (no toca el de Flask/werkzeug)."""
+    global _configured
+    if _configured:
+        return
+    _configured = True
+
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(getattr(logging, LOG_LEVEL, logging.INFO))
+    if not logger.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        handler.addFilter(_ErrorTracker())
+        if LOG_SAMPLE_RATE < 1:
+            handler.addFilter(_DebugSampler(LOG_SAMPLE_RATE))
+        logger.addHandler(handler)
+    logger.propagate = False
+
+def get_logger(name):
+    """Logger hijo de la aplicación, p. ej. get_logger('database')."""
+    configure_logging()
+    return logging.getLogger(f'{ROOT_LOGGER}.{name}')
+
+def log_payload(logger, msg, *args):
+    """Volcar datos completos a nivel DEBUG solo si LOG_PAYLOADS está activo.
+
+    Los argumentos se formatean únicamente cuando el mensaje se escribe, así el costo no
+    crece con el tamaño de los datos cuando el volcado está apagado.
+    """
+    if LOG_PAYLOADS and logger.isEnabledFor(logging.DEBUG):
+        logger.debug(msg, *args)
+
+def track_errors():
+    """Empezar a registrar los errores que se loguean en este contexto.
+
+    Devuelve (errores, token): errores es la lista de mensajes ERROR registrados desde
+    ahora, incluidos los de hilos lanzados con run_parallel; token se pasa a stop_tracking.
+    """
+    errors = []
+    return errors, _error_counter.set(errors)
+
+def stop_tracking(token):
+    _error_counter.reset(token)
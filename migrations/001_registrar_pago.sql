@@ -0,0 +1,79 @@
+-- Registrar un pago (simple o dividido) en una sola transacción:
+--   1. inserta una fila en pagos por cada parte,
+--   2. liquida las asistencias pendientes del niño en orden FIFO con el total,
+--   3. ajusta ninos.saldo (legado).
+-- Mismas reglas que database._mark_asistencias_pagadas: una asistencia que no cabe
+-- en el remanente se salta y las liquidadas quedan ligadas a la última parte insertada.
+--
+-- p_partes: [{"id_empleado": 3, "monto": 45.0, "tipo": "Efectivo"}, ...]
+
+create or replace function public.registrar_pago(
+    p_fecha date,
+    p_id_nino bigint,
+    p_partes jsonb
+)
+returns setof public.pagos
+language plpgsql
+as $$
+declare
+    c_epsilon constant numeric := 0.001;
+    v_parte jsonb;
+    v_pago public.pagos;
+    v_total numeric := 0;
+    v_restante numeric;
+    v_asistencia record;
+    v_cubiertas bigint[] := '{}';
+begin
+    if p_partes is null or jsonb_array_length(p_partes) = 0 then
+        raise exception 'registrar_pago requiere al menos una parte';
+    end if;
+
+    -- Serializar cobros concurrentes del mismo niño
+    perform 1 from public.ninos where id = p_id_nino for update;
+
+    for v_parte in select value from jsonb_array_elements(p_partes) loop
+        insert into public.pagos (date, id_nino, id_empleado, monto, tipo)
+        values (
+            p_fecha,
+            p_id_nino,
+            (v_parte->>'id_empleado')::bigint,
+            (v_parte->>'monto')::numeric,
+            v_parte->>'tipo'
+        )
+        returning * into v_pago;
+
+        v_total := v_total + v_pago.monto;
+        return next v_pago;
+    end loop;
+
+    v_restante := v_total;
+    for v_asistencia in
+        select id, coalesce(valor, 0) as valor
+        from public.asistencia
+        where tipo = 'nino' and id_persona = p_id_nino and pagado = false
+        order by fecha, id
+        for update
+    loop
+        continue when v_asistencia.valor <= 0;
+        if v_restante + c_epsilon >= v_asistencia.valor then
+            v_cubiertas := v_cubiertas || v_asistencia.id;
+            v_restante := v_restante - v_asistencia.valor;
+        end if;
+        exit when v_restante <= c_epsilon;
+    end loop;
+
+    if cardinality(v_cubiertas) > 0 then
+        update public.asistencia
+        set pagado = true, id_pago = v_pago.id
+        where id = any(v_cubiertas);
+    end if;
+
+    update public.ninos
+    set saldo = coalesce(saldo, 0) - v_total
+    where id = p_id_nino;
+
+    return;
+end;
+$$;
+
+grant execute on function public.registrar_pago(date, bigint, jsonb) to anon, authenticated, service_role;
@@ -0,0 +1,50 @@
+-- Registrar los pagos de varios niños en una sola llamada.
+-- Cada elemento pasa por public.registrar_pago (001) dentro de su propio bloque de
+-- excepción, así un niño que falla no revierte a los demás y el resultado informa
+-- el desenlace de cada uno (indice = posición 0-based del elemento en p_pagos).
+--
+-- p_pagos: [{"fecha": "2026-01-09", "id_nino": 4, "id_empleado": 2, "monto": 60.0, "tipo": "Efectivo"}, ...]
+
+create or replace function public.registrar_pagos_lote(p_pagos jsonb)
+returns table (indice integer, id_nino bigint, ok boolean, pago jsonb, error text)
+language plpgsql
+as $$
+declare
+    v_item jsonb;
+    v_posicion bigint;
+    v_pago public.pagos;
+begin
+    -- Procesar por id de niño para tomar los bloqueos siempre en el mismo orden
+    for v_item, v_posicion in
+        select value, ordinality
+        from jsonb_array_elements(coalesce(p_pagos, '[]'::jsonb)) with ordinality
+        order by (value->>'id_nino')::bigint, ordinality
+    loop
+        indice := v_posicion - 1;
+        id_nino := (v_item->>'id_nino')::bigint;
+        begin
+            select * into v_pago
+            from public.registrar_pago(
+                (v_item->>'fecha')::date,
+                (v_item->>'id_nino')::bigint,
+                jsonb_build_array(jsonb_build_object(
+                    'id_empleado', v_item->'id_empleado',
+                    'monto', v_item->'monto',
+                    'tipo', v_item->'tipo'
+                ))
+            )
+            limit 1;
+            ok := true;
+            pago := to_jsonb(v_pago);
+            error := null;
+        exception when others then
+            ok := false;
+            pago := null;
+            error := sqlerrm;
+        end;
+        return next;
+    end loop;
+end;
+$$;
+
+grant execute on function public.registrar_pagos_lote(jsonb) to anon, authenticated, service_role;
@@ -0,0 +1,103 @@
+-- Libro de deuda por niño y semana, mantenido por trigger sobre asistencia.
+-- deuda_semanal.pendiente = suma de asistencia.valor con pagado = false para ese niño
+-- en la semana que empieza en "semana" (lunes). Cualquier escritura sobre asistencia
+-- (alta, edición, borrado, liquidación o reversión de un pago) lo ajusta por diferencia,
+-- así get_pending_payments lee unas pocas filas por niño en lugar de todo el historial.
+--
+-- El trigger y la reconstrucción corren como el dueño (security definer): escribir en
+-- asistencia con la clave de la app alcanza para mantener el libro, y anon/authenticated
+-- solo pueden leerlo.
+
+create table if not exists public.deuda_semanal (
+    id_nino bigint not null,
+    semana date not null,
+    pendiente numeric not null default 0,
+    primary key (id_nino, semana)
+);
+
+create or replace function public._deuda_semanal_aplicar(p_id_nino bigint, p_fecha date, p_delta numeric)
+returns void
+language sql
+security definer
+set search_path = public
+as $$
+    insert into public.deuda_semanal (id_nino, semana, pendiente)
+    values (p_id_nino, date_trunc('week', p_fecha)::date, p_delta)
+    on conflict (id_nino, semana)
+    do update set pendiente = public.deuda_semanal.pendiente + excluded.pendiente;
+$$;
+
+create or replace function public._deuda_semanal_trigger()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE')
+       and old.tipo = 'nino' and not coalesce(old.pagado, false) then
+        perform public._deuda_semanal_aplicar(old.id_persona, old.fecha::date, -coalesce(old.valor, 0));
+    end if;
+
+    if tg_op in ('INSERT', 'UPDATE')
+       and new.tipo = 'nino' and not coalesce(new.pagado, false) then
+        perform public._deuda_semanal_aplicar(new.id_persona, new.fecha::date, coalesce(new.valor, 0));
+    end if;
+
+    return null;
+end;
+$$;
+
+drop trigger if exists asistencia_deuda_semanal on public.asistencia;
+create trigger asistencia_deuda_semanal
+after insert or update or delete on public.asistencia
+for each row execute function public._deuda_semanal_trigger();
+
+-- Deuda por niño separada en semanas anteriores y semana actual (p_lunes = lunes en curso).
+create or replace function public.deuda_pendiente(p_lunes date)
+returns table (id_nino bigint, anterior numeric, actual numeric)
+language sql
+stable
+as $$
+    select
+        d.id_nino,
+        coalesce(sum(d.pendiente) filter (where d.semana < p_lunes), 0) as anterior,
+        coalesce(sum(d.pendiente) filter (where d.semana >= p_lunes), 0) as actual
+    from public.deuda_semanal d
+    where d.pendiente <> 0
+    group by d.id_nino;
+$$;
+
+-- Reconstruir el libro desde cero (comando: flask reconciliar-deuda, que corre con la clave
+-- de la app, así que se concede a anon y authenticated además de service_role).
+create or replace function public.reconciliar_deuda_semanal()
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_filas integer;
+begin
+    lock table public.deuda_semanal in exclusive mode;
+
+    delete from public.deuda_semanal where true;
+
+    insert into public.deuda_semanal (id_nino, semana, pendiente)
+    select id_persona, date_trunc('week', fecha::date)::date, sum(coalesce(valor, 0))
+    from public.asistencia
+    where tipo = 'nino' and not coalesce(pagado, false)
+    group by id_persona, date_trunc('week', fecha::date)::date;
+
+    get diagnostics v_filas = row_count;
+    return v_filas;
+end;
+$$;
+
+revoke insert, update, delete, truncate on public.deuda_semanal from anon, authenticated;
+grant select on public.deuda_semanal to anon, authenticated, service_role;
+revoke execute on function public._deuda_semanal_aplicar(bigint, date, numeric) from public, anon, authenticated;
+grant execute on function public.deuda_pendiente(date) to anon, authenticated, service_role;
+grant execute on function public.reconciliar_deuda_semanal() to anon, authenticated, service_role;
+
+select public.reconciliar_deuda_semanal();
@@ -0,0 +1,167 @@
+-- Índice de sumas acumuladas por niño para calculate_debt_snapshot.
+-- deuda_acumulada guarda, por niño y por cada fecha con movimientos, el total acumulado
+-- de asistencia (tipo nino) y de pagos hasta esa fecha inclusive. La deuda a cualquier
+-- fecha es la fila más reciente <= fecha de cada niño: una búsqueda en el índice
+-- (id_nino, fecha) por niño en lugar de sumar todo el historial.
+-- Triggers sobre asistencia y pagos lo extienden/ajustan en cada escritura. Corren como el
+-- dueño (security definer), igual que la reconstrucción: anon/authenticated solo leen el índice.
+
+create table if not exists public.deuda_acumulada (
+    id_nino bigint not null,
+    fecha date not null,
+    asistencia_acum numeric not null default 0,
+    pagos_acum numeric not null default 0,
+    primary key (id_nino, fecha)
+);
+
+create or replace function public._deuda_acumulada_aplicar(
+    p_id_nino bigint,
+    p_fecha date,
+    p_asistencia numeric,
+    p_pagos numeric
+)
+returns void
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if p_id_nino is null or p_fecha is null then
+        return;
+    end if;
+
+    -- Serializar ajustes del mismo niño (clave de 64 bits: el id es bigint)
+    perform pg_advisory_xact_lock(hashtextextended('deuda_acumulada', p_id_nino));
+
+    -- La fila nueva arranca con los acumulados de la fecha anterior más cercana
+    insert into public.deuda_acumulada (id_nino, fecha, asistencia_acum, pagos_acum)
+    select p_id_nino, p_fecha, coalesce(prev.asistencia_acum, 0), coalesce(prev.pagos_acum, 0)
+    from (select 1) as base
+    left join lateral (
+        select d.asistencia_acum, d.pagos_acum
+        from public.deuda_acumulada d
+        where d.id_nino = p_id_nino and d.fecha < p_fecha
+        order by d.fecha desc
+        limit 1
+    ) as prev on true
+    on conflict (id_nino, fecha) do nothing;
+
+    update public.deuda_acumulada
+    set asistencia_acum = asistencia_acum + p_asistencia,
+        pagos_acum = pagos_acum + p_pagos
+    where id_nino = p_id_nino and fecha >= p_fecha;
+end;
+$$;
+
+create or replace function public._deuda_acumulada_asistencia()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') and old.tipo = 'nino' then
+        perform public._deuda_acumulada_aplicar(old.id_persona, old.fecha::date, -coalesce(old.valor, 0), 0);
+    end if;
+
+    if tg_op in ('INSERT', 'UPDATE') and new.tipo = 'nino' then
+        perform public._deuda_acumulada_aplicar(new.id_persona, new.fecha::date, coalesce(new.valor, 0), 0);
+    end if;
+
+    return null;
+end;
+$$;
+
+create or replace function public._deuda_acumulada_pagos()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') then
+        perform public._deuda_acumulada_aplicar(old.id_nino, old.date::date, 0, -coalesce(old.monto, 0));
+    end if;
+
+    if tg_op in ('INSERT', 'UPDATE') then
+        perform public._deuda_acumulada_aplicar(new.id_nino, new.date::date, 0, coalesce(new.monto, 0));
+    end if;
+
+    return null;
+end;
+$$;
+
+-- Las marcas pagado/id_pago no cambian los acumulados: solo reaccionar a lo que sí los cambia.
+drop trigger if exists asistencia_deuda_acumulada on public.asistencia;
+create trigger asistencia_deuda_acumulada
+after insert or delete or update of tipo, id_persona, fecha, valor on public.asistencia
+for each row execute function public._deuda_acumulada_asistencia();
+
+drop trigger if exists pagos_deuda_acumulada on public.pagos;
+create trigger pagos_deuda_acumulada
+after insert or delete or update of id_nino, date, monto on public.pagos
+for each row execute function public._deuda_acumulada_pagos();
+
+-- Acumulados de cada niño a una fecha (inclusive).
+create or replace function public.deuda_a_fecha(p_fecha date, p_ids bigint[])
+returns table (id_nino bigint, asistencia numeric, pagos numeric)
+language sql
+stable
+as $$
+    select n.id, coalesce(d.asistencia_acum, 0), coalesce(d.pagos_acum, 0)
+    from unnest(p_ids) as n(id)
+    left join lateral (
+        select a.asistencia_acum, a.pagos_acum
+        from public.deuda_acumulada a
+        where a.id_nino = n.id and a.fecha <= p_fecha
+        order by a.fecha desc
+        limit 1
+    ) as d on true;
+$$;
+
+-- Reconstruir el índice desde cero (comando: flask reconciliar-deuda, con la clave de la app).
+create or replace function public.reconstruir_deuda_acumulada()
+returns integer
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_filas integer;
+begin
+    lock table public.deuda_acumulada in exclusive mode;
+
+    delete from public.deuda_acumulada where true;
+
+    insert into public.deuda_acumulada (id_nino, fecha, asistencia_acum, pagos_acum)
+    select
+        id_nino,
+        fecha,
+        sum(asistencia) over (partition by id_nino order by fecha),
+        sum(pagos) over (partition by id_nino order by fecha)
+    from (
+        select id_nino, fecha, sum(asistencia) as asistencia, sum(pagos) as pagos
+        from (
+            select id_persona as id_nino, fecha::date as fecha, coalesce(valor, 0) as asistencia, 0 as pagos
+            from public.asistencia
+            where tipo = 'nino'
+            union all
+            select id_nino, date::date, 0, coalesce(monto, 0)
+            from public.pagos
+        ) as movimientos
+        where id_nino is not null and fecha is not null
+        group by id_nino, fecha
+    ) as diarios;
+
+    get diagnostics v_filas = row_count;
+    return v_filas;
+end;
+$$;
+
+revoke insert, update, delete, truncate on public.deuda_acumulada from anon, authenticated;
+grant select on public.deuda_acumulada to anon, authenticated, service_role;
+revoke execute on function public._deuda_acumulada_aplicar(bigint, date, numeric, numeric) from public, anon, authenticated;
+grant execute on function public.deuda_a_fecha(date, bigint[]) to anon, authenticated, service_role;
+grant execute on function public.reconstruir_deuda_acumulada() to anon, authenticated, service_role;
+
+select public.reconstruir_deuda_acumulada();
@@ -0,0 +1,46 @@
+-- Asistencia de un período agrupada en Postgres para el dashboard y los resúmenes semanales.
+-- asistencia_semana(p_desde, p_hasta) devuelve una fila por persona (niño o trabajadora) con
+-- sus montos/horas por día, en lugar de todas las filas de asistencia del período.
+-- get_week_aggregate en database.py arma el mismo agregado a partir de este resultado; si la
+-- función no está instalada, descarga la asistencia y agrupa en Python.
+--
+-- Columnas: fechas, montos y registros son arreglos alineados (un elemento por día con
+-- asistencia); registros es la cantidad de filas de ese día. Las personas vienen en el orden
+-- de su primera fila (menor id), igual que en la ruta en Python.
+
+create index if not exists asistencia_fecha_idx on public.asistencia (fecha);
+
+create or replace function public.asistencia_semana(p_desde date, p_hasta date)
+returns table (
+    tipo text,
+    id_persona bigint,
+    fechas text[],
+    montos numeric[],
+    registros integer[]
+)
+language sql
+stable
+as $$
+    select
+        d.tipo,
+        d.id_persona,
+        array_agg(d.fecha::text order by d.fecha) as fechas,
+        array_agg(d.monto order by d.fecha) as montos,
+        array_agg(d.registros order by d.fecha) as registros
+    from (
+        select
+            a.tipo::text as tipo,
+            a.id_persona::bigint as id_persona,
+            a.fecha::date as fecha,
+            sum(coalesce(a.valor, 0)) as monto,
+            count(*)::integer as registros,
+            min(a.id) as primer_id
+        from public.asistencia a
+        where a.fecha::date between p_desde and p_hasta
+        group by a.tipo, a.id_persona, a.fecha::date
+    ) d
+    group by d.tipo, d.id_persona
+    order by min(d.primer_id);
+$$;
+
+grant execute on function public.asistencia_semana(date, date) to anon, authenticated, service_role;
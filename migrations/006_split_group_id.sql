@@ -0,0 +1,116 @@
+-- Columna pagos.split_group_id para los pagos divididos.
+-- Hasta ahora el grupo de un pago dividido iba como sufijo dentro de tipo
+-- ("Efectivo [DIV:<grupo>]"), así que encontrar las partes de un grupo obligaba a traer todos
+-- los pagos del niño en esa fecha y parsear tipo. Con la columna indexada, delete_pagos busca
+-- el grupo con una igualdad y tipo queda limpio para mostrar.
+--
+-- 1. Agrega la columna y su índice, y migra las filas con el marcador (tipo queda sin sufijo).
+-- 2. Un trigger hace lo mismo con cualquier insert/update que todavía escriba el marcador
+--    (instancias con código anterior durante el despliegue).
+-- 3. registrar_pago (001) pasa a leer split_group_id de cada parte.
+--
+-- database.py detecta la columna al primer uso; sin esta migración sigue escribiendo y leyendo
+-- el marcador en tipo.
+
+alter table public.pagos add column if not exists split_group_id text;
+
+update public.pagos
+set split_group_id = substring(tipo from ' \[DIV:([^\]]*)\]?$'),
+    tipo = split_part(tipo, ' [DIV:', 1)
+where tipo like '% [DIV:%';
+
+create index if not exists pagos_split_group_id_idx
+    on public.pagos (split_group_id)
+    where split_group_id is not null;
+
+create or replace function public.pagos_split_group_id_desde_tipo()
+returns trigger
+language plpgsql
+as $$
+begin
+    if new.tipo like '% [DIV:%' then
+        new.split_group_id := coalesce(new.split_group_id, substring(new.tipo from ' \[DIV:([^\]]*)\]?$'));
+        new.tipo := split_part(new.tipo, ' [DIV:', 1);
+    end if;
+    return new;
+end;
+$$;
+
+drop trigger if exists pagos_split_group_id_desde_tipo on public.pagos;
+create trigger pagos_split_group_id_desde_tipo
+before insert or update of tipo on public.pagos
+for each row execute function public.pagos_split_group_id_desde_tipo();
+
+-- p_partes: [{"id_empleado": 3, "monto": 22.5, "tipo": "Efectivo", "split_group_id": "9f0c..."}, ...]
+-- (split_group_id es opcional; las mismas reglas de liquidación que en 001)
+create or replace function public.registrar_pago(
+    p_fecha date,
+    p_id_nino bigint,
+    p_partes jsonb
+)
+returns setof public.pagos
+language plpgsql
+as $$
+declare
+    c_epsilon constant numeric := 0.001;
+    v_parte jsonb;
+    v_pago public.pagos;
+    v_total numeric := 0;
+    v_restante numeric;
+    v_asistencia record;
+    v_cubiertas bigint[] := '{}';
+begin
+    if p_partes is null or jsonb_array_length(p_partes) = 0 then
+        raise exception 'registrar_pago requiere al menos una parte';
+    end if;
+
+    -- Serializar cobros concurrentes del mismo niño
+    perform 1 from public.ninos where id = p_id_nino for update;
+
+    for v_parte in select value from jsonb_array_elements(p_partes) loop
+        insert into public.pagos (date, id_nino, id_empleado, monto, tipo, split_group_id)
+        values (
+            p_fecha,
+            p_id_nino,
+            (v_parte->>'id_empleado')::bigint,
+            (v_parte->>'monto')::numeric,
+            v_parte->>'tipo',
+            v_parte->>'split_group_id'
+        )
+        returning * into v_pago;
+
+        v_total := v_total + v_pago.monto;
+        return next v_pago;
+    end loop;
+
+    v_restante := v_total;
+    for v_asistencia in
+        select id, coalesce(valor, 0) as valor
+        from public.asistencia
+        where tipo = 'nino' and id_persona = p_id_nino and pagado = false
+        order by fecha, id
+        for update
+    loop
+        continue when v_asistencia.valor <= 0;
+        if v_restante + c_epsilon >= v_asistencia.valor then
+            v_cubiertas := v_cubiertas || v_asistencia.id;
+            v_restante := v_restante - v_asistencia.valor;
+        end if;
+        exit when v_restante <= c_epsilon;
+    end loop;
+
+    if cardinality(v_cubiertas) > 0 then
+        update public.asistencia
+        set pagado = true, id_pago = v_pago.id
+        where id = any(v_cubiertas);
+    end if;
+
+    update public.ninos
+    set saldo = coalesce(saldo, 0) - v_total
+    where id = p_id_nino;
+
+    return;
+end;
+$$;
+
+grant execute on function public.registrar_pago(date, bigint, jsonb) to anon, authenticated, service_role;
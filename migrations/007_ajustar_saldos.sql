@@ -0,0 +1,26 @@
+-- Ajuste atómico de ninos.saldo (legado).
+-- Antes cada escritura leía el saldo y escribía saldo + delta desde Python: dos round-trips
+-- y, con dos escrituras simultáneas del mismo niño, una de las dos se perdía. Con esta función
+-- el incremento ocurre en un solo update (saldo = saldo + delta), para uno o varios niños.
+-- database._adjust_ninos_saldo la usa desde add/update/delete_asistencia, los pagos sin
+-- registrar_pago y delete_pagos; sin la función sigue leyendo y escribiendo desde Python.
+--
+-- p_deltas: {"<id_nino>": delta, ...}  p. ej. {"4": 30.0, "7": -45.5}
+-- Devuelve el saldo nuevo de cada niño existente.
+
+create or replace function public.ajustar_saldos(p_deltas jsonb)
+returns table (id bigint, saldo numeric)
+language sql
+as $$
+    update public.ninos n
+    set saldo = coalesce(n.saldo, 0) + d.delta
+    from (
+        select key::bigint as id, sum(value::numeric) as delta
+        from jsonb_each_text(p_deltas)
+        group by key::bigint
+    ) d
+    where n.id = d.id
+    returning n.id::bigint, n.saldo::numeric;
+$$;
+
+grant execute on function public.ajustar_saldos(jsonb) to anon, authenticated, service_role;
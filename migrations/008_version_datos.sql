@@ -0,0 +1,110 @@
+-- Versión de datos por semana, compartida por todas las instancias.
+-- La caché de reportes (report_cache.py) y el ETag de /dashboard, /resumen-semanal y
+-- /resumen-pagos dependen de database.data_version. Sin esta tabla esa versión son contadores
+-- del proceso: una escritura hecha por otra instancia no los cambia, así que el proceso usa un
+-- ETag calculado sobre el HTML y no guarda semanas cerradas más que REPORT_CACHE_TTL_ABIERTA.
+-- Con la tabla, cada escritura sobre asistencia, pagos o gastos sube la versión de la semana
+-- (lunes) de cada fila afectada, y las de ninos o employees la clave 'global' (los reportes
+-- muestran nombres). version_datos(p_semanas) devuelve la global más las pedidas.
+
+create table if not exists public.version_datos (
+    clave text primary key,            -- 'global' o el lunes de la semana (YYYY-MM-DD)
+    version bigint not null default 0,
+    actualizado timestamptz not null default now()
+);
+
+insert into public.version_datos (clave) values ('global') on conflict (clave) do nothing;
+
+create or replace function public._version_datos_subir(p_clave text)
+returns void
+language sql
+security definer
+set search_path = public
+as $$
+    insert into public.version_datos (clave, version, actualizado)
+    values (p_clave, 1, now())
+    on conflict (clave)
+    do update set version = public.version_datos.version + 1, actualizado = now();
+$$;
+
+-- tg_argv[0]: columna de fecha de la tabla (fecha en asistencia y gastos, date en pagos);
+-- sin argumento sube la versión global.
+create or replace function public._version_datos_trigger()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+    v_semanas text[] := '{}';
+begin
+    if tg_nargs = 0 then
+        perform public._version_datos_subir('global');
+        return null;
+    end if;
+
+    if tg_op in ('UPDATE', 'DELETE') then
+        v_semanas := v_semanas || date_trunc('week', (to_jsonb(old)->>tg_argv[0])::date)::date::text;
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') then
+        v_semanas := v_semanas || date_trunc('week', (to_jsonb(new)->>tg_argv[0])::date)::date::text;
+    end if;
+
+    perform public._version_datos_subir(s)
+    from (select distinct unnest(v_semanas) as s) semanas
+    where s is not null;
+    return null;
+end;
+$$;
+
+drop trigger if exists asistencia_version_datos on public.asistencia;
+create trigger asistencia_version_datos
+after insert or update or delete on public.asistencia
+for each row execute function public._version_datos_trigger('fecha');
+
+drop trigger if exists pagos_version_datos on public.pagos;
+create trigger pagos_version_datos
+after insert or update or delete on public.pagos
+for each row execute function public._version_datos_trigger('date');
+
+drop trigger if exists gastos_version_datos on public.gastos;
+create trigger gastos_version_datos
+after insert or update or delete on public.gastos
+for each row execute function public._version_datos_trigger('fecha');
+
+-- ninos.saldo cambia con cada asistencia o pago y los reportes no lo muestran
+drop trigger if exists ninos_version_datos on public.ninos;
+create trigger ninos_version_datos
+after insert or delete on public.ninos
+for each statement execute function public._version_datos_trigger();
+
+drop trigger if exists ninos_version_datos_update on public.ninos;
+create trigger ninos_version_datos_update
+after update on public.ninos
+for each row
+when ((to_jsonb(old) - 'saldo') is distinct from (to_jsonb(new) - 'saldo'))
+execute function public._version_datos_trigger();
+
+drop trigger if exists employees_version_datos on public.employees;
+create trigger employees_version_datos
+after insert or update or delete on public.employees
+for each statement execute function public._version_datos_trigger();
+
+-- p_semanas: lunes de las semanas del reporte. Devuelve 'global' y las semanas con versión.
+create or replace function public.version_datos(p_semanas date[])
+returns table (clave text, version bigint, actualizado timestamptz)
+language sql
+stable
+security definer
+set search_path = public
+as $$
+    select v.clave, v.version, v.actualizado
+    from public.version_datos v
+    where v.clave = 'global'
+       or v.clave = any(select s::text from unnest(p_semanas) s);
+$$;
+
+-- La versión solo cambia por los triggers
+revoke insert, update, delete, truncate on public.version_datos from anon, authenticated;
+revoke execute on function public._version_datos_subir(text) from public, anon, authenticated;
+grant execute on function public.version_datos(date[]) to anon, authenticated, service_role;
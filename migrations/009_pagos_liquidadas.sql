@@ -0,0 +1,146 @@
+-- registrar_pago y registrar_pagos_lote devuelven también las fechas de las asistencias que
+-- liquidaron.
+-- database.py registra cada escritura en el diario por (tabla, semana, persona) para invalidar
+-- la caché de reportes. Con las versiones de 001/002/006 solo recibía los pagos, así que
+-- después de cada llamada volvía a leer asistencia por id_pago para saber qué semanas se
+-- liquidaron: una consulta más por cobro. Con esta migración esas fechas vienen en la respuesta.
+--
+-- Cambia el tipo de retorno, así que las dos funciones se borran y se vuelven a crear:
+--   registrar_pago       -> table (pago jsonb, liquidadas jsonb)
+--                           una fila por parte; liquidadas (arreglo de fechas) va en la última,
+--                           que es la parte a la que quedan ligadas las asistencias
+--   registrar_pagos_lote -> la misma tabla de 002 más liquidadas jsonb
+-- database.py acepta las dos formas; aplicarla después de desplegar el código que la usa.
+-- Requiere 006 (split_group_id).
+
+drop function if exists public.registrar_pagos_lote(jsonb);
+drop function if exists public.registrar_pago(date, bigint, jsonb);
+
+-- p_partes: [{"id_empleado": 3, "monto": 22.5, "tipo": "Efectivo", "split_group_id": "9f0c..."}, ...]
+-- (mismas reglas de liquidación que en 001)
+create function public.registrar_pago(
+    p_fecha date,
+    p_id_nino bigint,
+    p_partes jsonb
+)
+returns table (pago jsonb, liquidadas jsonb)
+language plpgsql
+as $$
+declare
+    c_epsilon constant numeric := 0.001;
+    v_parte jsonb;
+    v_pago public.pagos;
+    v_pagos public.pagos[] := '{}';
+    v_total numeric := 0;
+    v_restante numeric;
+    v_asistencia record;
+    v_cubiertas bigint[] := '{}';
+    v_fechas jsonb := '[]'::jsonb;
+begin
+    if p_partes is null or jsonb_array_length(p_partes) = 0 then
+        raise exception 'registrar_pago requiere al menos una parte';
+    end if;
+
+    -- Serializar cobros concurrentes del mismo niño
+    perform 1 from public.ninos where id = p_id_nino for update;
+
+    for v_parte in select value from jsonb_array_elements(p_partes) loop
+        insert into public.pagos (date, id_nino, id_empleado, monto, tipo, split_group_id)
+        values (
+            p_fecha,
+            p_id_nino,
+            (v_parte->>'id_empleado')::bigint,
+            (v_parte->>'monto')::numeric,
+            v_parte->>'tipo',
+            v_parte->>'split_group_id'
+        )
+        returning * into v_pago;
+
+        v_total := v_total + v_pago.monto;
+        v_pagos := v_pagos || v_pago;
+    end loop;
+
+    v_restante := v_total;
+    for v_asistencia in
+        select id, coalesce(valor, 0) as valor
+        from public.asistencia
+        where tipo = 'nino' and id_persona = p_id_nino and pagado = false
+        order by fecha, id
+        for update
+    loop
+        continue when v_asistencia.valor <= 0;
+        if v_restante + c_epsilon >= v_asistencia.valor then
+            v_cubiertas := v_cubiertas || v_asistencia.id;
+            v_restante := v_restante - v_asistencia.valor;
+        end if;
+        exit when v_restante <= c_epsilon;
+    end loop;
+
+    if cardinality(v_cubiertas) > 0 then
+        with marcadas as (
+            update public.asistencia
+            set pagado = true, id_pago = v_pago.id
+            where id = any(v_cubiertas)
+            returning fecha
+        )
+        select coalesce(jsonb_agg(distinct fecha), '[]'::jsonb) into v_fechas from marcadas;
+    end if;
+
+    update public.ninos
+    set saldo = coalesce(saldo, 0) - v_total
+    where id = p_id_nino;
+
+    foreach v_pago in array v_pagos loop
+        pago := to_jsonb(v_pago);
+        liquidadas := case when v_pago.id = v_pagos[cardinality(v_pagos)].id then v_fechas end;
+        return next;
+    end loop;
+end;
+$$;
+
+grant execute on function public.registrar_pago(date, bigint, jsonb) to anon, authenticated, service_role;
+
+-- p_pagos: [{"fecha": "2026-01-09", "id_nino": 4, "id_empleado": 2, "monto": 60.0, "tipo": "Efectivo"}, ...]
+-- (mismo manejo de errores por niño que en 002)
+create function public.registrar_pagos_lote(p_pagos jsonb)
+returns table (indice integer, id_nino bigint, ok boolean, pago jsonb, error text, liquidadas jsonb)
+language plpgsql
+as $$
+declare
+    v_item jsonb;
+    v_posicion bigint;
+begin
+    -- Procesar por id de niño para tomar los bloqueos siempre en el mismo orden
+    for v_item, v_posicion in
+        select value, ordinality
+        from jsonb_array_elements(coalesce(p_pagos, '[]'::jsonb)) with ordinality
+        order by (value->>'id_nino')::bigint, ordinality
+    loop
+        indice := v_posicion - 1;
+        id_nino := (v_item->>'id_nino')::bigint;
+        begin
+            select r.pago, r.liquidadas into pago, liquidadas
+            from public.registrar_pago(
+                (v_item->>'fecha')::date,
+                (v_item->>'id_nino')::bigint,
+                jsonb_build_array(jsonb_build_object(
+                    'id_empleado', v_item->'id_empleado',
+                    'monto', v_item->'monto',
+                    'tipo', v_item->'tipo'
+                ))
+            ) r
+            limit 1;
+            ok := true;
+            error := null;
+        exception when others then
+            ok := false;
+            pago := null;
+            liquidadas := null;
+            error := sqlerrm;
+        end;
+        return next;
+    end loop;
+end;
+$$;
+
+grant execute on function public.registrar_pagos_lote(jsonb) to anon, authenticated, service_role;
@@ -0,0 +1,289 @@
+# query_stats.py - Instrumentación de consultas a Supabase por request
+#
+# InstrumentedClient envuelve al cliente de Supabase y registra cada .execute(): tabla,
+# filtros, filas devueltas, bytes, latencia y la función de database.py que la emitió.
+# Las consultas se acumulan en el request de Flask en curso (ver start_request /
+# finish_request en app.py); fuera de un request no se registra nada.
+#
+# Variables de entorno:
+#   QUERY_STATS          0 para desactivar la instrumentación. Activa por defecto.
+#   QUERY_STATS_HISTORY  cuántos requests recientes guarda /debug/queries. Por defecto 50.
+#   QUERY_BUDGET         máximo de consultas por request antes de avisar. Por defecto 10.
+#   QUERY_STATS_BYTES    1 para medir los bytes de cada respuesta en /debug/queries. Apagado
+#                        por defecto: el cliente de Supabase no conserva la respuesta HTTP, así
+#                        que medirlos obliga a volver a serializar los datos (crece con el tamaño).
+
+import contextvars
+import copy
+import json
+import os
+import re
+import sys
+import threading
+import time
+from collections import deque
+
+from logs import get_logger
+
+logger = get_logger('query_stats')
+
+QUERY_STATS_ENABLED = os.getenv("QUERY_STATS", "1").lower() not in ("0", "false", "no")
+QUERY_STATS_HISTORY = int(os.getenv("QUERY_STATS_HISTORY", "50"))
+QUERY_BUDGET = int(os.getenv("QUERY_BUDGET", "10"))
+QUERY_STATS_BYTES = os.getenv("QUERY_STATS_BYTES", "0").lower() in ("1", "true", "yes")
+
+# Módulos cuyas funciones se reportan como origen de la consulta, y auxiliares que se saltan
+# para llegar a la función que realmente la pidió.
+_CALLER_MODULES = {'database'}
+_PLUMBING = {
+    'fetch_all_paginated', 'iter_paginated', '_fetch_page', '_call_rpc', 'run_parallel',
+    '_scan', '_scan_rows', 'sum_by_person', 'sum_by_day', 'count_distinct',
+    '<lambda>', '<listcomp>', '<genexpr>'
+}
+
+# Métodos del builder que se anotan como filtros de la consulta.
+_DESCRIBED = {
+    'select', 'insert', 'update', 'delete', 'upsert',
+    'eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'in_', 'is_', 'like', 'ilike',
+    'order', 'limit', 'range'
+}
+
+# Caracteres permitidos en el nombre de una métrica de Server-Timing (un token HTTP).
+_METRIC_INVALID = re.compile(r'[^A-Za-z0-9_-]')
+
+_current = contextvars.ContextVar('query_stats_request', default=None)
+# Función a la que se atribuyen las consultas de un hilo auxiliar (ver attributed_to).
+_caller = contextvars.ContextVar('query_stats_caller', default=None)
+_history = deque(maxlen=QUERY_STATS_HISTORY)
+_history_lock = threading.Lock()
+
+class _RequestStats:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = []
+        self.lock = threading.Lock()
+
+    def add(self, query):
+        with self.lock:
+            self.queries.append(query)
+
+def _describe_arg(value):
+    if isinstance(value, (list, tuple, set)):
+        return f'[{len(value)} valores]' if len(value) > 5 else repr(list(value))
+    if isinstance(value, dict):
+        return '{' + ', '.join(value.keys()) + '}'
+    if isinstance(value, str) and len(value) > 60:
+        return repr(value[:57] + '...')
+    return repr(value)
+
+def _describe_call(name, args, kwargs):
+    parts = [_describe_arg(a) for a in args]
+    parts += [f'{k}={_describe_arg(v)}' for k, v in kwargs.items()]
+    return f"{name}({', '.join(parts)})"
+
+def _calling_function(depth=2):
+    """Primera función de database.py en la pila que no sea un auxiliar."""
+    override = _caller.get()
+    if override is not None:
+        return override
+    frame = sys._getframe(depth)
+    fallback = None
+    while frame is not None:
+        if frame.f_globals.get('__name__') in _CALLER_MODULES:
+            name = frame.f_code.co_name
+            if name not in _PLUMBING:
+                return name
+            fallback = fallback or name
+        frame = frame.f_back
+    return fallback or 'desconocida'
+
+def current_caller():
+    """Función de database.py que está pidiendo datos en este hilo (para attributed_to)."""
+    if _current.get() is None:
+        return None
+    return _calling_function(depth=2)
+
+def attributed_to(caller, fn):
+    """Envolver fn para que sus consultas se atribuyan a `caller` aunque corran en otro hilo."""
+    if caller is None:
+        return fn
+
+    def run(*args, **kwargs):
+        token = _caller.set(caller)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _caller.reset(token)
+    return run
+
+def _response_size(data):
+    """Bytes de la respuesta serializada, o None si QUERY_STATS_BYTES no está activo."""
+    if not QUERY_STATS_BYTES or data is None:
+        return None
+    try:
+        return len(json.dumps(data, default=str))
+    except Exception:
+        return 0
+
+def _record(stats, table, calls, caller, started, response=None, error=None):
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    data = getattr(response, 'data', None)
+    if isinstance(data, list):
+        rows = len(data)
+    else:
+        rows = 0 if data is None else 1
+    stats.add({
+        'tabla': table,
+        'filtros': calls,
+        'filas': rows,
+        'bytes': _response_size(data),
+        'ms': round(elapsed_ms, 2),
+        'funcion': caller,
+        'error': str(error) if error is not None else None
+    })
+
+class _QueryProxy:
+    """Envuelve un builder de postgrest y anota las llamadas hasta su .execute()."""
+
+    __slots__ = ('_builder', '_table', '_calls')
+
+    def __init__(self, builder, table, calls=()):
+        self._builder = builder
+        self._table = table
+        self._calls = calls
+
+    def __copy__(self):
+        return _QueryProxy(copy.copy(self._builder), self._table, self._calls)
+
+    def __getattr__(self, name):
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            calls = self._calls
+            if name in _DESCRIBED:
+                calls = calls + (_describe_call(name, args, kwargs),)
+            return _QueryProxy(result, self._table, calls)
+        return call
+
+    def __setattr__(self, name, value):
+        # Lo que no es del proxy (p. ej. headers) se asigna en el builder
+        if name in _QueryProxy.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._builder, name, value)
+
+    def execute(self, *args, **kwargs):
+        stats = _current.get()
+        if stats is None:
+            return self._builder.execute(*args, **kwargs)
+
+        caller = _calling_function()
+        started = time.perf_counter()
+        try:
+            result = self._builder.execute(*args, **kwargs)
+        except Exception as e:
+            _record(stats, self._table, list(self._calls), caller, started, error=e)
+            raise
+        _record(stats, self._table, list(self._calls), caller, started, response=result)
+        return result
+
+class InstrumentedClient:
+    """Cliente de Supabase que registra cada consulta en el request en curso."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def from_(self, table):
+        return _QueryProxy(self._client.from_(table), table)
+
+    def table(self, table):
+        return _QueryProxy(self._client.table(table), table)
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name == 'rpc':
+            def rpc(fn_name, *args, **kwargs):
+                return _QueryProxy(attr(fn_name, *args, **kwargs), f'rpc:{fn_name}')
+            return rpc
+        return attr
+
+def instrument(client):
+    """Envolver el cliente si la instrumentación está activa."""
+    if not QUERY_STATS_ENABLED or client is None or isinstance(client, InstrumentedClient):
+        return client
+    return InstrumentedClient(client)
+
+# --- Agregado por request ---
+
+def start_request():
+    """Empezar a acumular consultas para el request actual. Devuelve un token para reset."""
+    if not QUERY_STATS_ENABLED:
+        return None
+    return _current.set(_RequestStats())
+
+def reset_request(token):
+    if token is not None:
+        _current.reset(token)
+
+def finish_request(endpoint, method, path, budget=None):
+    """Cerrar el agregado del request: lo guarda en el historial, avisa si excede el
+    presupuesto de consultas y devuelve el reporte (None si no hay instrumentación)."""
+    stats = _current.get()
+    if stats is None:
+        return None
+
+    with stats.lock:
+        queries = list(stats.queries)
+
+    por_funcion = {}
+    for q in queries:
+        f = por_funcion.setdefault(q['funcion'], {'consultas': 0, 'ms': 0.0, 'filas': 0,
+                                                   'bytes': 0 if QUERY_STATS_BYTES else None})
+        f['consultas'] += 1
+        f['ms'] = round(f['ms'] + q['ms'], 2)
+        f['filas'] += q['filas']
+        if QUERY_STATS_BYTES:
+            f['bytes'] += q['bytes'] or 0
+
+    report = {
+        'endpoint': endpoint,
+        'metodo': method,
+        'ruta': path,
+        'inicio': time.time(),
+        'total_ms': round((time.perf_counter() - stats.started) * 1000, 2),
+        'db_ms': round(sum(q['ms'] for q in queries), 2),
+        'consultas': len(queries),
+        'filas': sum(q['filas'] for q in queries),
+        'bytes': sum(q['bytes'] or 0 for q in queries) if QUERY_STATS_BYTES else None,
+        'por_funcion': por_funcion,
+        'detalle': queries
+    }
+
+    budget = QUERY_BUDGET if budget is None else budget
+    if len(queries) > budget:
+        logger.warning("La ruta '%s' hizo %s consultas (presupuesto %s): %s",
+                       endpoint, len(queries), budget,
+                       ', '.join(f"{name}={f['consultas']}" for name, f in por_funcion.items()))
+
+    with _history_lock:
+        _history.append(report)
+    return report
+
+def server_timing(report, max_functions=5):
+    """Valor del header Server-Timing: total de base de datos más las funciones más lentas."""
+    metrics = [f'db;dur={report["db_ms"]};desc="{report["consultas"]} consultas"']
+    top = sorted(report['por_funcion'].items(), key=lambda item: item[1]['ms'], reverse=True)
+    for name, f in top[:max_functions]:
+        metric = _METRIC_INVALID.sub('', str(name)).strip('_') or 'desconocida'
+        metrics.append(f'db-{metric};dur={f["ms"]};desc="{f["consultas"]}"')
+    return ', '.join(metrics)
+
+def recent_requests(limit=None):
+    """Reportes de los requests más recientes (el último primero)."""
+    with _history_lock:
+        reports = list(_history)
+    reports.reverse()
+    return reports[:limit] if limit else reports
@@ -0,0 +1,84 @@
+# report_cache.py - Caché de los reportes semanales (dashboard, resumen semanal y de pagos)
+#
+# Guarda el contexto de plantilla de cada página por (ruta, lunes de la semana) junto con la
+# versión de datos de database.data_version con la que se calculó. Mientras ninguna escritura
+# toque esa semana, la página se vuelve a renderizar desde memoria sin consultar Supabase, y el
+# ETag (derivado de la misma versión) permite responder 304 sin renderizar nada.
+#
+# La caché vive en el proceso. Con la versión compartida de Postgres (migración 008) una
+# escritura en cualquier instancia cambia la versión y la entrada deja de servirse, así que las
+# semanas cerradas pueden durar REPORT_CACHE_TTL. Con la versión local, una escritura en otra
+# instancia no invalida la de este proceso: la página solo se corrige al vencer, y todas las
+# entradas (cerradas o no) duran REPORT_CACHE_TTL_ABIERTA.
+#
+# Variables de entorno:
+#   REPORT_CACHE               0 para desactivar la caché. Activa por defecto.
+#   REPORT_CACHE_TTL           segundos de vida de una semana cerrada con versión compartida.
+#                              Por defecto 3600.
+#   REPORT_CACHE_TTL_ABIERTA   segundos de vida de la semana en curso, y de todas las semanas
+#                              con versión local. Por defecto 60.
+#   REPORT_CACHE_MAX           máximo de páginas guardadas. Por defecto 256.
+
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from logs import get_logger
+
+logger = get_logger('report_cache')
+
+REPORT_CACHE_ENABLED = os.getenv("REPORT_CACHE", "1").lower() not in ("0", "false", "no")
+REPORT_CACHE_TTL = int(os.getenv("REPORT_CACHE_TTL", "3600"))
+REPORT_CACHE_TTL_ABIERTA = int(os.getenv("REPORT_CACHE_TTL_ABIERTA", "60"))
+REPORT_CACHE_MAX = int(os.getenv("REPORT_CACHE_MAX", "256"))
+
+_entries = OrderedDict()
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+def etag(route, week_start, version, *variant):
+    """ETag de una página: cambia con la versión de datos o con cualquier variante
+    (p. ej. el nivel del usuario, que cambia el HTML)."""
+    raw = '|'.join(str(part) for part in (route, week_start, version) + variant)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+def get(route, week_start, version):
+    """Contexto guardado para (ruta, semana) si se calculó con esta versión y no venció."""
+    if not REPORT_CACHE_ENABLED:
+        return None
+    key = (route, str(week_start))
+    with _lock:
+        entry = _entries.get(key)
+        if entry is None or entry['version'] != version or entry['expira'] < time.monotonic():
+            _stats['misses'] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats['hits'] += 1
+        return entry['contexto']
+
+def put(route, week_start, version, contexto, cerrada):
+    """Guardar el contexto de (ruta, semana) calculado con `version`; cerrada elige el TTL largo."""
+    if not REPORT_CACHE_ENABLED:
+        return
+    ttl = REPORT_CACHE_TTL if cerrada else REPORT_CACHE_TTL_ABIERTA
+    key = (route, str(week_start))
+    with _lock:
+        _entries[key] = {
+            'version': version,
+            'contexto': contexto,
+            'expira': time.monotonic() + ttl
+        }
+        _entries.move_to_end(key)
+        while len(_entries) > REPORT_CACHE_MAX:
+            _entries.popitem(last=False)
+
+def clear():
+    with _lock:
+        _entries.clear()
+
+def stats():
+    """Aciertos, fallos y páginas guardadas."""
+    with _lock:
+        return dict(_stats, entradas=len(_entries))
@@ -0,0 +1,546 @@
+# supabase_memoria.py - Emulador de Supabase en memoria para pruebas de carga y perfiles sin red
+#
+# Implementa el builder de postgrest que usa database.py sobre tablas en memoria:
+#   select (con relaciones embebidas como 'ninos(nombre)' y count='exact'), eq, neq, gt, gte,
+#   lt, lte, in_, is_, like, ilike, order, limit, range, insert, update, delete y rpc.
+# Las columnas de INDICES tienen índice hash (y búsqueda por rango sobre sus claves ordenadas),
+# así una consulta por fecha o por persona no recorre toda la tabla. Cada .execute() queda en
+# `llamadas` y puede esperar una latencia configurable para simular el round-trip de red.
+#
+#     cliente = ClienteMemoria(latencia_ms=20)
+#     cliente.cargar('ninos', [{'id': 1, 'nombre': 'Ana', ...}])
+#     database.supabase = cliente
+#
+# database.py lo usa automáticamente si supabase no está instalado, o con SUPABASE_MEMORIA=1.
+
+import bisect
+import os
+import random
+import re
+import threading
+import time
+
+# Columnas indexadas por tabla ('id' siempre lo está).
+INDICES = {
+    'asistencia': ('fecha', 'tipo', 'id_persona', 'id_pago'),
+    'pagos': ('date', 'id_nino', 'id_empleado', 'split_group_id'),
+    'gastos': ('fecha',),
+}
+
+# Llaves foráneas para las relaciones embebidas: (tabla, relación) -> columna local.
+RELACIONES = {
+    ('pagos', 'ninos'): 'id_nino',
+    ('pagos', 'employees'): 'id_empleado',
+    ('asistencia', 'ninos'): 'id_persona',
+    ('asistencia', 'employees'): 'id_persona',
+}
+
+# Valores por defecto de columnas que en la base real tienen DEFAULT.
+DEFAULTS = {
+    'asistencia': {'pagado': False, 'id_pago': None},
+    'ninos': {'saldo': 0},
+}
+
+class ErrorMemoria(Exception):
+    """Error con la forma de postgrest.APIError (message / code)."""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+class RespuestaMemoria:
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+def _clave(value):
+    """Forma normalizada de un valor para índices y comparaciones: los ids pueden llegar como
+    int o str y las fechas como string ISO."""
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return ('bool', value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+def _comparables(a, b):
+    return type(a) is type(b) or (isinstance(a, float) and isinstance(b, float))
+
+def _predicado(filtro):
+    """Función fila -> bool para un filtro (op, columna, valor normalizado)."""
+    op, columna, valor = filtro
+    if op == 'is':
+        if isinstance(valor, bool) or valor is None:
+            return lambda fila: fila.get(columna) is valor
+        return lambda fila: fila.get(columna) == valor
+    if op == 'in':
+        return lambda fila: _clave(fila.get(columna)) in valor
+    if op in ('like', 'ilike'):
+        return lambda fila: fila.get(columna) is not None and valor.match(str(fila[columna])) is not None
+    if op == 'neq':
+        return lambda fila: fila.get(columna) is not None and _clave(fila[columna]) != valor
+    if op == 'eq':
+        return lambda fila: fila.get(columna) is not None and _clave(fila[columna]) == valor
+
+    comparar = {
+        'gt': lambda a: a > valor,
+        'gte': lambda a: a >= valor,
+        'lt': lambda a: a < valor,
+        'lte': lambda a: a <= valor,
+    }.get(op)
+    if comparar is None:
+        raise ErrorMemoria(f"Operador no soportado: {op}")
+
+    def predicado(fila):
+        actual = fila.get(columna)
+        if actual is None:
+            return False
+        clave = _clave(actual)
+        return _comparables(clave, valor) and comparar(clave)
+    return predicado
+
+def _patron_like(patron, ignorar_mayusculas):
+    partes = [re.escape(p) for p in str(patron).replace('*', '%').split('%')]
+    return re.compile('^' + '.*'.join(partes) + '$', re.IGNORECASE if ignorar_mayusculas else 0)
+
+def _partir_columnas(texto):
+    """Separar 'id, monto, ninos(nombre, monto)' por comas de primer nivel."""
+    columnas, nivel, actual = [], 0, ''
+    for ch in texto:
+        if ch == ',' and nivel == 0:
+            columnas.append(actual.strip())
+            actual = ''
+            continue
+        nivel += ch == '('
+        nivel -= ch == ')'
+        actual += ch
+    if actual.strip():
+        columnas.append(actual.strip())
+    return columnas
+
+class _Tabla:
+    """Filas de una tabla con índice por id y por las columnas de INDICES."""
+
+    def __init__(self, nombre):
+        self.nombre = nombre
+        self.filas = {}          # serial -> fila (en orden de inserción)
+        self.por_id = {}         # clave del id -> serial
+        self.columnas_indice = ('id',) + tuple(INDICES.get(nombre, ()))
+        self.indices = {c: {} for c in self.columnas_indice}
+        self._claves_ordenadas = {}
+        self.secuencia = 0
+        self._serial = 0
+        self.version = 0
+
+    def insertar(self, fila):
+        self._serial += 1
+        serial = self._serial
+        self.filas[serial] = fila
+        if fila.get('id') is not None:
+            self.por_id[_clave(fila['id'])] = serial
+            if isinstance(fila['id'], int):
+                self.secuencia = max(self.secuencia, fila['id'])
+        for columna in self.columnas_indice:
+            self._indexar(columna, fila.get(columna), serial)
+        return fila
+
+    def actualizar(self, serial, cambios):
+        fila = self.filas[serial]
+        for columna in self.columnas_indice:
+            if columna in cambios and _clave(cambios[columna]) != _clave(fila.get(columna)):
+                self._desindexar(columna, fila.get(columna), serial)
+                self._indexar(columna, cambios[columna], serial)
+        fila.update(cambios)
+
+    def borrar(self, serial):
+        fila = self.filas.pop(serial)
+        self.por_id.pop(_clave(fila.get('id')), None)
+        for columna in self.columnas_indice:
+            self._desindexar(columna, fila.get(columna), serial)
+
+    def _indexar(self, columna, valor, serial):
+        indice = self.indices[columna]
+        clave = _clave(valor)
+        if clave not in indice:
+            indice[clave] = set()
+            self._claves_ordenadas.pop(columna, None)
+        indice[clave].add(serial)
+
+    def _desindexar(self, columna, valor, serial):
+        indice = self.indices[columna]
+        clave = _clave(valor)
+        seriales = indice.get(clave)
+        if seriales is not None:
+            seriales.discard(serial)
+            if not seriales:
+                del indice[clave]
+                self._claves_ordenadas.pop(columna, None)
+
+    def _rango(self, columna, desde, hasta, incluye_desde, incluye_hasta):
+        ordenadas = self._claves_ordenadas.get(columna)
+        if ordenadas is None:
+            try:
+                ordenadas = sorted(k for k in self.indices[columna] if k is not None)
+            except TypeError:
+                return None  # tipos mezclados: sin búsqueda por rango
+            self._claves_ordenadas[columna] = ordenadas
+
+        inicio, fin = 0, len(ordenadas)
+        try:
+            if desde is not None:
+                inicio = (bisect.bisect_left if incluye_desde else bisect.bisect_right)(ordenadas, desde)
+            if hasta is not None:
+                fin = (bisect.bisect_right if incluye_hasta else bisect.bisect_left)(ordenadas, hasta)
+        except TypeError:
+            return None
+        seriales = set()
+        for clave in ordenadas[inicio:fin]:
+            seriales |= self.indices[columna][clave]
+        return seriales
+
+    def candidatos(self, filtros):
+        """Seriales a revisar: el conjunto más chico que permite un índice, o None (toda la tabla)."""
+        opciones = []
+        rangos = {}
+        for op, columna, valor in filtros:
+            if columna not in self.indices:
+                continue
+            indice = self.indices[columna]
+            if op == 'eq':
+                opciones.append(indice.get(valor, set()))
+            elif op == 'in':
+                seriales = set()
+                for clave in valor:
+                    seriales |= indice.get(clave, set())
+                opciones.append(seriales)
+            elif op == 'is' and valor is None:
+                opciones.append(indice.get(None, set()))
+            elif op in ('gt', 'gte', 'lt', 'lte'):
+                rango = rangos.setdefault(columna, [None, None, True, True])
+                if op in ('gt', 'gte'):
+                    rango[0], rango[2] = valor, op == 'gte'
+                else:
+                    rango[1], rango[3] = valor, op == 'lte'
+
+        for columna, (desde, hasta, incluye_desde, incluye_hasta) in rangos.items():
+            seriales = self._rango(columna, desde, hasta, incluye_desde, incluye_hasta)
+            if seriales is not None:
+                opciones.append(seriales)
+
+        if not opciones:
+            return None
+        return min(opciones, key=len)
+
+    def buscar(self, filtros):
+        """Seriales (en orden de inserción) de las filas que cumplen todos los filtros."""
+        predicados = [_predicado(f) for f in filtros]
+        candidatos = self.candidatos(filtros)
+        if candidatos is None or len(candidatos) > len(self.filas) // 2:
+            # El índice no descarta lo suficiente: recorrer la tabla es más barato que ordenar
+            return [s for s, fila in self.filas.items() if all(p(fila) for p in predicados)]
+        filas = self.filas
+        return [s for s in sorted(candidatos) if all(p(filas[s]) for p in predicados)]
+
+class ConsultaMemoria:
+    """Builder de una consulta; se evalúa al llamar execute()."""
+
+    def __init__(self, cliente, tabla):
+        self._cliente = cliente
+        self._tabla = tabla
+        self._operacion = 'select'
+        self._columnas = '*'
+        self._filtros = []
+        self._orden = []
+        self._limite = None
+        self._rango = None
+        self._payload = None
+        # Como en postgrest, count='exact' viaja en el header Prefer y las copias lo comparten
+        self.headers = {}
+        # Resultado filtrado y ordenado, reutilizado por las páginas de fetch_all_paginated
+        # mientras la tabla no cambie. Las copias (una por página) comparten este dict.
+        self._cache = {}
+
+    def __copy__(self):
+        otra = object.__new__(ConsultaMemoria)
+        otra.__dict__.update(self.__dict__)
+        otra._filtros = list(self._filtros)
+        otra._orden = list(self._orden)
+        return otra
+
+    # --- Operaciones ---
+
+    def select(self, *columnas, count=None):
+        self._columnas = ','.join(columnas) if columnas else '*'
+        if count:
+            self.headers['prefer'] = f'count={count}'
+        return self
+
+    def insert(self, payload, **kwargs):
+        self._operacion = 'insert'
+        self._payload = payload
+        return self
+
+    def update(self, payload, **kwargs):
+        self._operacion = 'update'
+        self._payload = payload
+        return self
+
+    def delete(self, **kwargs):
+        self._operacion = 'delete'
+        return self
+
+    # --- Filtros ---
+
+    def _filtro(self, op, columna, valor):
+        self._filtros.append((op, columna, valor))
+        return self
+
+    def eq(self, columna, valor):
+        return self._filtro('eq', columna, _clave(valor))
+
+    def neq(self, columna, valor):
+        return self._filtro('neq', columna, _clave(valor))
+
+    def gt(self, columna, valor):
+        return self._filtro('gt', columna, _clave(valor))
+
+    def gte(self, columna, valor):
+        return self._filtro('gte', columna, _clave(valor))
+
+    def lt(self, columna, valor):
+        return self._filtro('lt', columna, _clave(valor))
+
+    def lte(self, columna, valor):
+        return self._filtro('lte', columna, _clave(valor))
+
+    def in_(self, columna, valores):
+        return self._filtro('in', columna, {_clave(v) for v in valores})
+
+    def is_(self, columna, valor):
+        if valor in (None, 'null'):
+            return self._filtro('is', columna, None)
+        return self._filtro('is', columna, {'true': True, 'false': False}.get(str(valor).lower(), valor))
+
+    def like(self, columna, patron):
+        return self._filtro('like', columna, _patron_like(patron, False))
+
+    def ilike(self, columna, patron):
+        return self._filtro('ilike', columna, _patron_like(patron, True))
+
+    def order(self, columna, desc=False, nullsfirst=None, **kwargs):
+        # Como Postgres: NULLS LAST en orden ascendente y NULLS FIRST en descendente.
+        self._orden.append((columna, desc, desc if nullsfirst is None else nullsfirst))
+        return self
+
+    def limit(self, n, **kwargs):
+        self._limite = n
+        return self
+
+    def range(self, inicio, fin, **kwargs):
+        self._rango = (inicio, fin)
+        return self
+
+    # --- Ejecución ---
+
+    def _ordenar(self, tabla, seriales):
+        for columna, desc, nulos_primero in reversed(self._orden):
+            con_valor = [s for s in seriales if tabla.filas[s].get(columna) is not None]
+            nulos = [s for s in seriales if tabla.filas[s].get(columna) is None]
+            try:
+                con_valor.sort(key=lambda s: _clave(tabla.filas[s][columna]), reverse=desc)
+            except TypeError:
+                con_valor.sort(key=lambda s: str(tabla.filas[s][columna]), reverse=desc)
+            seriales = nulos + con_valor if nulos_primero else con_valor + nulos
+        return seriales
+
+    def _seleccion(self, tabla):
+        # Los filtros son tuplas que viven en la lista mientras exista el builder
+        clave = (tabla.version, tuple(map(id, self._filtros)), tuple(self._orden))
+        seriales = self._cache.get(clave)
+        if seriales is None:
+            seriales = self._ordenar(tabla, tabla.buscar(self._filtros))
+            self._cache.clear()
+            self._cache[clave] = seriales
+        return seriales
+
+    def _proyectar(self, fila, columnas=None):
+        salida = {}
+        for columna in _partir_columnas(columnas or self._columnas):
+            relacion = re.match(r'^(?:(\w+):)?(\w+)(?:!(\w+))?\((.*)\)$', columna, re.DOTALL)
+            if relacion:
+                alias, destino, fk, internas = relacion.groups()
+                salida[alias or destino] = self._embeber(fila, destino, fk, internas)
+            elif columna == '*':
+                salida.update(fila)
+            else:
+                alias, _, nombre = columna.rpartition(':')
+                salida[alias or nombre] = fila.get(nombre)
+        return salida
+
+    def _validar_relaciones(self):
+        for columna in _partir_columnas(self._columnas):
+            relacion = re.match(r'^(?:\w+:)?(\w+)(?:!(\w+))?\(', columna)
+            if relacion and not relacion.group(2) and (self._tabla, relacion.group(1)) not in RELACIONES:
+                raise ErrorMemoria(
+                    f"Could not find a relationship between '{self._tabla}' and "
+                    f"'{relacion.group(1)}' in the schema cache",
+                    code='PGRST200'
+                )
+
+    def _embeber(self, fila, destino, fk, columnas):
+        fk = fk or RELACIONES[(self._tabla, destino)]
+        tabla = self._cliente._tabla(destino)
+        serial = tabla.por_id.get(_clave(fila.get(fk)))
+        if serial is None:
+            return None
+        return self._proyectar(tabla.filas[serial], columnas)
+
+    def _ejecutar(self):
+        cliente = self._cliente
+        tabla = cliente._tabla(self._tabla)
+
+        if self._operacion == 'insert':
+            nuevos = self._payload if isinstance(self._payload, list) else [self._payload]
+            insertados = [dict(cliente._nueva_fila(tabla, item)) for item in nuevos]
+            tabla.version += 1
+            return RespuestaMemoria(insertados)
+
+        if self._operacion == 'update':
+            seriales = tabla.buscar(self._filtros)
+            for serial in seriales:
+                tabla.actualizar(serial, self._payload)
+            tabla.version += 1
+            return RespuestaMemoria([dict(tabla.filas[s]) for s in seriales])
+
+        if self._operacion == 'delete':
+            seriales = tabla.buscar(self._filtros)
+            borradas = [dict(tabla.filas[s]) for s in seriales]
+            for serial in seriales:
+                tabla.borrar(serial)
+            tabla.version += 1
+            return RespuestaMemoria(borradas)
+
+        self._validar_relaciones()
+        seriales = self._seleccion(tabla)
+        total = len(seriales)
+        if self._rango is not None:
+            seriales = seriales[self._rango[0]:self._rango[1] + 1]
+        if self._limite is not None:
+            seriales = seriales[:self._limite]
+        data = [self._proyectar(tabla.filas[s]) for s in seriales]
+        contar = 'count=' in self.headers.get('prefer', '')
+        return RespuestaMemoria(data, total if contar else None)
+
+    def execute(self):
+        self._cliente._registrar(self._tabla, self._operacion)
+        self._cliente._esperar()
+        with self._cliente._lock:
+            return self._ejecutar()
+
+class RpcMemoria:
+    def __init__(self, cliente, nombre, params):
+        self._cliente = cliente
+        self._nombre = nombre
+        self._params = params
+
+    def execute(self):
+        self._cliente._registrar(f'rpc:{self._nombre}', 'rpc')
+        self._cliente._esperar()
+        funcion = self._cliente.funciones.get(self._nombre)
+        if funcion is None:
+            # Mismo error que PostgREST para que database.py use su ruta en Python
+            raise ErrorMemoria(f"Could not find the function public.{self._nombre}", code='PGRST202')
+        with self._cliente._lock:
+            return RespuestaMemoria(funcion(self._cliente, self._params))
+
+class ClienteMemoria:
+    """Cliente con la interfaz de supabase.Client (from_/table/rpc) sobre tablas en memoria.
+
+    latencia_ms / variacion_ms: espera por cada execute() (fuera del lock, así las consultas en
+    paralelo se solapan como en la red real). funciones: {nombre: fn(cliente, params)} para rpc.
+    """
+
+    def __init__(self, latencia_ms=0.0, variacion_ms=0.0):
+        self.latencia_ms = latencia_ms
+        self.variacion_ms = variacion_ms
+        self.funciones = {}
+        self.llamadas = []
+        self._tablas = {}
+        self._lock = threading.RLock()
+
+    def _tabla(self, nombre):
+        tabla = self._tablas.get(nombre)
+        if tabla is None:
+            tabla = self._tablas[nombre] = _Tabla(nombre)
+        return tabla
+
+    def cargar(self, tabla, filas):
+        """Reemplazar el contenido de una tabla (las filas se copian)."""
+        with self._lock:
+            nueva = _Tabla(tabla)
+            for fila in filas:
+                nueva.insertar(dict(fila))
+            nueva.version = self._tabla(tabla).version + 1
+            self._tablas[tabla] = nueva
+
+    def filas(self, tabla):
+        """Filas de la tabla en orden de inserción (las mismas instancias, no copias)."""
+        with self._lock:
+            return list(self._tabla(tabla).filas.values())
+
+    @property
+    def tablas(self):
+        """{tabla: [filas]} del contenido actual."""
+        with self._lock:
+            return {nombre: list(t.filas.values()) for nombre, t in self._tablas.items()}
+
+    def copiar(self):
+        """Copia independiente de los datos y funciones (sin historial de llamadas)."""
+        otro = ClienteMemoria(self.latencia_ms, self.variacion_ms)
+        otro.funciones = dict(self.funciones)
+        with self._lock:
+            for nombre, tabla in self._tablas.items():
+                otro.cargar(nombre, tabla.filas.values())
+                otro._tablas[nombre].secuencia = tabla.secuencia
+        return otro
+
+    def _nueva_fila(self, tabla, item):
+        fila = dict(DEFAULTS.get(tabla.nombre, {}))
+        fila.update(item)
+        if fila.get('id') is None:
+            tabla.secuencia += 1
+            fila['id'] = tabla.secuencia
+        elif _clave(fila['id']) in tabla.por_id:
+            raise ErrorMemoria(
+                f'duplicate key value violates unique constraint "{tabla.nombre}_pkey"', code='23505'
+            )
+        return tabla.insertar(fila)
+
+    def _registrar(self, tabla, operacion):
+        with self._lock:
+            self.llamadas.append((tabla, operacion))
+
+    def _esperar(self):
+        if self.latencia_ms or self.variacion_ms:
+            time.sleep(max(self.latencia_ms + random.uniform(-1, 1) * self.variacion_ms, 0) / 1000)
+
+    def from_(self, tabla):
+        return ConsultaMemoria(self, tabla)
+
+    def table(self, tabla):
+        return ConsultaMemoria(self, tabla)
+
+    def rpc(self, nombre, params=None):
+        return RpcMemoria(self, nombre, params or {})
+
+def create_client(url=None, key=None, options=None):
+    """Misma firma que supabase.create_client; la latencia sale de SUPABASE_MEMORIA_LATENCIA_MS."""
+    return ClienteMemoria(
+        latencia_ms=float(os.getenv("SUPABASE_MEMORIA_LATENCIA_MS", "0")),
+        variacion_ms=float(os.getenv("SUPABASE_MEMORIA_VARIACION_MS", "0"))
+    )
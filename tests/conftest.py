@@ -0,0 +1,33 @@
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, 'benchmarks'))
+
+# database.py crea el cliente real al importarse; con estos valores no se conecta a nada.
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+os.environ.setdefault("SUPABASE_KEY", "eyJhbGciOiJIUzI1NiJ9.e30.pruebas")
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+os.environ.setdefault("QUERY_STATS", "0")
+
+from postgres_local import PostgresNoDisponible, base_desechable
+
+_TABLAS = 'ninos, employees, asistencia, pagos, gastos, deuda_semanal, deuda_acumulada, version_datos'
+
+@pytest.fixture(scope='session')
+def _postgres_sesion():
+    try:
+        with base_desechable() as conn:
+            yield conn
+    except PostgresNoDisponible as e:
+        pytest.skip(f"Sin Postgres para las migraciones: {e}")
+
+@pytest.fixture
+def postgres(_postgres_sesion):
+    """Conexión a una base desechable con todas las migraciones, vacía al empezar cada prueba."""
+    with _postgres_sesion.cursor() as cur:
+        cur.execute(f"truncate {_TABLAS} restart identity")
+    return _postgres_sesion
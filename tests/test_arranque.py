@@ -0,0 +1,8 @@
+"""Importar app no debe cargar el cliente de Supabase (ver benchmarks/bench_arranque.py, que
+además mide el tiempo contra un presupuesto)."""
+
+from bench_arranque import medir_una_vez
+
+def test_import_app_no_carga_dependencias_diferidas():
+    resultado = medir_una_vez()
+    assert resultado['cargados'] == [], f"se importan al arrancar: {', '.join(resultado['cargados'])}"
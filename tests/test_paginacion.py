@@ -0,0 +1,42 @@
+"""iter_paginated: solo la primera página le pide el total a PostgREST."""
+
+import pytest
+from postgrest import SyncPostgrestClient
+
+import database as db
+from supabase_memoria import ClienteMemoria
+
+@pytest.fixture
+def cliente(monkeypatch):
+    cliente = ClienteMemoria()
+    cliente.cargar('asistencia', [{'id': i, 'fecha': '2026-03-02', 'tipo': 'nino', 'id_persona': i, 'valor': 20}
+                                  for i in range(1, 26)])
+    monkeypatch.setattr(db, 'supabase', cliente)
+    return cliente
+
+@pytest.mark.parametrize('workers', [1, 4])
+def test_las_paginas_siguientes_no_cuentan(cliente, monkeypatch, workers):
+    conteos = []
+    fetch_page = db._fetch_page
+
+    def registrar(query_builder, start, page_size):
+        response = fetch_page(query_builder, start, page_size)
+        conteos.append((start, response.count))
+        return response
+    monkeypatch.setattr(db, '_fetch_page', registrar)
+
+    consulta = cliente.from_('asistencia').select('id', count='exact').order('id')
+    filas = [f['id'] for pagina in db.iter_paginated(consulta, page_size=10, workers=workers) for f in pagina]
+
+    assert filas == list(range(1, 26))
+    assert sorted(conteos) == [(0, 25), (10, None), (20, None)]
+
+def test_without_count_conserva_el_resto_del_prefer():
+    consulta = SyncPostgrestClient('http://localhost:1').from_('asistencia').select('id', count='exact')
+    consulta.headers['prefer'] = 'count=exact,return=representation'
+
+    sin_count = db._without_count(consulta)
+
+    assert sin_count.headers['prefer'] == 'return=representation'
+    # El builder original sigue pidiendo el total para la primera página
+    assert consulta.headers['prefer'] == 'count=exact,return=representation'
@@ -0,0 +1,90 @@
+"""add_pagos_lote sin la función registrar_pagos_lote (ruta en Python) y /api/gastos/ajustar_pagos."""
+
+import pytest
+
+import app as app_module
+import database as db
+from supabase_memoria import ClienteMemoria
+
+def _asistencia(id_, fecha, id_nino, valor=20.0):
+    return {'id': id_, 'fecha': fecha, 'tipo': 'nino', 'id_persona': id_nino, 'valor': valor,
+            'pagado': False, 'id_pago': None}
+
+@pytest.fixture
+def cliente(monkeypatch):
+    cliente = ClienteMemoria()
+    cliente.cargar('ninos', [
+        {'id': 4, 'nombre': 'Ana', 'monto': 20, 'status': 1, 'saldo': 40.0},
+        {'id': 5, 'nombre': 'Beto', 'monto': 20, 'status': 1, 'saldo': 20.0},
+    ])
+    cliente.cargar('employees', [{'id': 9, 'nombre': 'Caja', 'status': 1, 'nivel': 'Admin'}])
+    cliente.cargar('asistencia', [
+        _asistencia(1, '2026-03-02', 4),
+        _asistencia(2, '2026-03-03', 4),
+        _asistencia(3, '2026-03-03', 5),
+    ])
+    cliente.cargar('pagos', [])
+    monkeypatch.setattr(db, 'supabase', cliente)
+    monkeypatch.setattr(db, '_rpc_no_disponibles', set())
+    db.invalidate_roster()
+    yield cliente
+    db.invalidate_roster()
+
+def _lote(*ninos):
+    # Los ids llegan como texto desde los checkboxes de templates/pagos.html
+    return [{'fecha': '2026-03-05', 'id_nino': str(nid), 'id_empleado': '9', 'monto': monto, 'tipo': 'Ajuste'}
+            for nid, monto in ninos]
+
+def test_ids_como_texto_liquidan_y_ajustan_saldo(cliente):
+    resultados = db.add_pagos_lote(_lote((4, 40), (5, 20)))
+
+    assert [(r['id_nino'], r['success'], r['error']) for r in resultados] == [('4', True, None), ('5', True, None)]
+    pagos = {p['id_nino']: p['id'] for p in cliente.filas('pagos')}
+    assert [(a['id'], a['pagado'], a['id_pago']) for a in cliente.filas('asistencia')] == [
+        (1, True, pagos[4]), (2, True, pagos[4]), (3, True, pagos[5])]
+    assert {n['id']: n['saldo'] for n in cliente.filas('ninos')} == {4: 0.0, 5: 0.0}
+
+def test_falla_despues_del_insert_deshace_los_pagos(cliente, monkeypatch):
+    def caido(deltas):
+        raise RuntimeError('caido')
+    monkeypatch.setattr(db, '_adjust_ninos_saldo', caido)
+
+    resultados = db.add_pagos_lote(_lote((4, 40)))
+
+    assert [(r['success'], r['error']) for r in resultados] == [(False, 'caido')]
+    assert cliente.filas('pagos') == []
+    assert not any(a['pagado'] or a['id_pago'] for a in cliente.filas('asistencia'))
+
+@pytest.fixture
+def admin():
+    cliente_http = app_module.app.test_client()
+    with cliente_http.session_transaction() as sesion:
+        sesion.update({'user': 'caja', 'user_level': 'Admin', 'user_id': 9, 'user_name': 'Caja'})
+    return cliente_http
+
+def test_ajustar_pagos_informa_los_fallidos(cliente, admin, monkeypatch):
+    monkeypatch.setattr(app_module, 'add_pagos_lote', lambda pagos: [
+        {'id_nino': '4', 'success': True, 'pago': {'id': 1}, 'error': None},
+        {'id_nino': '5', 'success': False, 'pago': None, 'error': 'caido'},
+    ])
+    respuesta = admin.post('/api/gastos/ajustar_pagos', json={'ninos_ids': ['4', '5'], 'fecha': '2026-03-05'})
+
+    assert respuesta.status_code == 200
+    assert respuesta.get_json()['fallidos'] == ['5']
+
+def test_ajustar_pagos_sin_ningun_pago_responde_500(cliente, admin, monkeypatch):
+    monkeypatch.setattr(app_module, 'add_pagos_lote', lambda pagos: [
+        {'id_nino': '4', 'success': False, 'pago': None, 'error': 'caido'},
+    ])
+    respuesta = admin.post('/api/gastos/ajustar_pagos', json={'ninos_ids': ['4'], 'fecha': '2026-03-05'})
+
+    assert respuesta.status_code == 500
+    assert respuesta.get_json()['error'] == 'caido'
+
+def test_consultas_de_la_ruta_en_python(cliente):
+    db.add_pagos_lote(_lote((4, 40), (5, 20)))
+
+    escrituras = [(tabla, op) for tabla, op in cliente.llamadas if op != 'select']
+    # Un insert para todo el lote y una actualización de asistencia por pago que liquidó algo
+    assert escrituras.count(('pagos', 'insert')) == 1
+    assert escrituras.count(('asistencia', 'update')) == 2
@@ -0,0 +1,134 @@
+"""registrar_pago (migrations/001, 006 y 009) contra la ruta en Python de add_pago y
+add_pago_dividido: las dos deben dejar los mismos pagos, asistencias liquidadas y saldo."""
+
+import json
+
+import pytest
+
+import database as db
+from postgres_local import cargar
+from supabase_memoria import ClienteMemoria
+
+FECHA_PAGO = '2026-03-13'
+
+NINOS = [
+    {'id': 1, 'nombre': 'Ana', 'monto': 20, 'Representante': 'R1', 'status': 1, 'saldo': 80.0},
+    {'id': 2, 'nombre': 'Beto', 'monto': 30, 'Representante': 'R2', 'status': 1, 'saldo': 0.0},
+]
+
+EMPLOYEES = [
+    {'id': 1, 'nombre': 'Caja', 'horas': 8, 'usuario': 'caja', 'contrasena': 'x', 'nivel': 'Admin', 'status': 1},
+]
+
+# Niño 1: una ya pagada, una en cero y montos distintos para que el FIFO tenga que saltar
+ASISTENCIA = [
+    {'id': 1, 'fecha': '2026-03-02', 'tipo': 'nino', 'id_persona': 1, 'valor': 20.0, 'pagado': True, 'id_pago': None},
+    {'id': 2, 'fecha': '2026-03-03', 'tipo': 'nino', 'id_persona': 1, 'valor': 20.0, 'pagado': False, 'id_pago': None},
+    {'id': 3, 'fecha': '2026-03-04', 'tipo': 'nino', 'id_persona': 1, 'valor': 30.0, 'pagado': False, 'id_pago': None},
+    {'id': 4, 'fecha': '2026-03-04', 'tipo': 'nino', 'id_persona': 1, 'valor': 0.0, 'pagado': False, 'id_pago': None},
+    {'id': 5, 'fecha': '2026-03-05', 'tipo': 'nino', 'id_persona': 1, 'valor': 10.0, 'pagado': False, 'id_pago': None},
+    {'id': 6, 'fecha': '2026-03-06', 'tipo': 'nino', 'id_persona': 1, 'valor': 20.0, 'pagado': False, 'id_pago': None},
+    {'id': 7, 'fecha': '2026-03-03', 'tipo': 'trabajadora', 'id_persona': 1, 'valor': 8.0, 'pagado': False, 'id_pago': None},
+    {'id': 8, 'fecha': '2026-03-03', 'tipo': 'nino', 'id_persona': 2, 'valor': 30.0, 'pagado': False, 'id_pago': None},
+]
+
+def _cliente_memoria():
+    cliente = ClienteMemoria()
+    cliente.cargar('ninos', [dict(f) for f in NINOS])
+    cliente.cargar('employees', [dict(f) for f in EMPLOYEES])
+    cliente.cargar('asistencia', [dict(f) for f in ASISTENCIA])
+    cliente.cargar('pagos', [])
+    return cliente
+
+@pytest.fixture
+def memoria(monkeypatch):
+    """Emulador sin funciones de Postgres: add_pago usa la ruta en Python."""
+    cliente = _cliente_memoria()
+    monkeypatch.setattr(db, 'supabase', cliente)
+    monkeypatch.setattr(db, '_rpc_no_disponibles', set())
+    monkeypatch.setattr(db, '_split_column', None)
+    return cliente
+
+@pytest.fixture
+def base(postgres):
+    cargar(postgres, 'ninos', NINOS)
+    cargar(postgres, 'employees', EMPLOYEES)
+    cargar(postgres, 'asistencia', ASISTENCIA)
+    return postgres
+
+def _registrar_pago_filas(conn, params):
+    """Filas de registrar_pago como las devuelve PostgREST: [{'pago', 'liquidadas'}]."""
+    with conn.cursor() as cur:
+        cur.execute("select pago, liquidadas from public.registrar_pago(%(p_fecha)s, %(p_id_nino)s, %(p_partes)s::jsonb)",
+                    dict(params, p_partes=json.dumps(params['p_partes'])))
+        return [{'pago': pago, 'liquidadas': liquidadas} for pago, liquidadas in cur.fetchall()]
+
+def _registrar_pago_sql(conn, id_nino, partes):
+    filas = _registrar_pago_filas(conn, {'p_fecha': FECHA_PAGO, 'p_id_nino': id_nino, 'p_partes': partes})
+    return [fila['pago'] for fila in filas]
+
+def _estado_sql(conn):
+    with conn.cursor() as cur:
+        cur.execute("select id, pagado, id_pago from public.asistencia order by id")
+        asistencia = [tuple(fila) for fila in cur.fetchall()]
+        cur.execute("select id, saldo from public.ninos order by id")
+        saldos = {id_nino: float(saldo) for id_nino, saldo in cur.fetchall()}
+    return asistencia, saldos
+
+def _estado_memoria(cliente):
+    asistencia = [(a['id'], a['pagado'], a['id_pago'])
+                  for a in sorted(cliente.filas('asistencia'), key=lambda a: a['id'])]
+    saldos = {n['id']: float(n['saldo']) for n in cliente.filas('ninos')}
+    return asistencia, saldos
+
+def _resumen(pagos):
+    return [(p['id'], p['id_nino'], float(p['monto']), p['tipo']) for p in pagos]
+
+@pytest.mark.parametrize('id_nino, monto', [
+    (1, 40.0),    # cubre las dos primeras pendientes
+    (1, 45.0),    # la de 30 no cabe y se salta; la de 10 sí
+    (1, 500.0),   # sobrepago: liquida todo y el saldo queda negativo
+    (1, 5.0),     # no alcanza para ninguna
+    (2, 30.0),
+])
+def test_add_pago_igual_que_registrar_pago(memoria, base, id_nino, monto):
+    pago = db.add_pago(FECHA_PAGO, id_nino, 1, monto, 'Efectivo')
+    pagos_sql = _registrar_pago_sql(base, id_nino, [{'id_empleado': 1, 'monto': monto, 'tipo': 'Efectivo'}])
+
+    assert _resumen([pago]) == _resumen(pagos_sql)
+    assert _estado_memoria(memoria) == _estado_sql(base)
+
+def test_add_pago_dividido_igual_que_registrar_pago(memoria, base):
+    partes = [{'id_empleado': 1, 'monto': 25.0, 'tipo': 'Efectivo'},
+              {'id_empleado': 1, 'monto': 30.0, 'tipo': 'Zelle'}]
+    pagos = db.add_pago_dividido(FECHA_PAGO, 1, partes)
+    pagos_sql = _registrar_pago_sql(base, 1, [dict(p, split_group_id='grupo') for p in partes])
+
+    assert _resumen(pagos) == _resumen(pagos_sql)
+    assert len({p['split_group_id'] for p in pagos}) == 1
+    assert {p['split_group_id'] for p in pagos_sql} == {'grupo'}
+    # Las asistencias quedan ligadas a la última parte en las dos rutas
+    assert _estado_memoria(memoria) == _estado_sql(base)
+
+def test_rpc_devuelve_las_fechas_liquidadas_y_no_relee_asistencia(memoria, base):
+    # registrar_pago en el emulador ejecuta la función real sobre la base desechable
+    respuestas = []
+    def registrar_pago(cliente, params):
+        respuestas.append(_registrar_pago_filas(base, params))
+        return respuestas[-1]
+    memoria.funciones['registrar_pago'] = registrar_pago
+    claves = []
+    db.subscribe_writes(claves.append)
+    try:
+        pago = db.add_pago(FECHA_PAGO, 1, 1, 45.0, 'Efectivo')
+    finally:
+        db.unsubscribe_writes(claves.append)
+
+    with base.cursor() as cur:
+        cur.execute("select distinct fecha::text from public.asistencia where id_pago = %s", (pago['id'],))
+        liquidadas = sorted(fila[0] for fila in cur.fetchall())
+    assert liquidadas == ['2026-03-03', '2026-03-05']
+    assert sorted(respuestas[0][-1]['liquidadas']) == liquidadas
+    # Una sola llamada: no se vuelve a leer asistencia para el diario
+    assert memoria.llamadas == [('rpc:registrar_pago', 'rpc')]
+    assert claves == [{('pagos', '2026-03-09', 1), ('asistencia', '2026-03-02', 1)}]
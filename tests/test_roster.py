@@ -0,0 +1,58 @@
+"""Caché de roster de database.py: una carga por tabla a la vez, sin bloquear a las demás."""
+
+import threading
+import time
+
+import pytest
+
+import database as db
+from supabase_memoria import ClienteMemoria
+
+LATENCIA_MS = 200
+
+@pytest.fixture
+def cliente(monkeypatch):
+    cliente = ClienteMemoria(latencia_ms=LATENCIA_MS)
+    cliente.cargar('ninos', [{'id': i, 'nombre': f'Niño {i}', 'status': 1, 'saldo': 0} for i in range(1, 4)])
+    cliente.cargar('employees', [{'id': 1, 'nombre': 'Caja', 'status': 1, 'contrasena': 'x'}])
+    monkeypatch.setattr(db, 'supabase', cliente)
+    db.invalidate_roster()
+    yield cliente
+    db.invalidate_roster()
+
+def _en_hilos(*funciones):
+    resultados = [None] * len(funciones)
+
+    def correr(i, fn):
+        resultados[i] = fn()
+    hilos = [threading.Thread(target=correr, args=(i, fn)) for i, fn in enumerate(funciones)]
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    return resultados
+
+def test_lectores_concurrentes_comparten_una_carga(cliente):
+    resultados = _en_hilos(*[lambda: db._get_roster('ninos')] * 8)
+    assert len(cliente.llamadas) == 1
+    assert all(r == resultados[0] for r in resultados)
+    assert 'saldo' not in resultados[0][1]
+
+def test_una_tabla_no_espera_a_la_otra(cliente):
+    inicio = time.perf_counter()
+    _en_hilos(lambda: db._get_roster('ninos'), lambda: db._get_roster('employees'))
+    # Con un lock global las dos cargas irían una detrás de la otra
+    assert (time.perf_counter() - inicio) * 1000 < LATENCIA_MS * 1.8
+
+def test_invalidar_no_espera_la_carga_ni_guarda_datos_viejos(cliente):
+    lector = threading.Thread(target=db._get_roster, args=('ninos',))
+    lector.start()
+    time.sleep(LATENCIA_MS / 4000)
+
+    inicio = time.perf_counter()
+    db.invalidate_roster('ninos')
+    assert (time.perf_counter() - inicio) * 1000 < LATENCIA_MS / 2
+    lector.join()
+
+    # La carga que empezó antes de invalidar no quedó en caché
+    assert db._fresh_roster_entry('ninos') is None
@@ -0,0 +1,27 @@
+"""/warmup no pide sesión: no debe devolver el estado del pool, que queda en /debug/pool."""
+
+import pytest
+
+import app as app_module
+
+@pytest.fixture
+def cliente_http(monkeypatch):
+    monkeypatch.setattr(app_module, 'warmup', lambda: True)
+    return app_module.app.test_client()
+
+def test_warmup_solo_responde_si_funciono(cliente_http):
+    respuesta = cliente_http.get('/warmup')
+
+    assert respuesta.status_code == 200
+    assert respuesta.get_json() == {'ok': True}
+
+def test_pool_solo_para_admin(cliente_http, monkeypatch):
+    monkeypatch.setattr(app_module, 'pool_stats', lambda: {'conexiones_nuevas': 1})
+    assert cliente_http.get('/debug/pool').status_code != 200
+
+    with cliente_http.session_transaction() as sesion:
+        sesion.update({'user': 'caja', 'user_level': 'Admin', 'user_id': 9, 'user_name': 'Caja'})
+    respuesta = cliente_http.get('/debug/pool')
+
+    assert respuesta.status_code == 200
+    assert respuesta.get_json() == {'conexiones_nuevas': 1}